@@ -0,0 +1,564 @@
+import asyncio
+import json
+import math
+import random
+import time
+import traceback
+import uuid
+from collections import OrderedDict
+import redis.asyncio as redis
+
+from RDB import codec
+from RDB.metrics import CacheMetrics
+from RDB.redis_client import redis_client as default_redis_client
+from app.helpers.variables import (
+    CACHE_INVALIDATION_CHANNEL,
+    CACHE_LOCAL_MAX_ENTRIES,
+    CACHE_NEGATIVE_LOCAL_MAX_ENTRIES,
+    CACHE_NEGATIVE_MAX_ENTRIES,
+    CACHE_NEGATIVE_TTL,
+)
+
+# Cache keys embed a generation number ("all_items:v3:page_1:size_20"). Bumping the generation
+# with a single INCR makes every key of the old generation unreachable, and those keys then age
+# out through their own TTL. This replaces scanning the keyspace with KEYS and deleting one by one.
+
+# The generation counter has to outlive every entry written under it, otherwise an expired
+# counter would restart at 0 and could resurrect old entries.
+NAMESPACE_TTL = 7 * 24 * 3600
+
+# family: (redis ttl, in-process ttl) in seconds. The family is the key prefix before the first ":".
+# In-process entries are also evicted through pub/sub, their TTL only bounds staleness when a
+# worker misses invalidation messages.
+CACHE_TTLS = {
+    "shop": (3600, 60),
+    "shops_by_owner": (3600, 60),
+    "item": (3600, 60),
+    "all_items": (3600, 30),
+    "inventory": (600, 30),
+    "inventory_by_shop": (600, 10),
+    "ns": (NAMESPACE_TTL, 30),
+}
+DEFAULT_CACHE_TTL = (3600, 30)
+# A tag set has to live at least as long as any entry indexed in it.
+TAG_TTL = max(redis_ttl for family, (redis_ttl, _) in CACHE_TTLS.items() if family != "ns")
+
+# Stampede protection: only one worker recomputes a missing key while holding this lock,
+# the others wait for the fill for at most this long before loading it themselves.
+FILL_LOCK_TTL_MS = 5000
+FILL_WAIT_INTERVAL = 0.05
+# XFetch beta: > 1 favours earlier refreshes, < 1 later ones.
+EARLY_REFRESH_BETA = 1.0
+
+_UNSET = object()
+
+# Tag indexes: "tag:shop:{shop_id}" is a Redis set holding every cache key built from that shop.
+# Invalidating a tag deletes all of its keys in one round trip, without touching unrelated entries.
+TAG_PREFIX = "tag:"
+
+# Deletes every key indexed by the given tag sets and the sets themselves, publishes the deleted
+# keys for the L1s and returns them.
+INVALIDATE_TAGS_SCRIPT = """
+local keys = {}
+for _, tag in ipairs(KEYS) do
+    for _, key in ipairs(redis.call("SMEMBERS", tag)) do
+        keys[#keys + 1] = key
+    end
+end
+redis.call("DEL", unpack(KEYS))
+for i = 1, #keys, 500 do
+    redis.call("DEL", unpack(keys, i, math.min(i + 499, #keys)))
+end
+if #keys > 0 then
+    redis.call("PUBLISH", ARGV[1], cjson.encode(keys))
+end
+return keys
+"""
+
+# Negative entries remember that a lookup found nothing ("neg:shop:{id}"). They are short-lived and
+# kept apart from real entries: a separate L1 partition, and in Redis a per-family ZSET by insertion
+# time that is trimmed to CACHE_NEGATIVE_MAX_ENTRIES, so scans over random ids only evict each other.
+NEGATIVE_PREFIX = "neg:"
+
+SET_NEGATIVE_SCRIPT = """
+local ttl = tonumber(ARGV[1])
+local now = tonumber(ARGV[2])
+if #KEYS > 2 then
+    local stamp = redis.call("GET", KEYS[3])
+    if stamp and tonumber(stamp) >= tonumber(ARGV[4]) then
+        return 0
+    end
+end
+redis.call("SET", KEYS[1], 1, "EX", ttl)
+redis.call("ZREMRANGEBYSCORE", KEYS[2], "-inf", now - ttl)
+redis.call("ZADD", KEYS[2], now, KEYS[1])
+local overflow = redis.call("ZCARD", KEYS[2]) - tonumber(ARGV[3])
+if overflow > 0 then
+    local oldest = redis.call("ZPOPMIN", KEYS[2], overflow)
+    for i = 1, #oldest, 2 do
+        redis.call("DEL", oldest[i])
+    end
+end
+redis.call("EXPIRE", KEYS[2], ttl)
+return 1
+"""
+
+# Releases the fill lock. A load that found nothing (and isn't cached as missing) leaves EMPTY_FILL
+# in the lock for a moment instead, so the workers waiting on it answer "not found" right away.
+RELEASE_LOCK_SCRIPT = """
+if redis.call("GET", KEYS[1]) == ARGV[1] then
+    if ARGV[2] then
+        return redis.call("SET", KEYS[1], ARGV[2], "PX", ARGV[3])
+    end
+    return redis.call("DEL", KEYS[1])
+end
+return 0
+"""
+EMPTY_FILL = "empty"
+# a few polls of the waiters, it also briefly answers "not found" for fills started meanwhile
+EMPTY_FILL_TTL_MS = 250
+
+# A load can read the database before a write and finish after that write's invalidation. Every
+# invalidation stamps the keys and tags it hits ("inv:shop:1", "inv:tag:shop:1") with Redis' clock,
+# and a fill only stores its value if none of its key and tags was stamped since the load started.
+# Stamps only have to outlive the slowest load.
+STAMP_PREFIX = "inv:"
+STAMP_TTL_MS = 60_000
+
+STAMP_INVALIDATIONS_SCRIPT = """
+local now = redis.call("TIME")
+local ms = now[1] * 1000 + math.floor(now[2] / 1000)
+for _, key in ipairs(KEYS) do
+    redis.call("SET", key, ms, "PX", ARGV[1])
+end
+return ms
+"""
+
+# KEYS: the entry, its ARGV[4] tag sets, then the stamps of the entry and of each tag.
+# ARGV: body, ttl, tag ttl, number of tags, load start (ms, Redis clock). Returns 0 if it lost the race.
+FILL_SCRIPT = """
+local tags = tonumber(ARGV[4])
+for i = tags + 2, #KEYS do
+    local stamp = redis.call("GET", KEYS[i])
+    if stamp and tonumber(stamp) >= tonumber(ARGV[5]) then
+        return 0
+    end
+end
+redis.call("SET", KEYS[1], ARGV[1], "EX", ARGV[2])
+for i = 2, tags + 1 do
+    redis.call("SADD", KEYS[i], KEYS[1])
+    redis.call("EXPIRE", KEYS[i], ARGV[3])
+end
+return 1
+"""
+
+
+def namespace_key(namespace: str) -> str:
+    return f"ns:{namespace}"
+
+
+def tag_key(tag: str) -> str:
+    return f"{TAG_PREFIX}{tag}"
+
+
+def negative_key(key: str) -> str:
+    return f"{NEGATIVE_PREFIX}{key}"
+
+
+def stamp_key(name: str) -> str:
+    # name is a cache key or a tag_key()
+    return f"{STAMP_PREFIX}{name}"
+
+
+def key_family(key: str) -> str:
+    return key.split(":", 1)[0]
+
+
+def family_ttl(key: str):
+    return CACHE_TTLS.get(key_family(key), DEFAULT_CACHE_TTL)
+
+
+class CacheEntry:
+    """
+    A cached value plus what XFetch needs: how long it took to compute and when it expires.
+    `body` is the value as JSON bytes; the decoded `value` is only built when someone asks for it.
+    `digest` identifies the body (ETags are derived from it), it is stored with the entry.
+    `encoded` keeps responses built from this entry (e.g. gzip-compressed), so L1 hits reuse them.
+    """
+
+    __slots__ = ("body", "delta", "expires_at", "digest", "encoded", "_value")
+
+    def __init__(self, body: bytes, delta: float, expires_at: float, digest: bytes = None, value=_UNSET):
+        self.body = body
+        self.delta = delta
+        self.expires_at = expires_at
+        self.digest = digest or codec.digest(body)
+        self.encoded = {}
+        self._value = value
+
+    @classmethod
+    def from_value(cls, value, delta: float, expires_at: float):
+        return cls(codec.dumps(value), delta, expires_at, value=value)
+
+    @property
+    def value(self):
+        if self._value is _UNSET:
+            self._value = codec.loads(self.body)
+        return self._value
+
+    def dumps(self) -> bytes:
+        return codec.pack(self.body, self.delta, self.expires_at, self.digest)
+
+    @classmethod
+    def loads(cls, raw: bytes):
+        unpacked = codec.unpack(raw)
+        return cls(*unpacked) if unpacked is not None else None
+
+    def should_refresh_early(self, beta: float = EARLY_REFRESH_BETA) -> bool:
+        """
+        Probabilistic early expiration (XFetch): the closer the entry is to its expiry and the
+        more expensive it was to compute, the more likely a reader is picked to recompute it.
+        """
+        return time.time() - self.delta * beta * math.log(random.random() or 1e-12) >= self.expires_at
+
+
+class Tagged:
+    """
+    Returned by a `get_or_load` loader to attach tags that are only known once the rows are loaded,
+    e.g. the ids of the items on a page.
+    """
+
+    __slots__ = ("value", "tags")
+
+    def __init__(self, value, tags=()):
+        self.value = value
+        self.tags = tags
+
+
+class LocalCache:
+    """Size-bounded in-process LRU with a per-entry expiry."""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key, value, ttl: int):
+        self._entries[key] = (value, time.monotonic() + ttl)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def delete(self, *keys):
+        for key in keys:
+            self._entries.pop(key, None)
+
+    def delete_prefix(self, prefix: str):
+        for key in [k for k in self._entries if k.startswith(prefix)]:
+            del self._entries[key]
+
+    def clear(self):
+        self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class TwoTierCache:
+    """
+    In-process L1 in front of Redis (L2). Entries are compact binary blobs in Redis (RDB/codec.py)
+    and already unpacked in L1, so an L1 hit costs neither a round trip nor any decoding.
+
+    Invalidations are published on a Redis channel; every worker runs `listen()` and evicts the
+    affected L1 entries, so a write on one worker is seen by all of them.
+    """
+
+    def __init__(self, redis_client: redis.Redis, max_local_entries: int = CACHE_LOCAL_MAX_ENTRIES, channel: str = CACHE_INVALIDATION_CHANNEL,
+                 max_negative_entries: int = CACHE_NEGATIVE_LOCAL_MAX_ENTRIES):
+        self.redis = redis_client
+        self.local = LocalCache(max_local_entries)
+        self.negative = LocalCache(max_negative_entries)
+        self.channel = channel
+        self.metrics = CacheMetrics()
+        self._inflight = {}
+
+    async def get_entry(self, key: str):
+        entry = self.local.get(key)
+        if entry is not None:
+            return entry
+        entry, _ = await self._read_redis(key, cache_missing=False)
+        return entry
+
+    async def _read_redis(self, key: str, cache_missing: bool):
+        """
+        Returns (entry, missing) from Redis and fills L1. With `cache_missing` the negative entry
+        is fetched in the same round trip.
+        """
+        family = key_family(key)
+        if cache_missing:
+            with self.metrics.redis_timer(family, "mget"):
+                raw, missing = await self.redis.mget([key, negative_key(key)])
+            if missing is not None:
+                self.negative.set(key, True, CACHE_NEGATIVE_TTL)
+                return None, True
+        else:
+            with self.metrics.redis_timer(family, "get"):
+                raw = await self.redis.get(key)
+        if raw is None:
+            return None, False
+        entry = CacheEntry.loads(raw)
+        if entry is None:
+            return None, False
+        self.local.set(key, entry, family_ttl(key)[1])
+        return entry, False
+
+    async def get(self, key: str):
+        entry = await self.get_entry(key)
+        return entry.value if entry is not None else None
+
+    async def set(self, key: str, value, delta: float = 0.0, tags=()):
+        """
+        Stores the value and adds the key to the index set of every tag, in one round trip.
+        """
+        redis_ttl, local_ttl = family_ttl(key)
+        family = key_family(key)
+        entry = CacheEntry.from_value(value, delta, time.time() + redis_ttl)
+        raw = entry.dumps()
+        with self.metrics.redis_timer(family, "set"):
+            async with self.redis.pipeline(transaction=False) as pipe:
+                pipe.set(key, raw, ex=redis_ttl)
+                for tag in set(tags):
+                    pipe.sadd(tag_key(tag), key)
+                    pipe.expire(tag_key(tag), TAG_TTL)
+                await pipe.execute()
+        self.metrics.payload(family, len(raw))
+        self.local.set(key, entry, local_ttl)
+        return entry
+
+    async def set_missing(self, key: str, started_ms: int = None):
+        """
+        Remembers that `key` has no value, see SET_NEGATIVE_SCRIPT. With `started_ms` (a fill's
+        load start) nothing is remembered if the key was invalidated since. Returns whether it was.
+        """
+        family = key_family(key)
+        index_key = f"{NEGATIVE_PREFIX}index:{family}"
+        keys = [negative_key(key), index_key] + ([stamp_key(key)] if started_ms is not None else [])
+        with self.metrics.redis_timer(family, "set_missing"):
+            stored = await self.redis.eval(SET_NEGATIVE_SCRIPT, len(keys), *keys, CACHE_NEGATIVE_TTL, time.time(), CACHE_NEGATIVE_MAX_ENTRIES,
+                                           *([started_ms] if started_ms is not None else []))
+        if not stored:
+            return False
+        self.negative.set(key, True, CACHE_NEGATIVE_TTL)
+        return True
+
+    async def _store_fill(self, key: str, value, delta: float, tags, started_ms: int):
+        """Like `set`, but only if neither the key nor any of its tags was invalidated since `started_ms`."""
+        redis_ttl, local_ttl = family_ttl(key)
+        family = key_family(key)
+        entry = CacheEntry.from_value(value, delta, time.time() + redis_ttl)
+        raw = entry.dumps()
+        tag_keys = [tag_key(tag) for tag in set(tags)]
+        keys = [key, *tag_keys, stamp_key(key), *[stamp_key(tag) for tag in tag_keys]]
+        with self.metrics.redis_timer(family, "set"):
+            stored = await self.redis.eval(FILL_SCRIPT, len(keys), *keys, raw, redis_ttl, TAG_TTL, len(tag_keys), started_ms)
+        if not stored:
+            # still the freshest answer this caller can get, it's just not kept
+            self.metrics.incr(family, "stale_fills_dropped")
+            return entry
+        self.metrics.payload(family, len(raw))
+        self.local.set(key, entry, local_ttl)
+        return entry
+
+    async def get_or_load(self, key: str, loader, tags=(), cache_missing: bool = False):
+        """
+        Returns (entry, from_cache), entry being None when the loader found nothing.
+        The filled key is indexed under `tags`, plus any tags the loader returns through `Tagged`.
+        With `cache_missing` a "not found" is cached too (set_missing), until the key is invalidated.
+        On a miss `loader` (an async callable returning the value, or None) is run at most once
+        per key per process; concurrent callers await the same load. Across processes a short Redis lock makes the other workers
+        wait for the winner's fill instead of hitting the database too.
+        Hot keys are recomputed slightly before expiry (XFetch) so they never expire under load.
+        """
+        family = key_family(key)
+        if cache_missing and self.negative.get(key):
+            self.metrics.lookup(family, key, "negative_hits")
+            return None, True
+        entry = self.local.get(key)
+        hit_event = "l1_hits"
+        if entry is None:
+            hit_event = "l2_hits"
+            entry, missing = await self._read_redis(key, cache_missing)
+            if missing:
+                self.metrics.lookup(family, key, "negative_hits")
+                return None, True
+        if entry is not None and not entry.should_refresh_early():
+            self.metrics.lookup(family, key, hit_event)
+            return entry, True
+
+        flight = self._inflight.get(key)
+        if flight is None:
+            flight = asyncio.ensure_future(self._fill(key, loader, entry, tags, cache_missing))
+            self._inflight[key] = flight
+            flight.add_done_callback(lambda _: self._inflight.pop(key, None))
+        # shield: a cancelled request must not cancel the load other callers are waiting on
+        entry, from_cache = await asyncio.shield(flight)
+        if from_cache:
+            event = "l2_hits" if entry is not None else "negative_hits"
+        else:
+            event = "misses" if entry is not None else "negative_misses"
+        self.metrics.lookup(family, key, event)
+        return entry, from_cache
+
+    async def _fill(self, key: str, loader, stale, tags, cache_missing):
+        lock_key = f"lock:{key}"
+        token = uuid.uuid4().hex
+        family = key_family(key)
+        with self.metrics.redis_timer(family, "lock"):
+            # the load's start on Redis' clock, the one invalidation stamps are taken with
+            async with self.redis.pipeline(transaction=False) as pipe:
+                pipe.set(lock_key, token, nx=True, px=FILL_LOCK_TTL_MS)
+                pipe.time()
+                locked, (seconds, microseconds) = await pipe.execute()
+        started_ms = seconds * 1000 + microseconds // 1000
+        if not locked:
+            if stale is not None:
+                # another worker is already refreshing this key early, keep serving the current value
+                self.metrics.incr(family, "stale_served")
+                return stale, True
+            entry, missing = await self._wait_for_fill(key, cache_missing)
+            if entry is not None or missing:
+                return entry, True
+            # the lock holder gave up, is too slow or died, fall through and load it ourselves
+        empty = False
+        try:
+            started = time.monotonic()
+            value = await loader()
+            if isinstance(value, Tagged):
+                tags = [*tags, *value.tags]
+                value = value.value
+            if value is None:
+                if cache_missing:
+                    if await self.set_missing(key, started_ms):
+                        self.metrics.incr(family, "negative_fills")
+                else:
+                    empty = True
+                return None, False
+            self.metrics.incr(family, "fills")
+            return await self._store_fill(key, value, time.monotonic() - started, tags, started_ms), False
+        finally:
+            if locked:
+                release = (EMPTY_FILL, EMPTY_FILL_TTL_MS) if empty else ()
+                await self.redis.eval(RELEASE_LOCK_SCRIPT, 1, lock_key, token, *release)
+
+    async def _wait_for_fill(self, key: str, cache_missing: bool):
+        """
+        Polls for the lock holder's result: (entry, missing), (None, True) if it found nothing, or
+        (None, False) once the lock is gone without a result (the caller then loads it itself).
+        """
+        lock_key = f"lock:{key}"
+        deadline = time.monotonic() + FILL_LOCK_TTL_MS / 1000
+        while time.monotonic() < deadline:
+            await asyncio.sleep(FILL_WAIT_INTERVAL)
+            entry, missing = await self._read_redis(key, cache_missing)
+            if entry is not None or missing:
+                return entry, missing
+            lock = await self.redis.get(lock_key)
+            if lock is None:
+                return None, False
+            if lock in (EMPTY_FILL, EMPTY_FILL.encode()):
+                return None, True
+        return None, False
+
+    async def get_namespace_version(self, namespace: str) -> int:
+        ns_key = namespace_key(namespace)
+        version = self.local.get(ns_key)
+        if version is None:
+            raw = await self.redis.get(ns_key)
+            version = int(raw) if raw else 0
+            self.local.set(ns_key, version, family_ttl(ns_key)[1])
+        return version
+
+    async def versioned_key(self, namespace: str, suffix: str = "") -> str:
+        version = await self.get_namespace_version(namespace)
+        key = f"{namespace}:v{version}"
+        return f"{key}:{suffix}" if suffix else key
+
+    async def invalidate(self, namespaces=(), keys=(), tags=()):
+        """
+        Bumps the given namespaces, deletes the given plain keys (and their negative entries) and
+        every key indexed under the given tags, and tells every worker to drop them from L1, all in
+        one pipelined round trip. Pass the key of a newly created row so a cached "not found" goes away.
+        """
+        if not namespaces and not keys and not tags:
+            return
+        evicted = [namespace_key(ns) for ns in namespaces] + list(keys)
+        self._evict_local(evicted)
+        with self.metrics.redis_timer("*", "invalidate"):
+            async with self.redis.pipeline(transaction=False) as pipe:
+                stamps = [stamp_key(key) for key in keys] + [stamp_key(tag_key(tag)) for tag in set(tags)]
+                if stamps:
+                    # before the deletes: a fill that checks after this can't store what it loaded
+                    pipe.eval(STAMP_INVALIDATIONS_SCRIPT, len(stamps), *stamps, STAMP_TTL_MS)
+                for namespace in namespaces:
+                    pipe.incr(namespace_key(namespace))
+                    pipe.expire(namespace_key(namespace), NAMESPACE_TTL)
+                if keys:
+                    pipe.delete(*keys, *[negative_key(key) for key in keys])
+                if evicted:
+                    pipe.publish(self.channel, json.dumps(evicted))
+                if tags:
+                    tag_keys = [tag_key(tag) for tag in set(tags)]
+                    pipe.eval(INVALIDATE_TAGS_SCRIPT, len(tag_keys), *tag_keys, self.channel)
+                results = await pipe.execute()
+        tagged = [key.decode() if isinstance(key, bytes) else key for key in results[-1]] if tags else []
+        self._evict_local(tagged)
+        for key in [*namespaces, *keys, *tagged]:
+            self.metrics.incr(key_family(key), "invalidations")
+
+    def _evict_local(self, keys):
+        for key in keys:
+            self.local.delete(key)
+            self.negative.delete(key)
+            if key.startswith("ns:"):
+                # entries written under the old generation can't be read any more, drop them early
+                self.local.delete_prefix(f"{key[3:]}:v")
+
+    async def listen(self):
+        """
+        Long-running task: applies invalidation messages published by any worker to this
+        worker's L1. Reconnects on errors and clears L1 since messages may have been missed.
+        """
+        while True:
+            pubsub = self.redis.pubsub(ignore_subscribe_messages=True)
+            try:
+                await pubsub.subscribe(self.channel)
+                while True:
+                    # explicit timeout so the pool's socket_timeout doesn't break an idle subscription
+                    message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+                    if message and message.get("type") == "message":
+                        self._evict_local(json.loads(message["data"]))
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                traceback.print_exc()
+                self.local.clear()
+                self.negative.clear()
+                await asyncio.sleep(1)
+            finally:
+                await pubsub.aclose()
+
+
+cache = TwoTierCache(default_redis_client)
+
+async def get_cache():
+    return cache
@@ -0,0 +1,59 @@
+import hashlib
+import struct
+import orjson
+
+from app.helpers.variables import CACHE_COMPRESS_MIN_BYTES
+
+try:
+    import zstandard
+except ImportError:  # compression is optional, payloads are stored uncompressed without it
+    zstandard = None
+
+# Cached payloads are stored in Redis as one binary blob:
+#   header (codec flags, compute time, expiry) + body digest + orjson body, zstd-compressed above a threshold.
+# The body is kept as JSON bytes on purpose: a cache hit can be spliced straight into the
+# response envelope without ever being deserialized. The digest is the body's ETag, computed
+# once when the entry is written.
+# The header's first byte is FORMAT << 4 | compression. An entry of another FORMAT reads as a miss,
+# so changing the layout means bumping FORMAT, the old entries are then refilled as they're read.
+FORMAT = 1
+RAW = 0
+ZSTD = 1
+DIGEST_SIZE = 8
+HEADER = struct.Struct("!Bdd")
+
+_compressor = zstandard.ZstdCompressor(level=3) if zstandard else None
+_decompressor = zstandard.ZstdDecompressor() if zstandard else None
+
+
+def dumps(value) -> bytes:
+    return orjson.dumps(value)
+
+
+def loads(body: bytes):
+    return orjson.loads(body)
+
+
+def digest(body: bytes) -> bytes:
+    return hashlib.blake2b(body, digest_size=DIGEST_SIZE).digest()
+
+
+def pack(body: bytes, delta: float, expires_at: float, body_digest: bytes = None) -> bytes:
+    body_digest = body_digest or digest(body)
+    if _compressor is not None and len(body) >= CACHE_COMPRESS_MIN_BYTES:
+        return HEADER.pack(FORMAT << 4 | ZSTD, delta, expires_at) + body_digest + _compressor.compress(body)
+    return HEADER.pack(FORMAT << 4 | RAW, delta, expires_at) + body_digest + body
+
+
+def unpack(raw: bytes):
+    """Returns (body, delta, expires_at, digest) with the body decompressed, None for another FORMAT."""
+    flag, delta, expires_at = HEADER.unpack_from(raw)
+    if flag >> 4 != FORMAT:
+        return None
+    body_digest = raw[HEADER.size:HEADER.size + DIGEST_SIZE]
+    payload = raw[HEADER.size + DIGEST_SIZE:]
+    if flag & ZSTD:
+        if _decompressor is None:
+            raise RuntimeError("Cached payload is zstd-compressed but zstandard is not installed")
+        payload = _decompressor.decompress(payload)
+    return payload, delta, expires_at, body_digest
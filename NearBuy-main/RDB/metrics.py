@@ -0,0 +1,147 @@
+import bisect
+import os
+import random
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+
+from app.helpers.variables import CACHE_HOT_KEY_SAMPLE_RATE
+
+# Upper bounds of the Redis latency buckets, in milliseconds. The last bucket is open ended.
+LATENCY_BUCKETS_MS = (0.25, 0.5, 1, 2, 5, 10, 25, 50, 100, 250)
+# Lookup outcomes counted per key family, used for hit_ratio. Fills, stale_served and
+# invalidations are counted alongside but are not lookups.
+HIT_EVENTS = ("l1_hits", "l2_hits", "negative_hits")
+MISS_EVENTS = ("misses", "negative_misses")
+HOT_KEY_CAPACITY = 1000
+
+
+class LatencyHistogram:
+    """Fixed-bucket histogram: recording is a bisect and an increment, no samples are kept."""
+
+    def __init__(self, buckets=LATENCY_BUCKETS_MS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.total_ms = 0.0
+
+    def record(self, ms: float):
+        self.counts[bisect.bisect_left(self.buckets, ms)] += 1
+        self.count += 1
+        self.total_ms += ms
+
+    def percentile(self, p: float):
+        """Upper bound of the bucket holding the p-th percentile, None past the last bucket."""
+        if not self.count:
+            return 0.0
+        rank = p / 100 * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if seen >= rank:
+                return self.buckets[i] if i < len(self.buckets) else None
+        return None
+
+    def snapshot(self) -> dict:
+        labels = [f"le_{b}" for b in self.buckets] + ["inf"]
+        return {
+            "count": self.count,
+            "avg_ms": round(self.total_ms / self.count, 3) if self.count else 0.0,
+            "p50_ms": self.percentile(50),
+            "p95_ms": self.percentile(95),
+            "p99_ms": self.percentile(99),
+            "buckets": dict(zip(labels, self.counts)),
+        }
+
+
+class PayloadStats:
+    def __init__(self):
+        self.count = 0
+        self.total_bytes = 0
+        self.max_bytes = 0
+
+    def record(self, size: int):
+        self.count += 1
+        self.total_bytes += size
+        self.max_bytes = max(self.max_bytes, size)
+
+    def snapshot(self) -> dict:
+        return {
+            "count": self.count,
+            "avg_bytes": self.total_bytes // self.count if self.count else 0,
+            "max_bytes": self.max_bytes,
+        }
+
+
+class HotKeySampler:
+    """
+    Counts a random sample of lookups per key. When the table is full the coldest half is dropped,
+    so memory stays bounded while keys that keep getting hit stay in it.
+    """
+
+    def __init__(self, sample_rate: float = CACHE_HOT_KEY_SAMPLE_RATE, capacity: int = HOT_KEY_CAPACITY):
+        self.sample_rate = sample_rate
+        self.capacity = capacity
+        self.counts = Counter()
+
+    def record(self, key: str):
+        if random.random() >= self.sample_rate:
+            return
+        self.counts[key] += 1
+        if len(self.counts) > self.capacity:
+            self.counts = Counter(dict(self.counts.most_common(self.capacity // 2)))
+
+    def top(self, n: int):
+        # scaled back up, so the numbers read as estimated lookups
+        return [{"key": key, "estimated_lookups": round(count / self.sample_rate)} for key, count in self.counts.most_common(n)]
+
+
+class CacheMetrics:
+    """
+    Per-process cache counters keyed by family (the key prefix before the first ":").
+    Every uvicorn worker has its own; the status endpoint reports the worker that served it.
+    """
+
+    def __init__(self, hot_key_sample_rate: float = CACHE_HOT_KEY_SAMPLE_RATE):
+        self.started_at = time.time()
+        self.events = defaultdict(Counter)
+        self.payloads = defaultdict(PayloadStats)
+        self.latency = defaultdict(LatencyHistogram)
+        self.hot_keys = HotKeySampler(hot_key_sample_rate)
+
+    def incr(self, family: str, event: str, n: int = 1):
+        self.events[family][event] += n
+
+    def lookup(self, family: str, key: str, event: str):
+        self.events[family][event] += 1
+        self.hot_keys.record(key)
+
+    def payload(self, family: str, size: int):
+        self.payloads[family].record(size)
+
+    @contextmanager
+    def redis_timer(self, family: str, op: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.latency[(family, op)].record((time.perf_counter() - started) * 1000)
+
+    def snapshot(self, top_keys: int = 20) -> dict:
+        families = {}
+        for family in sorted(set(self.events) | set(self.payloads) | {f for f, _ in self.latency}):
+            events = self.events[family]
+            hits = sum(events[e] for e in HIT_EVENTS)
+            lookups = hits + sum(events[e] for e in MISS_EVENTS)
+            families[family] = {
+                **dict(events),
+                "hit_ratio": round(hits / lookups, 4) if lookups else None,
+                "payload": self.payloads[family].snapshot(),
+                "redis_latency": {op: hist.snapshot() for (f, op), hist in sorted(self.latency.items()) if f == family},
+            }
+        return {
+            "pid": os.getpid(),
+            "uptime_seconds": int(time.time() - self.started_at),
+            "families": families,
+            "hot_keys": self.hot_keys.top(top_keys),
+        }
@@ -1,13 +1,26 @@
-import redis
+import redis.asyncio as redis
 
-from app.helpers.variables import REDIS_HOST, REDIS_PORT
+from app.helpers.variables import REDIS_HOST, REDIS_MAX_CONNECTIONS, REDIS_PORT, REDIS_SOCKET_TIMEOUT
 
-redis_client = redis.Redis(
+# One explicit pool per worker process, shared by every request handled by that worker.
+# Responses stay bytes: cached payloads are binary (see RDB/codec.py).
+# The blocking pool makes requests wait for a free connection instead of failing when it is exhausted.
+redis_pool = redis.BlockingConnectionPool(
     host=REDIS_HOST,
     port=REDIS_PORT,
     db=0,
-    decode_responses=True
+    decode_responses=False,
+    max_connections=REDIS_MAX_CONNECTIONS,
+    timeout=REDIS_SOCKET_TIMEOUT,
+    socket_timeout=REDIS_SOCKET_TIMEOUT,
+    socket_connect_timeout=REDIS_SOCKET_TIMEOUT,
 )
 
-def get_redis_client():
-    return redis_client
\ No newline at end of file
+redis_client = redis.Redis(connection_pool=redis_pool)
+
+async def get_redis_client():
+    return redis_client
+
+async def close_redis_client():
+    await redis_client.aclose()
+    await redis_pool.disconnect()
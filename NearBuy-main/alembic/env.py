@@ -8,7 +8,9 @@ from sqlmodel import SQLModel
 from app.db.models.user import USER, USER_SESSION, USER_META
 from app.db.models.shop import SHOP
 from app.db.models.item import ITEM
-from app.db.models.inventory import INVENTORY
+from app.db.models.inventory import INVENTORY, INVENTORY_RESERVATION
+from app.db.models.sync import SYNC_CHECKPOINT, SYNC_TOMBSTONE
+from app.db.models.outbox import OUTBOX_EVENT
 
 config = context.config
 
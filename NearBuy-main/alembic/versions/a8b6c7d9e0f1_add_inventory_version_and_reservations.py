@@ -0,0 +1,42 @@
+"""Add inventory version and reservations
+
+Revision ID: a8b6c7d9e0f1
+Revises: f7a5b6c8d9e0
+Create Date: 2026-10-19 15:52:40.671209
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a8b6c7d9e0f1'
+down_revision: Union[str, Sequence[str], None] = 'f7a5b6c8d9e0'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('inventory', sa.Column('version', sa.Integer(), nullable=False, server_default='1'))
+    op.create_table(
+        'inventory_reservation',
+        sa.Column('reservation_id', sa.String(), primary_key=True),
+        sa.Column('inventory_id', sa.String(), nullable=False),
+        sa.Column('quantity', sa.Integer(), nullable=False),
+        sa.Column('reserved_by', sa.String(), nullable=True),
+        sa.Column('created_at', sa.Integer(), nullable=False),
+        sa.Column('expires_at', sa.Integer(), nullable=False),
+    )
+    op.create_index('ix_inventory_reservation_inventory_id', 'inventory_reservation', ['inventory_id'])
+    op.create_index('ix_inventory_reservation_expires_at', 'inventory_reservation', ['expires_at'])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_inventory_reservation_expires_at', table_name='inventory_reservation')
+    op.drop_index('ix_inventory_reservation_inventory_id', table_name='inventory_reservation')
+    op.drop_table('inventory_reservation')
+    op.drop_column('inventory', 'version')
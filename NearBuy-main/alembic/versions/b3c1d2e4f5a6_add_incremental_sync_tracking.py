@@ -0,0 +1,55 @@
+"""Add incremental sync tracking
+
+Revision ID: b3c1d2e4f5a6
+Revises: 6fa6a760f6b1
+Create Date: 2026-10-19 10:12:41.318204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b3c1d2e4f5a6'
+down_revision: Union[str, Sequence[str], None] = '6fa6a760f6b1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('item', sa.Column('updated_at', sa.Integer(), nullable=True))
+    # rows that were never updated get their creation time (shops) or now (items, no created_at)
+    op.execute("UPDATE shop SET updated_at = created_at WHERE updated_at IS NULL")
+    op.execute("UPDATE item SET updated_at = extract(epoch from now())")
+    op.create_index('ix_item_updated_at', 'item', ['updated_at'])
+    op.create_index('ix_shop_updated_at', 'shop', ['updated_at'])
+
+    op.create_table(
+        'sync_checkpoint',
+        sa.Column('collection', sa.String(), primary_key=True),
+        sa.Column('watermark', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('deleted_watermark', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('last_run_at', sa.Integer(), nullable=True),
+        sa.Column('last_run_changes', sa.Integer(), nullable=False, server_default='0'),
+    )
+    op.create_table(
+        'sync_tombstone',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('collection', sa.String(), nullable=False),
+        sa.Column('document_id', sa.String(), nullable=False),
+        sa.Column('deleted_at', sa.Integer(), nullable=False),
+    )
+    op.create_index('ix_sync_tombstone_collection_deleted_at', 'sync_tombstone', ['collection', 'deleted_at'])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_sync_tombstone_collection_deleted_at', table_name='sync_tombstone')
+    op.drop_table('sync_tombstone')
+    op.drop_table('sync_checkpoint')
+    op.drop_index('ix_shop_updated_at', table_name='shop')
+    op.drop_index('ix_item_updated_at', table_name='item')
+    op.drop_column('item', 'updated_at')
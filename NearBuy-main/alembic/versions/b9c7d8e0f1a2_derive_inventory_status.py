@@ -0,0 +1,64 @@
+"""Derive inventory status
+
+Revision ID: b9c7d8e0f1a2
+Revises: a8b6c7d9e0f1
+Create Date: 2026-10-19 16:44:13.508927
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+STOCK_STATUS_SQL = (
+    "CASE WHEN quantity <= 0 THEN 'OUT_OF_STOCK' "
+    "WHEN quantity <= COALESCE(min_quantity, 0) THEN 'LOW' "
+    "ELSE 'IN_STOCK' END"
+)
+IN_STOCK_SQL = "status <> 'OUT_OF_STOCK'"
+STATUS_CHANGE_FUNCTION = """
+CREATE OR REPLACE FUNCTION inventory_status_changed() RETURNS trigger AS $$
+BEGIN
+    INSERT INTO outbox_event (collection, document_id, invalidate, status, attempts, created_at, next_attempt_at)
+    VALUES ('items', COALESCE(NEW.item_id, OLD.item_id)::text, '{}', 'PENDING', 0,
+            extract(epoch from clock_timestamp()), extract(epoch from clock_timestamp()));
+    RETURN NULL;
+END $$ LANGUAGE plpgsql
+"""
+STATUS_CHANGE_TRIGGERS = """
+CREATE TRIGGER inventory_status_changed AFTER UPDATE ON inventory
+    FOR EACH ROW WHEN (OLD.status IS DISTINCT FROM NEW.status) EXECUTE FUNCTION inventory_status_changed();
+CREATE TRIGGER inventory_stock_added_or_removed AFTER INSERT OR DELETE ON inventory
+    FOR EACH ROW EXECUTE FUNCTION inventory_status_changed()
+"""
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b9c7d8e0f1a2'
+down_revision: Union[str, Sequence[str], None] = 'a8b6c7d9e0f1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # client-written status is replaced by one computed from quantity/min_quantity
+    op.drop_column('inventory', 'status')
+    sa.Enum(name='stockstatus').drop(op.get_bind(), checkfirst=True)
+    op.add_column('inventory', sa.Column('status', sa.String(), sa.Computed(STOCK_STATUS_SQL, persisted=True)))
+    op.create_index('ix_inventory_in_stock', 'inventory', ['item_id', 'shop_id'], postgresql_where=sa.text(IN_STOCK_SQL))
+    op.execute(STATUS_CHANGE_FUNCTION)
+    op.execute(STATUS_CHANGE_TRIGGERS)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("DROP TRIGGER IF EXISTS inventory_stock_added_or_removed ON inventory")
+    op.execute("DROP TRIGGER IF EXISTS inventory_status_changed ON inventory")
+    op.execute("DROP FUNCTION IF EXISTS inventory_status_changed()")
+    op.drop_index('ix_inventory_in_stock', table_name='inventory')
+    op.drop_column('inventory', 'status')
+    stock_status = sa.Enum('IN_STOCK', 'LOW', 'OUT_OF_STOCK', name='stockstatus')
+    stock_status.create(op.get_bind(), checkfirst=True)
+    op.add_column('inventory', sa.Column('status', stock_status, nullable=True))
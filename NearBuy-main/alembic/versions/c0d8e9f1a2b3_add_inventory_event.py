@@ -0,0 +1,47 @@
+"""Add inventory event history
+
+Revision ID: c0d8e9f1a2b3
+Revises: b9c7d8e0f1a2
+Create Date: 2026-10-19 18:02:37.214406
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+EVENT_DEFAULT_PARTITION = "CREATE TABLE IF NOT EXISTS inventory_event_default PARTITION OF inventory_event DEFAULT"
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c0d8e9f1a2b3'
+down_revision: Union[str, Sequence[str], None] = 'b9c7d8e0f1a2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('inventory_event',
+    sa.Column('event_id', sa.BigInteger(), nullable=False),
+    sa.Column('created_at', sa.Integer(), nullable=False),
+    sa.Column('shop_id', sa.Uuid(), nullable=False),
+    sa.Column('item_id', sa.Uuid(), nullable=False),
+    sa.Column('delta', sa.Integer(), nullable=False),
+    sa.Column('quantity', sa.Integer(), nullable=False),
+    sa.Column('price', sa.Float(), nullable=True),
+    sa.Column('source', sa.SmallInteger(), nullable=False),
+    sa.PrimaryKeyConstraint('event_id', 'created_at'),
+    postgresql_partition_by='RANGE (created_at)',
+    )
+    op.create_index('ix_inventory_event_created_at', 'inventory_event', ['created_at'], unique=False, postgresql_using='brin')
+    op.create_index('ix_inventory_event_shop_id_created_at', 'inventory_event', ['shop_id', 'created_at'], unique=False)
+    # monthly partitions are created ahead by the app (app.core.inventory_history.ensure_partitions)
+    op.execute(EVENT_DEFAULT_PARTITION)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_inventory_event_shop_id_created_at', table_name='inventory_event')
+    op.drop_index('ix_inventory_event_created_at', table_name='inventory_event')
+    op.drop_table('inventory_event')
@@ -0,0 +1,30 @@
+"""Add reindex checkpoint
+
+Revision ID: c4d2e3f5a6b7
+Revises: b3c1d2e4f5a6
+Create Date: 2026-10-19 11:02:17.904512
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c4d2e3f5a6b7'
+down_revision: Union[str, Sequence[str], None] = 'b3c1d2e4f5a6'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('sync_checkpoint', sa.Column('reindex_cursor', sa.String(), nullable=True))
+    op.add_column('sync_checkpoint', sa.Column('reindex_started_at', sa.Integer(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('sync_checkpoint', 'reindex_started_at')
+    op.drop_column('sync_checkpoint', 'reindex_cursor')
@@ -0,0 +1,51 @@
+"""Bump item updated_at on stock status change
+
+Revision ID: d1e9f0a2b3c4
+Revises: c0d8e9f1a2b3
+Create Date: 2026-10-20 10:12:48.630275
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# the status trigger also stamps the item, so the incremental sync and the rebuild catch-up
+# (which select items by updated_at) see restocks and sell-outs
+STATUS_CHANGE_FUNCTION = """
+CREATE OR REPLACE FUNCTION inventory_status_changed() RETURNS trigger AS $$
+BEGIN
+    UPDATE item SET updated_at = extract(epoch from now()) WHERE id = COALESCE(NEW.item_id, OLD.item_id);
+    INSERT INTO outbox_event (collection, document_id, invalidate, status, attempts, created_at, next_attempt_at)
+    VALUES ('items', COALESCE(NEW.item_id, OLD.item_id)::text, '{}', 'PENDING', 0,
+            extract(epoch from clock_timestamp()), extract(epoch from clock_timestamp()));
+    RETURN NULL;
+END $$ LANGUAGE plpgsql
+"""
+PREVIOUS_STATUS_CHANGE_FUNCTION = """
+CREATE OR REPLACE FUNCTION inventory_status_changed() RETURNS trigger AS $$
+BEGIN
+    INSERT INTO outbox_event (collection, document_id, invalidate, status, attempts, created_at, next_attempt_at)
+    VALUES ('items', COALESCE(NEW.item_id, OLD.item_id)::text, '{}', 'PENDING', 0,
+            extract(epoch from clock_timestamp()), extract(epoch from clock_timestamp()));
+    RETURN NULL;
+END $$ LANGUAGE plpgsql
+"""
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd1e9f0a2b3c4'
+down_revision: Union[str, Sequence[str], None] = 'c0d8e9f1a2b3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute(STATUS_CHANGE_FUNCTION)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute(PREVIOUS_STATUS_CHANGE_FUNCTION)
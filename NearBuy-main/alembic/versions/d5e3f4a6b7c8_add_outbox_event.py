@@ -0,0 +1,42 @@
+"""Add outbox event
+
+Revision ID: d5e3f4a6b7c8
+Revises: c4d2e3f5a6b7
+Create Date: 2026-10-19 12:26:03.118734
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd5e3f4a6b7c8'
+down_revision: Union[str, Sequence[str], None] = 'c4d2e3f5a6b7'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'outbox_event',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('collection', sa.String(), nullable=False),
+        sa.Column('document_id', sa.String(), nullable=False),
+        sa.Column('invalidate', sa.JSON(), nullable=True),
+        sa.Column('status', sa.Enum('PENDING', 'DEAD', name='outboxstatus'), nullable=False),
+        sa.Column('attempts', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('created_at', sa.Float(), nullable=False),
+        sa.Column('next_attempt_at', sa.Float(), nullable=False),
+        sa.Column('last_error', sa.String(), nullable=True),
+    )
+    op.create_index('ix_outbox_event_status_next_attempt_at', 'outbox_event', ['status', 'next_attempt_at'])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_outbox_event_status_next_attempt_at', table_name='outbox_event')
+    op.drop_table('outbox_event')
+    sa.Enum(name='outboxstatus').drop(op.get_bind(), checkfirst=True)
@@ -0,0 +1,28 @@
+"""Add reindex target
+
+Revision ID: e6f4a5b7c8d9
+Revises: d5e3f4a6b7c8
+Create Date: 2026-10-19 13:41:52.460391
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e6f4a5b7c8d9'
+down_revision: Union[str, Sequence[str], None] = 'd5e3f4a6b7c8'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('sync_checkpoint', sa.Column('reindex_target', sa.String(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('sync_checkpoint', 'reindex_target')
@@ -0,0 +1,30 @@
+"""Add reconcile checkpoint
+
+Revision ID: f7a5b6c8d9e0
+Revises: e6f4a5b7c8d9
+Create Date: 2026-10-19 14:37:05.218846
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f7a5b6c8d9e0'
+down_revision: Union[str, Sequence[str], None] = 'e6f4a5b7c8d9'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('sync_checkpoint', sa.Column('reconciled_at', sa.Integer(), nullable=True))
+    op.add_column('sync_checkpoint', sa.Column('reconcile_drift', sa.Integer(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('sync_checkpoint', 'reconcile_drift')
+    op.drop_column('sync_checkpoint', 'reconciled_at')
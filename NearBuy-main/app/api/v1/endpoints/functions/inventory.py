@@ -1,25 +1,175 @@
+import asyncio
 import time
 import traceback
 import uuid
-from fastapi import Request,status
-from sqlmodel import Session
-from app.db.models.inventory import InventoryTableEnum
-from app.db.models.item import ItemTableEnum
+from contextlib import aclosing
+from typing import List
+from fastapi import Request, WebSocket, status
+from fastapi.responses import StreamingResponse
+from pydantic import TypeAdapter, ValidationError
+from sqlalchemy import column, func, insert, update, values
+from sqlmodel import Session, select
+from RDB.cache import Tagged, TwoTierCache
+from app.db.models.inventory import INVENTORY, INVENTORY_RESERVATION, InventoryEventSource, InventoryTableEnum
+from app.db.models.item import ITEM, ItemTableEnum
 from app.db.models.shop import ShopTableEnum
 from app.db.models.user import UserRole, UserTableEnum
-from app.db.schemas.inventory import InventoryBase, InventoryUpdate
-from app.db.session import DB
-from app.helpers.helpers import extract_model, get_fastApi_req_data, recursive_to_str, send_json_response
+from app.db.schemas.inventory import InventoryBase, InventoryBulkRow, InventoryUpdate, ReservationCreate, StockChange
+from app.core.inventory_history import inventory_event, load_events, record_events, velocity
+from app.core.inventory_stream import deleted_delta, inventory_deltas, inventory_stream, parse_sequence, sse_frame, websocket_frame
+from app.core.stock import commit_reservation, decrement, release, reserve
+from app.db.session import DB, VERSION_CONFLICT, websocket_session
+from app.helpers.helpers import extract_model, get_fastApi_req_data, parse_bulk_rows, row_to_dict, send_cached_json_response, send_json_response
+from app.helpers.variables import (
+    INVENTORY_BULK_MAX_ROWS, INVENTORY_RESERVATION_MAX_TTL, INVENTORY_RESERVATION_TTL, INVENTORY_VELOCITY_MAX_BUCKETS, INVENTORY_VELOCITY_WINDOW,
+)
 
 
 db = DB()
 
+# stock levels change often: always revalidate, a matching ETag still makes it a cheap 304
+INVENTORY_CACHE_CONTROL = "private, no-cache"
+
+BULK_ROWS = TypeAdapter(List[InventoryBulkRow])
+# what a new inventory row gets for the fields a bulk row leaves out, same as /inventory/add
+BULK_INSERT_DEFAULTS = {name: field.default for name, field in InventoryBase.model_fields.items() if name not in ("shop_id", "item_id", "quantity")}
+
+
+def validate_bulk_rows(raw_rows: list):
+    """Type-checks all rows in one pass, returns ({index: row}, {index: error})."""
+    try:
+        return dict(enumerate(BULK_ROWS.validate_python(raw_rows))), {}
+    except ValidationError as e:
+        errors = {}
+        for error in e.errors():
+            index, field = error["loc"][0], ".".join(str(part) for part in error["loc"][1:])
+            errors.setdefault(index, f"{field}: {error['msg']}" if field else error["msg"])
+    valid = [index for index in range(len(raw_rows)) if index not in errors]
+    return dict(zip(valid, BULK_ROWS.validate_python([raw_rows[index] for index in valid]))), errors
+
+
+def load_bulk_context(db_pool: Session, shop_id: uuid.UUID, rows: dict):
+    """
+    Two lookups for the whole upload: which items exist, and the shop's inventory for them. The
+    inventory rows are locked until apply_bulk_changes commits (or the caller rolls back), so a sale
+    can't move them in between and the planned changes and recorded deltas hold.
+    """
+    item_ids = set()
+    for row in rows.values():
+        try:
+            item_ids.add(uuid.UUID(row.item_id))
+        except ValueError:
+            pass
+    if not item_ids:
+        return set(), {}
+    known_items = set(db_pool.exec(select(ITEM.id).where(ITEM.id.in_(item_ids))).all())
+    existing = db_pool.exec(
+        select(INVENTORY).where(INVENTORY.shop_id == shop_id, INVENTORY.item_id.in_(item_ids)).with_for_update()
+    ).all()
+    return known_items, {record.item_id: record for record in existing}
+
+
+def plan_bulk_changes(shop_id: uuid.UUID, rows: dict, errors: dict, existing: dict, known_items: set, now: int):
+    """
+    Checks validated rows against the shop's current inventory (`existing`, item id -> INVENTORY)
+    and returns (results, inserts, updates): one result per input row, and only the rows that
+    change something as inserts (full rows) or updates ((item id, changed fields)).
+    """
+    results = {index: {"row": index, "result": "error", "error": error} for index, error in errors.items()}
+    inserts, updates, seen = [], [], set()
+    for index, row in rows.items():
+        result = results[index] = {"row": index, "item_id": row.item_id, "result": "error"}
+        fields = row.model_dump(exclude={"item_id"}, exclude_none=True)
+        try:
+            item_id = uuid.UUID(row.item_id)
+        except ValueError:
+            result["error"] = "item_id must be a UUID."
+            continue
+        current = existing.get(item_id)
+        min_q = fields.get("min_quantity", getattr(current, "min_quantity", None))
+        max_q = fields.get("max_quantity", getattr(current, "max_quantity", None))
+        if item_id not in known_items:
+            result["error"] = "Item not found."
+        elif item_id in seen:
+            result["error"] = "Duplicate item_id in this upload."
+        elif current is None and "quantity" not in fields:
+            result["error"] = "quantity is required for items without inventory in this shop."
+        elif fields.get("quantity", 0) < 0:
+            result["error"] = "Quantity must be zero or positive."
+        elif min_q is not None and max_q is not None and min_q > max_q:
+            result["error"] = "min_quantity must be less than or equal to max_quantity."
+        elif fields.get("expiry_date") is not None and fields["expiry_date"] < now:
+            result["error"] = "Expiry date must be in the future."
+        if "error" in result:
+            continue
+        seen.add(item_id)
+
+        if current is None:
+            inventory_id = str(uuid.uuid4())
+            inserts.append({**BULK_INSERT_DEFAULTS, "last_restocked_at": now, **fields,
+                            "inventory_id": inventory_id, "shop_id": shop_id, "item_id": item_id})
+            result.update(result="created", inventory_id=inventory_id)
+            continue
+        changed = {key: value for key, value in fields.items() if getattr(current, key) != value}
+        if changed:
+            updates.append((item_id, changed))
+        result.update(result="updated" if changed else "unchanged", inventory_id=current.inventory_id)
+    return [results[index] for index in sorted(results)], inserts, updates
+
+
+def bulk_events(shop_id: uuid.UUID, inserts: list, updated: list, existing: dict, now: int) -> list:
+    """
+    The stock movements of a bulk upload: the inserted rows, and the `updated` rows as the UPDATE
+    returned them against their locked pre-image in `existing` (unchanged quantities are dropped later).
+    """
+    events = [inventory_event(InventoryEventSource.BULK, shop_id, row["item_id"], row["quantity"], row["quantity"], row.get("price_at_entry"), now)
+              for row in inserts]
+    events += [inventory_event(InventoryEventSource.BULK, shop_id, row.item_id, row.quantity - existing[row.item_id].quantity, row.quantity,
+                               row.price_at_entry, now)
+               for row in updated]
+    return events
+
+
+def apply_bulk_changes(db_pool: Session, shop_id: uuid.UUID, inserts: list, updates: list, existing: dict, now: int):
+    """
+    One multi-row INSERT and one UPDATE ... FROM (VALUES ...) RETURNING, committed together with the
+    stock events built from what they wrote. `existing` is the load_bulk_context pre-image.
+    """
+    table = INVENTORY.__table__
+    if inserts:
+        db_pool.exec(insert(INVENTORY), params=inserts)
+    if updates:
+        names = sorted({name for _, changed in updates for name in changed})
+        changes = values(
+            column("item_id", table.c.item_id.type), *(column(name, table.c[name].type) for name in names), name="changes",
+        ).data([(item_id, *(changed.get(name) for name in names)) for item_id, changed in updates])
+        # fields a row didn't change are NULL in VALUES and keep their value
+        updated = db_pool.exec(
+            update(INVENTORY)
+            .where(INVENTORY.shop_id == shop_id, INVENTORY.item_id == changes.c.item_id)
+            .values({**{name: func.coalesce(changes.c[name], table.c[name]) for name in names}, "version": INVENTORY.version + 1})
+            .returning(INVENTORY.item_id, INVENTORY.quantity, INVENTORY.price_at_entry)
+        ).all()
+    else:
+        updated = []
+    record_events(db_pool, bulk_events(shop_id, inserts, updated, existing, now))
+    db_pool.commit()
+
+async def owns_shop(request: Request, shop_id, db_pool: Session) -> bool:
+    current_user = getattr(request.state, "emp", None)
+    if not current_user or getattr(current_user, "role", None) not in [UserRole.VENDOR, UserRole.ADMIN]:
+        return False
+    shop = await db.get_attr_all(dbClassNam=ShopTableEnum.SHOP, db_pool=db_pool, filters={"shop_id": shop_id}, all=False)
+    user = await db.get_attr_all(dbClassNam=UserTableEnum.USER, db_pool=db_pool, filters={"email": current_user.email}, all=False)
+    return bool(shop and user and str(shop.owner_id) == str(user.id))
+
+
 class INDB:
     def __init__(self):
         pass
 
     @staticmethod
-    async def add_inventory(request: Request, data: InventoryBase, db_pool: Session):
+    async def add_inventory(request: Request, data: InventoryBase, db_pool: Session, cache: TwoTierCache):
         try:
             apiData = await get_fastApi_req_data(request)
             if not apiData:
@@ -74,9 +224,15 @@ class INDB:
             if not ok or not inserted:
                 return send_json_response(message="Could not add inventory", status=status.HTTP_500_INTERNAL_SERVER_ERROR, body={})
             
+            record_events(db_pool, [inventory_event(InventoryEventSource.ADD, shop_id_val, item_id_val, inventory_data.get("quantity", 0),
+                                                    inventory_data.get("quantity", 0), inventory_data.get("price_at_entry"))])
+            db_pool.commit()
+            # status is computed by the database, reloaded so the response carries it
+            db_pool.refresh(inserted)
             res = inserted.model_dump(); res.pop("inventory_id", None); res.pop("shop_id", None)
 
-            db_pool.commit()
+            await cache.invalidate(keys=[f"inventory:{inventory_data['inventory_id']}", f"inventory_by_shop:{uuid.UUID(str(shop_id_val))}"])
+            await inventory_stream.publish(inventory_deltas(db_pool, [inventory_data["inventory_id"]]))
 
             return send_json_response(message="Inventory added", status=status.HTTP_201_CREATED, body=res)
         
@@ -86,7 +242,7 @@ class INDB:
 
 
     @staticmethod
-    async def update_inventory(request: Request, data: InventoryUpdate, db_pool: Session):
+    async def update_inventory(request: Request, data: InventoryUpdate, db_pool: Session, cache: TwoTierCache):
         import uuid, time
         try:
             identifier = {}
@@ -124,9 +280,11 @@ class INDB:
             update_data.pop("inventory_id", None)
             update_data.pop("shop_id", None)
             update_data.pop("item_id", None)
+            # the version read above unless the client says which one its change is based on
+            expected_version = update_data.pop("version", old_record.version)
 
             if not update_data:
-                return send_json_response(message="No data to update", status=status.HTTP_400_BAD_REQUEST, body=recursive_to_str(old_record.model_dump()))
+                return send_json_response(message="No data to update", status=status.HTTP_400_BAD_REQUEST, body=row_to_dict(old_record))
 
             if "quantity" in update_data and update_data["quantity"] < 0:
                 return send_json_response(message="Quantity must be zero or positive.", status=status.HTTP_400_BAD_REQUEST, body={})
@@ -148,7 +306,7 @@ class INDB:
                         all_same = False
                         break
             if all_same:
-                serial = recursive_to_str(old_record.model_dump())
+                serial = row_to_dict(old_record)
                 serial.pop("inventory_id", None)
                 serial.pop("shop_id", None)
                 serial.pop("item_id", None)
@@ -158,13 +316,24 @@ class INDB:
                     body=serial
                 )
 
-            message, success = await db.update_attr_all(dbClassNam=InventoryTableEnum.INVENTORY, data=update_data, db_pool=db_pool, identifier=identifier)
+            if update_data.get("quantity", old_record.quantity) != old_record.quantity:
+                # committed or rolled back with the update; old_record is the version it is conditioned on
+                record_events(db_pool, [inventory_event(
+                    InventoryEventSource.UPDATE, old_record.shop_id, old_record.item_id, update_data["quantity"] - old_record.quantity,
+                    update_data["quantity"], update_data.get("price_at_entry", old_record.price_at_entry),
+                )])
+            message, success = await db.update_versioned(dbClassNam=InventoryTableEnum.INVENTORY, data=update_data, db_pool=db_pool, identifier=identifier, version=expected_version)
+            if message == VERSION_CONFLICT:
+                current = extract_model(await db.get_attr_all(dbClassNam=InventoryTableEnum.INVENTORY, db_pool=db_pool, filters=identifier, all=False))
+                return send_json_response(message="Inventory was changed by someone else, reload and retry.", status=status.HTTP_409_CONFLICT, body=row_to_dict(current) if current else {})
             if not success:
                 return send_json_response(message=message, status=status.HTTP_500_INTERNAL_SERVER_ERROR, body={})
+            await cache.invalidate(tags=[f"inventory:{old_record.inventory_id}"])
+            await inventory_stream.publish(inventory_deltas(db_pool, [old_record.inventory_id]))
 
             updated = await db.get_attr_all(dbClassNam=InventoryTableEnum.INVENTORY, db_pool=db_pool, filters=identifier, all=False)
             updated = extract_model(updated)
-            serial = recursive_to_str(updated.model_dump())
+            serial = row_to_dict(updated)
             serial.pop("inventory_id", None)
             serial.pop("shop_id", None)
             serial.pop("item_id", None)
@@ -176,41 +345,267 @@ class INDB:
 
 
     @staticmethod
-    async def get_inventory_by_id(request, inventory_id, db_pool):
+    async def decrement_inventory(request: Request, inventory_id: str, data: StockChange, db_pool: Session, cache: TwoTierCache):
         try:
-            record = await db.get_attr_all(
-                dbClassNam=InventoryTableEnum.INVENTORY, 
-                db_pool=db_pool, 
-                filters={"inventory_id": inventory_id}, 
-                all=False
-            )
-            record = extract_model(record)
+            record = await db.get_attr_all(dbClassNam=InventoryTableEnum.INVENTORY, db_pool=db_pool, filters={"inventory_id": inventory_id}, all=False)
             if not record:
+                return send_json_response(message="Inventory record not found", status=status.HTTP_404_NOT_FOUND, body={})
+            if not await owns_shop(request, record.shop_id, db_pool):
+                return send_json_response(message="You can only sell from your own shop.", status=status.HTTP_403_FORBIDDEN, body={})
+
+            left = decrement(db_pool, inventory_id, data.quantity)
+            if left is None:
+                return send_json_response(message="Not enough stock.", status=status.HTTP_409_CONFLICT, body={"requested": data.quantity})
+            await cache.invalidate(tags=[f"inventory:{inventory_id}"])
+            await inventory_stream.publish(inventory_deltas(db_pool, [inventory_id]))
+            return send_json_response(message="Stock decremented", status=status.HTTP_200_OK, body={"inventory_id": inventory_id, "quantity": left})
+        except Exception as e:
+            db_pool.rollback()
+            traceback.print_exc()
+            return send_json_response(message="Error updating stock", status=status.HTTP_500_INTERNAL_SERVER_ERROR, body={})
+
+    @staticmethod
+    async def reserve_inventory(request: Request, inventory_id: str, data: ReservationCreate, db_pool: Session, cache: TwoTierCache):
+        try:
+            ttl = data.ttl_seconds or INVENTORY_RESERVATION_TTL
+            if ttl > INVENTORY_RESERVATION_MAX_TTL:
+                return send_json_response(message=f"ttl_seconds can be at most {INVENTORY_RESERVATION_MAX_TTL}.", status=status.HTTP_400_BAD_REQUEST, body={})
+            current_user = getattr(request.state, "emp", None)
+
+            reservation = reserve(db_pool, inventory_id, data.quantity, ttl, reserved_by=getattr(current_user, "email", None))
+            if reservation is None:
+                record = await db.get_attr_all(dbClassNam=InventoryTableEnum.INVENTORY, db_pool=db_pool, filters={"inventory_id": inventory_id}, all=False)
+                if not record:
+                    return send_json_response(message="Inventory record not found", status=status.HTTP_404_NOT_FOUND, body={})
+                return send_json_response(message="Not enough stock.", status=status.HTTP_409_CONFLICT, body={"requested": data.quantity})
+            await cache.invalidate(tags=[f"inventory:{inventory_id}"])
+            await inventory_stream.publish(inventory_deltas(db_pool, [inventory_id]))
+            return send_json_response(message="Stock reserved", status=status.HTTP_201_CREATED, body=row_to_dict(reservation))
+        except Exception as e:
+            db_pool.rollback()
+            traceback.print_exc()
+            return send_json_response(message="Error reserving stock", status=status.HTTP_500_INTERNAL_SERVER_ERROR, body={})
+
+    @staticmethod
+    async def finish_reservation(request: Request, reservation_id: str, commit: bool, db_pool: Session, cache: TwoTierCache):
+        """Release (units go back into stock) or commit (the sale went through) a reservation."""
+        try:
+            reservation = await db.get_attr_all(dbClassNam=InventoryTableEnum.INVENTORY_RESERVATION, db_pool=db_pool, filters={"reservation_id": reservation_id}, all=False)
+            if not reservation:
+                return send_json_response(message="Reservation not found or expired", status=status.HTTP_404_NOT_FOUND, body={})
+            current_user = getattr(request.state, "emp", None)
+            record = await db.get_attr_all(dbClassNam=InventoryTableEnum.INVENTORY, db_pool=db_pool, filters={"inventory_id": reservation.inventory_id}, all=False)
+            is_owner = bool(record) and await owns_shop(request, record.shop_id, db_pool)
+            # the shop completes sales; a buyer can only let go of their own hold
+            if not is_owner and (commit or reservation.reserved_by != getattr(current_user, "email", None)):
+                return send_json_response(message="Not allowed to change this reservation.", status=status.HTTP_403_FORBIDDEN, body={})
+
+            finished = commit_reservation(db_pool, reservation_id) if commit else release(db_pool, reservation_id)
+            if finished is None:
+                return send_json_response(message="Reservation not found or expired", status=status.HTTP_404_NOT_FOUND, body={})
+            await cache.invalidate(tags=[f"inventory:{finished['inventory_id']}"])
+            if not commit:
+                # a committed hold leaves the stock as it was
+                await inventory_stream.publish(inventory_deltas(db_pool, [finished["inventory_id"]]))
+            return send_json_response(message="Reservation committed" if commit else "Reservation released", status=status.HTTP_200_OK, body=finished)
+        except Exception as e:
+            db_pool.rollback()
+            traceback.print_exc()
+            return send_json_response(message="Error updating reservation", status=status.HTTP_500_INTERNAL_SERVER_ERROR, body={})
+
+    @staticmethod
+    async def bulk_update_inventory(request: Request, shop_id: str, db_pool: Session, cache: TwoTierCache):
+        try:
+            try:
+                shop_id = uuid.UUID(str(shop_id))
+            except ValueError:
+                return send_json_response(message="Invalid shop_id. Must be UUID.", status=status.HTTP_400_BAD_REQUEST, body={})
+
+            current_user = getattr(request.state, "emp", None)
+            if not current_user or getattr(current_user, "role", None) not in [UserRole.VENDOR, UserRole.ADMIN]:
+                return send_json_response(message="Only vendors can update inventory.", status=status.HTTP_403_FORBIDDEN, body={})
+            # ownership is checked once for the whole upload
+            shop = await db.get_attr_all(dbClassNam=ShopTableEnum.SHOP, db_pool=db_pool, filters={"shop_id": shop_id}, all=False)
+            if not shop:
+                return send_json_response(message="Shop not found.", status=status.HTTP_404_NOT_FOUND, body={})
+            user = await db.get_attr_all(dbClassNam=UserTableEnum.USER, db_pool=db_pool, filters={"email": current_user.email}, all=False)
+            if not user or str(shop.owner_id) != str(user.id):
+                return send_json_response(message="You can only update inventory for your own shop.", status=status.HTTP_403_FORBIDDEN, body={})
+
+            try:
+                raw_rows = parse_bulk_rows(await request.body(), request.headers.get("content-type", ""))
+            except ValueError as e:
+                return send_json_response(message=str(e), status=status.HTTP_400_BAD_REQUEST, body={})
+            if not raw_rows:
+                return send_json_response(message="No rows to update", status=status.HTTP_400_BAD_REQUEST, body={})
+            if len(raw_rows) > INVENTORY_BULK_MAX_ROWS:
+                return send_json_response(message=f"At most {INVENTORY_BULK_MAX_ROWS} rows per upload.", status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, body={})
+
+            rows, errors = validate_bulk_rows(raw_rows)
+            known_items, existing = load_bulk_context(db_pool, shop_id, rows)
+            now = int(time.time())
+            results, inserts, updates = plan_bulk_changes(shop_id, rows, errors, existing, known_items, now)
+            if not (inserts or updates):
+                # releases the rows load_bulk_context locked
+                db_pool.rollback()
+            else:
+                apply_bulk_changes(db_pool, shop_id, inserts, updates, existing, now)
+                # only what changed: the shop's list, and the updated rows (the list is tagged with them too)
+                await cache.invalidate(
+                    keys=[f"inventory_by_shop:{shop_id}"],
+                    tags=[f"inventory:{existing[item_id].inventory_id}" for item_id, _ in updates],
+                )
+                await inventory_stream.publish(inventory_deltas(db_pool, [
+                    result["inventory_id"] for result in results if result["result"] in ("created", "updated")
+                ]))
+
+            counts = {outcome: sum(1 for result in results if result["result"] == outcome) for outcome in ("created", "updated", "unchanged", "error")}
+            if counts["error"] == len(results):
+                return send_json_response(message="No valid rows", status=status.HTTP_400_BAD_REQUEST, body={**counts, "rows": results})
+            return send_json_response(message="Inventory updated", status=status.HTTP_200_OK, body={**counts, "rows": results})
+        except Exception as e:
+            db_pool.rollback()
+            traceback.print_exc()
+            return send_json_response(message="Error updating inventory", status=status.HTTP_500_INTERNAL_SERVER_ERROR, body={})
+
+    @staticmethod
+    async def get_inventory_by_id(request, inventory_id, db_pool, cache: TwoTierCache):
+        try:
+            async def load_inventory():
+                record = await db.get_attr_all(
+                    dbClassNam=InventoryTableEnum.INVENTORY, 
+                    db_pool=db_pool, 
+                    filters={"inventory_id": inventory_id}, 
+                    all=False
+                )
+                record = extract_model(record)
+                if not record:
+                    return None
+                tags = [f"inventory:{record.inventory_id}", f"shop:{record.shop_id}", f"item:{record.item_id}"]
+                return Tagged(row_to_dict(record), tags=tags)
+
+            entry, _ = await cache.get_or_load(f"inventory:{inventory_id}", load_inventory, cache_missing=True)
+            if entry is None:
                 return send_json_response(message="Not found", status=status.HTTP_404_NOT_FOUND, body={})
-            body = recursive_to_str(record.model_dump())
-            return send_json_response(message="Inventory found", status=status.HTTP_200_OK, body=body)
+            return send_cached_json_response(request, message="Inventory found", entry=entry, cache_control=INVENTORY_CACHE_CONTROL)
         except Exception as e:
             traceback.print_exc()
             return send_json_response(message="Error reading inventory", status=status.HTTP_500_INTERNAL_SERVER_ERROR, body={})
 
     @staticmethod
-    async def get_inventory_for_shop(request, shop_id, db_pool):
+    async def get_inventory_for_shop(request, shop_id, db_pool, cache: TwoTierCache):
         try:
-            records = await db.get_attr_all(
-                dbClassNam=InventoryTableEnum.INVENTORY, 
-                db_pool=db_pool, 
-                filters={"shop_id": shop_id}, 
-                all=True
-            )
-            body = [recursive_to_str(extract_model(r).model_dump()) for r in records] if records else []
-            return send_json_response(message="Inventories found", status=status.HTTP_200_OK, body=body)
+            try:
+                shop_id = str(uuid.UUID(str(shop_id)))
+            except ValueError:
+                return send_json_response(message="Invalid shop_id. Must be UUID.", status=status.HTTP_400_BAD_REQUEST, body=[])
+            async def load_shop_inventory():
+                records = await db.get_attr_all(
+                    dbClassNam=InventoryTableEnum.INVENTORY, 
+                    db_pool=db_pool, 
+                    filters={"shop_id": shop_id}, 
+                    all=True
+                )
+                if records is None:
+                    raise RuntimeError("get_attr_all returned no result")
+                rows = [row_to_dict(r) for r in records]
+                return Tagged(rows, tags=[f"inventory:{row['inventory_id']}" for row in rows])
+
+            entry, _ = await cache.get_or_load(f"inventory_by_shop:{shop_id}", load_shop_inventory, tags=[f"shop:{shop_id}"])
+            return send_cached_json_response(request, message="Inventories found", entry=entry, cache_control=INVENTORY_CACHE_CONTROL)
         except Exception as e:
             traceback.print_exc()
             return send_json_response(message="Error reading inventories", status=status.HTTP_500_INTERNAL_SERVER_ERROR, body=[])
 
+    @staticmethod
+    async def get_shop_velocity(request: Request, shop_id: str, start: int, end: int, bucket: int, item_id: str, db_pool: Session):
+        """Sell-through and restock analytics of a shop from its stock movement history."""
+        try:
+            try:
+                shop_id = uuid.UUID(str(shop_id))
+                item_id = uuid.UUID(str(item_id)) if item_id else None
+            except ValueError:
+                return send_json_response(message="shop_id and item_id must be valid UUIDs.", status=status.HTTP_400_BAD_REQUEST, body={})
+            end = end or int(time.time())
+            start = start if start is not None else end - INVENTORY_VELOCITY_WINDOW
+            if start >= end:
+                return send_json_response(message="start must be before end.", status=status.HTTP_400_BAD_REQUEST, body={})
+            if bucket and -(-(end - start) // bucket) > INVENTORY_VELOCITY_MAX_BUCKETS:
+                return send_json_response(message=f"At most {INVENTORY_VELOCITY_MAX_BUCKETS} buckets per request, use a larger bucket.", status=status.HTTP_400_BAD_REQUEST, body={})
+            if not await owns_shop(request, shop_id, db_pool):
+                return send_json_response(message="You can only see analytics of your own shop.", status=status.HTTP_403_FORBIDDEN, body={})
+
+            body = velocity(load_events(db_pool, shop_id, start, end, item_id), start, end, bucket)
+            return send_json_response(message="Inventory velocity", status=status.HTTP_200_OK, body={"shop_id": str(shop_id), **body})
+        except Exception as e:
+            db_pool.rollback()
+            traceback.print_exc()
+            return send_json_response(message="Error reading inventory history", status=status.HTTP_500_INTERNAL_SERVER_ERROR, body={})
+
+    @staticmethod
+    async def stream_shop_inventory(request: Request, shop_id: str, after: str):
+        """Server-Sent Events of the shop's inventory deltas, resumed after `after` / Last-Event-ID."""
+        try:
+            shop_id = str(uuid.UUID(str(shop_id)))
+        except ValueError:
+            return send_json_response(message="Invalid shop_id. Must be UUID.", status=status.HTTP_400_BAD_REQUEST, body={})
+        after = after or request.headers.get("last-event-id")
+        if after:
+            try:
+                parse_sequence(after)
+            except ValueError as e:
+                return send_json_response(message=str(e), status=status.HTTP_400_BAD_REQUEST, body={})
+        if not inventory_stream.accepting():
+            return send_json_response(message="Too many live connections, retry later.", status=status.HTTP_503_SERVICE_UNAVAILABLE, body={})
+
+        async def frames():
+            # sent right away so proxies and the client see the stream open
+            yield b"retry: 3000\n\n"
+            async with aclosing(inventory_stream.events(shop_id, after or None)) as events:
+                async for kind, sequence, payload in events:
+                    yield sse_frame(kind, sequence, payload)
+
+        return StreamingResponse(frames(), media_type="text/event-stream", headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+    @staticmethod
+    async def stream_shop_inventory_websocket(websocket: WebSocket, shop_id: str, after: str, db_pool: Session):
+        """The same deltas over a WebSocket, for clients that already hold one open."""
+        if not await websocket_session(websocket, db_pool, [UserRole.USER, UserRole.VENDOR, UserRole.ADMIN]):
+            await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+            return
+        try:
+            shop_id = str(uuid.UUID(str(shop_id)))
+            if after:
+                parse_sequence(after)
+        except ValueError:
+            await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+            return
+        if not inventory_stream.accepting():
+            await websocket.close(code=status.WS_1013_TRY_AGAIN_LATER)
+            return
+        await websocket.accept()
+
+        async def push():
+            async with aclosing(inventory_stream.events(shop_id, after or None)) as events:
+                async for kind, sequence, payload in events:
+                    await websocket.send_text(websocket_frame(kind, sequence, payload))
+
+        async def until_closed():
+            # nothing is expected from the client, this only notices it going away
+            while (await websocket.receive())["type"] != "websocket.disconnect":
+                pass
+
+        tasks = [asyncio.create_task(push()), asyncio.create_task(until_closed())]
+        try:
+            await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for task in tasks:
+                task.cancel()
+            # a send on a closed socket fails, that is just the client leaving
+            await asyncio.gather(*tasks, return_exceptions=True)
 
     @staticmethod
-    async def delete_inventory(request, inventory_id, db_pool):
+    async def delete_inventory(request, inventory_id, db_pool, cache: TwoTierCache):
         try:
             record = await db.get_attr_all(
                 dbClassNam="INVENTORY", 
@@ -222,7 +617,9 @@ class INDB:
             if not record:
                 return send_json_response(message="Not found", status=status.HTTP_404_NOT_FOUND, body={})
 
-            record_dict = recursive_to_str(record.model_dump())
+            record_dict = row_to_dict(record)
+            # committed by delete_attr together with the delete
+            record_events(db_pool, [inventory_event(InventoryEventSource.DELETE, record.shop_id, record.item_id, -record.quantity, 0, record.price_at_entry)])
 
             message, success = await db.delete_attr(
                 dbClassNam="INVENTORY", 
@@ -231,6 +628,8 @@ class INDB:
             )
             if not success:
                 return send_json_response(message=message, status=status.HTTP_500_INTERNAL_SERVER_ERROR, body={})
+            await cache.invalidate(tags=[f"inventory:{record.inventory_id}"])
+            await inventory_stream.publish({str(record.shop_id): [deleted_delta(record)]})
 
             return send_json_response(message="Inventory deleted", status=status.HTTP_200_OK, body=record_dict)
         except Exception as e:
@@ -1,28 +1,31 @@
-import json
 import traceback
 import uuid
 from fastapi import Request,status
-from fastapi.encoders import jsonable_encoder
-import redis
 from sqlmodel import Session
-import typesense
+from RDB.cache import Tagged, TwoTierCache
 from app.db.models.item import ItemTableEnum
 from app.db.models.shop import ShopTableEnum
 from app.db.models.user import UserRole, UserTableEnum
 from app.db.schemas.item import ItemCreate, ItemUpdate
 from app.db.session import DB
 from app.db.table_map import TABLE_CLASS_MAP
-from app.helpers.helpers import get_fastApi_req_data, send_json_response
+from app.core.outbox import outbox
+from app.helpers.helpers import fields_key, get_fastApi_req_data, parse_fields, row_to_dict, send_cached_json_response, send_json_response
 
 
 db = DB()
 
+# fields returned to clients, the internal id stays out
+ITEM_FIELDS = ("shop_id", "itemName", "price", "description", "note")
+ITEM_CACHE_CONTROL = "private, max-age=60, must-revalidate"
+ITEM_LIST_CACHE_CONTROL = "private, max-age=30, must-revalidate"
+
 class IDB:
     def __init__(self):
         pass
 
     @staticmethod
-    async def add_item(request: Request, data: ItemCreate, db_pool: Session, ts_client: typesense.Client, redis_client: redis.Redis):
+    async def add_item(request: Request, data: ItemCreate, db_pool: Session):
         try:
             apiData = await get_fastApi_req_data(request)
             if not apiData:
@@ -67,31 +70,13 @@ class IDB:
             if not ok or not inserted_item:
                 return send_json_response(message="Could not create item", status=status.HTTP_500_INTERNAL_SERVER_ERROR, body={})
             
+            # Typesense and the cache (including "not found" lookups for this name) are updated
+            # from the outbox event committed with the item
             db_pool.commit()
             db_pool.refresh(inserted_item)
+            outbox.wake()
 
-            # --- TYPESENSE INDEXING ---
-            try:
-                item_document = {
-                    'id': str(inserted_item.id),
-                    'shop_id': str(inserted_item.shop_id),
-                    'itemName': inserted_item.itemName,
-                    'price': inserted_item.price,
-                    'description': inserted_item.description,
-                    'note': inserted_item.note,
-                }
-                ts_client.collections['items'].documents.create(item_document)
-            except Exception as e:
-                print(f"Error indexing item {inserted_item.id} in Typesense: {e}")
-            # --- END TYPESENSE ---
-
-            # --- CACHE INVALIDATION ---
-            # redis_client.delete("all_items_cache")
-            for key in redis_client.keys("all_items:*"):
-                redis_client.delete(key)
-
-            serialized_item = jsonable_encoder(inserted_item)
-            serialized_item.pop("id", None)
+            serialized_item = row_to_dict(inserted_item, ITEM_FIELDS)
             return send_json_response(message="Item added successfully", status=status.HTTP_201_CREATED, body=serialized_item)
         
         except Exception as e:
@@ -108,37 +93,38 @@ class IDB:
 
 
     @staticmethod
-    async def get_all_items(request: Request, db_pool: Session, page: int, page_size: int, redis_client: redis.Redis):
-        cache_key = f"all_items:page_{page}:size_{page_size}"
+    async def get_all_items(request: Request, db_pool: Session, page: int, page_size: int, cache: TwoTierCache, fields: str = None):
         try:
-            cached_items = redis_client.get(cache_key)
-            if cached_items:
-                return send_json_response(message="Items retrieved from cache",status=status.HTTP_200_OK,body=json.loads(cached_items))
-            
-            offset = (page - 1) * page_size
-            model_class = TABLE_CLASS_MAP[ItemTableEnum.ITEM]
-            items, total_count = await db.get_attr_all_paginated(dbClassNam=model_class,db_pool=db_pool,offset=offset,limit=page_size)
-
-            if items is None:
-                return send_json_response(message="Error retrieving items",status=status.HTTP_500_INTERNAL_SERVER_ERROR,body={})
-
-            serialized_items = [
-                {k: v for k, v in item.items() if k != 'id'}
-                for item in jsonable_encoder(items)
-            ] if items else []
-
-            response_body = {
-                "data": serialized_items,
-                "pagination": {
-                    "page": page,
-                    "page_size": page_size,
-                    "total": total_count,
-                    "pages": (total_count + page_size - 1) // page_size
+            try:
+                fields = parse_fields(fields, ITEM_FIELDS)
+            except ValueError as e:
+                return send_json_response(message=str(e), status=status.HTTP_400_BAD_REQUEST, body={})
+            cache_key = await cache.versioned_key("all_items", f"page_{page}:size_{page_size}:fields_{fields_key(fields)}")
+
+            async def load_items_page():
+                offset = (page - 1) * page_size
+                model_class = TABLE_CLASS_MAP[ItemTableEnum.ITEM]
+                # id is always selected, the page is tagged with it
+                columns = ("id",) + fields if fields else None
+                items, total_count = await db.get_attr_all_paginated(dbClassNam=model_class,db_pool=db_pool,offset=offset,limit=page_size,columns=columns)
+                if items is None:
+                    raise RuntimeError("get_attr_all_paginated returned no result")
+
+                page_data = {
+                    "data": [row_to_dict(item, fields or ITEM_FIELDS) for item in items],
+                    "pagination": {
+                        "page": page,
+                        "page_size": page_size,
+                        "total": total_count,
+                        "pages": (total_count + page_size - 1) // page_size
+                    }
                 }
-            }
-            redis_client.set(cache_key, json.dumps(response_body), ex=3600)
-            
-            return send_json_response(message="Items retrieved successfully",status=status.HTTP_200_OK,body=response_body)
+                # an update to any item on the page drops just this page
+                item_ids = [item["id"] for item in items] if fields else [item.id for item in items]
+                return Tagged(page_data, tags=[f"item:{item_id}" for item_id in item_ids])
+
+            entry, _ = await cache.get_or_load(cache_key, load_items_page)
+            return send_cached_json_response(request, message="Items retrieved successfully", entry=entry, cache_control=ITEM_LIST_CACHE_CONTROL)
         
         except Exception as e:
             print("Exception caught at get_all_items:", str(e))
@@ -146,24 +132,27 @@ class IDB:
             return send_json_response(message="Error retrieving items",status=status.HTTP_500_INTERNAL_SERVER_ERROR,body={})
 
     @staticmethod
-    async def get_item(request: Request, itemName: str, db_pool: Session, redis_client: redis.Redis):
-        cache_key = f"item:{itemName}"
+    async def get_item(request: Request, itemName: str, db_pool: Session, cache: TwoTierCache, shop_id: str = None):
         try:
-            cached_item = redis_client.get(cache_key)
-            if cached_item:
-                return send_json_response(message="Item retrieved from cache",status=status.HTTP_200_OK,body=json.loads(cached_item))
-            
-            item = await db.get_attr_all(dbClassNam=ItemTableEnum.ITEM, db_pool=db_pool, filters={"itemName": itemName}, all=False)
-            
-            if not item:
+            # item names are only unique per shop; without shop_id any shop's item may be returned
+            filters = {"itemName": itemName}
+            if shop_id:
+                try:
+                    filters["shop_id"] = str(uuid.UUID(str(shop_id)))
+                except Exception:
+                    return send_json_response(message="Invalid shop_id. Must be UUID.", status=status.HTTP_400_BAD_REQUEST, body={})
+            cache_key = f"item:{filters.get('shop_id', '*')}:{itemName}"
+
+            async def load_item():
+                item = await db.get_attr_all(dbClassNam=ItemTableEnum.ITEM, db_pool=db_pool, filters=filters, all=False)
+                if not item:
+                    return None
+                return Tagged(row_to_dict(item, ITEM_FIELDS), tags=[f"item:{item.id}", f"shop:{item.shop_id}"])
+
+            entry, _ = await cache.get_or_load(cache_key, load_item, cache_missing=True)
+            if entry is None:
                 return send_json_response(message="Item not found", status=status.HTTP_404_NOT_FOUND, body={})
-            
-            # serialized_item = jsonable_encoder(item)
-            serialized_item = {k: v for k, v in jsonable_encoder(item).items() if k != 'id'}
-
-            redis_client.set(cache_key, json.dumps(serialized_item), ex=3600)
-
-            return send_json_response(message="Item retrieved successfully", status=status.HTTP_200_OK, body=serialized_item)
+            return send_cached_json_response(request, message="Item retrieved successfully", entry=entry, cache_control=ITEM_CACHE_CONTROL)
             
         except Exception as e:
             print("Exception caught at get_item: ", str(e))
@@ -171,7 +160,7 @@ class IDB:
             return send_json_response(message="Error retrieving item", status=status.HTTP_500_INTERNAL_SERVER_ERROR, body={})
 
     @staticmethod
-    async def update_item(request: Request, data: ItemUpdate, db_pool: Session, ts_client: typesense.Client, redis_client: redis.Redis):
+    async def update_item(request: Request, data: ItemUpdate, db_pool: Session):
         try:
             if not data.itemName or not data.shop_id:
                 return send_json_response(message="Both item name and shop ID are required for update.", status=status.HTTP_403_FORBIDDEN, body={})
@@ -205,28 +194,10 @@ class IDB:
                 return send_json_response(message=message, status=status.HTTP_500_INTERNAL_SERVER_ERROR, body={})
 
             db_pool.commit()
-            # --- CACHE INVALIDATION ---
-            redis_client.delete(f"item:{data.itemName}")
-            # redis_client.delete("all_items_cache")
-            for key in redis_client.keys("all_items:*"):
-                redis_client.delete(key)
-
-            # --- TYPESENSE UPDATE ---
-            try:
-                ts_document_update = {}
-                if 'description' in update_data:
-                    ts_document_update['description'] = update_data['description']
-                # Add other updatable fields here if necessary
-                
-                if ts_document_update:
-                    ts_client.collections['items'].documents[str(existing_item.id)].update(ts_document_update)
-            except Exception as e:
-                print(f"Error updating item {existing_item.id} in Typesense: {e}")
-            # --- END TYPESENSE ---
+            outbox.wake()
 
             updated_item = await DB.get_attr_all(dbClassNam=ItemTableEnum.ITEM, db_pool=db_pool, filters={"itemName": data.itemName, "shop_id": shop_id_val}, all=False)
-            serialized_item = jsonable_encoder(updated_item)
-            serialized_item.pop("id", None)
+            serialized_item = row_to_dict(updated_item, ITEM_FIELDS)
 
             return send_json_response(message="Item updated successfully", status=status.HTTP_200_OK, body=serialized_item)
         except Exception as e:
@@ -237,40 +208,31 @@ class IDB:
 
 
     @staticmethod
-    async def delete_item(request: Request, itemName: str, db_pool: Session, ts_client: typesense.Client, redis_client: redis.Redis):
+    async def delete_item(request: Request, itemName: str, db_pool: Session, shop_id: str = None):
         try:
-            # Note: Deleting just by name can be ambiguous if multiple shops have the same item name.
-            # A better approach would be to require shop_id for deletion.
-            # For now, we'll proceed with the current itemName logic.
-            item_to_delete = await DB.get_attr_all(dbClassNam=ItemTableEnum.ITEM, db_pool=db_pool, filters={"itemName": itemName}, all=False)
+            # Note: Deleting just by name is ambiguous if multiple shops have the same item name,
+            # pass shop_id to pick the shop. Without it the first match is deleted, as before.
+            filters = {"itemName": itemName}
+            if shop_id:
+                try:
+                    filters["shop_id"] = str(uuid.UUID(str(shop_id)))
+                except Exception:
+                    return send_json_response(message="Invalid shop_id. Must be UUID.", status=status.HTTP_400_BAD_REQUEST, body={})
+            item_to_delete = await DB.get_attr_all(dbClassNam=ItemTableEnum.ITEM, db_pool=db_pool, filters=filters, all=False)
             if not item_to_delete:
                 return send_json_response(message="Item not found", status=status.HTTP_404_NOT_FOUND, body={})
             
-            item_id_to_delete = str(item_to_delete.id)
-            serialized_item = jsonable_encoder(item_to_delete)
-            serialized_item.pop("id", None)
+            serialized_item = row_to_dict(item_to_delete, ITEM_FIELDS)
             
-            identifier = {"itemName": itemName}
+            identifier = {"id": item_to_delete.id}
             message, success = await DB.delete_attr(dbClassNam=ItemTableEnum.ITEM, db_pool=db_pool, identifier=identifier)
             
             if not success:
                 return send_json_response(message=message, status=status.HTTP_500_INTERNAL_SERVER_ERROR, body={})
             
             db_pool.commit()
+            outbox.wake()
 
-            # --- CACHE INVALIDATION ---
-            redis_client.delete(f"item:{itemName}")
-            # redis_client.delete("all_items_cache")
-            for key in redis_client.keys("all_items:*"):
-                redis_client.delete(key)
-
-            # --- TYPESENSE DELETE ---
-            try:
-                ts_client.collections['items'].documents[item_id_to_delete].delete()
-            except Exception as e:
-                print(f"Error deleting item {item_id_to_delete} from Typesense: {e}")
-            # --- END TYPESENSE ---
-            
             return send_json_response(message="Item deleted successfully", status=status.HTTP_200_OK, body=serialized_item)
             
         except Exception as e:
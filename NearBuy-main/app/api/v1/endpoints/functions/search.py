@@ -4,9 +4,13 @@ from sqlalchemy.orm import selectinload
 import typesense
 from app.db.models.shop import SHOP
 from app.db.models.item import ITEM
-from app.helpers.helpers import send_json_response
+from app.helpers.helpers import parse_fields, send_json_response
+from typesense_helper.typesense_client import shops_schema
 import traceback
 
+# shop document fields `?fields=` may ask for on search results
+SHOP_DOCUMENT_FIELDS = tuple(field["name"] for field in shops_schema["fields"] if field["name"] != "content_hash")
+
 class SearchDB:
 
     # async def search_shops(self, request, q: str, db_pool):
@@ -34,8 +38,13 @@ class SearchDB:
     #         traceback.print_exc()
     #         return send_json_response(message="Error searching items", status=500, body=[])
 
-    def search_nearby_items(self, q: str, lat: float, lon: float, radius_km: int, ts_client: typesense.Client):
+    def search_nearby_items(self, q: str, lat: float, lon: float, radius_km: int, ts_client: typesense.Client, fields: str = None, in_stock: bool = False):
         try:
+            try:
+                fields = parse_fields(fields, SHOP_DOCUMENT_FIELDS)
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=str(e))
+
             # Debug: Check if collections exist and have documents
             shops_stats = ts_client.collections['shops'].retrieve()
             items_stats = ts_client.collections['items'].retrieve()
@@ -54,8 +63,13 @@ class SearchDB:
             item_search_params = {
                 'q': q,
                 'query_by': 'itemName,description',
+                # only the shop ids are used from the item hits
+                'include_fields': 'shop_id',
                 'per_page': 250
             }
+            if in_stock:
+                # maintained from inventory status flips, see INVENTORY.status
+                item_search_params['filter_by'] = 'in_stock:true'
             
             # print(f"Searching items with params: {item_search_params}")
             item_results = ts_client.collections['items'].documents.search(item_search_params)
@@ -76,6 +90,11 @@ class SearchDB:
                 'sort_by': f'location({lat}, {lon}):asc', 
                 'per_page': 50
             }
+            if fields:
+                shop_search_params['include_fields'] = ",".join(fields)
+            else:
+                # bookkeeping for the reconciliation job, not part of the API
+                shop_search_params['exclude_fields'] = 'content_hash'
             
             # print(f"Searching shops with params: {shop_search_params}")
             shop_results = ts_client.collections['shops'].documents.search(shop_search_params)
@@ -83,6 +102,8 @@ class SearchDB:
 
             return send_json_response(message="Nearby shops with the item found.", status=200, body=shop_results['hits'])
 
+        except HTTPException:
+            raise
         except typesense.exceptions.RequestMalformed as e:
             print(f"RequestMalformed error: {e}")
             raise HTTPException(status_code=400, detail=f"Search query is malformed: {e}")
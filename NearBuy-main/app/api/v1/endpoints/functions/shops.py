@@ -1,30 +1,35 @@
-import json
 import traceback
+import uuid
 from fastapi import Request,status
-from fastapi.encoders import jsonable_encoder
-import redis
 from sqlmodel import Session
-from app.db.models.shop import ShopTableEnum
+from RDB.cache import Tagged, TwoTierCache
+from app.db.models.shop import SHOP, ShopTableEnum
 from app.db.models.user import UserTableEnum
 from app.db.schemas.shop import ShopCreate, ShopUpdate
 from app.db.session import DB
-from app.helpers.helpers import get_fastApi_req_data, recursive_to_str, send_json_response
-from app.helpers.geo import create_point_geometry, geometry_to_latlon
+from app.helpers.helpers import fields_key, get_fastApi_req_data, parse_fields, row_to_dict, send_cached_json_response, send_json_response
+from app.helpers.geo import create_point_geometry
+from app.core.outbox import outbox
 import warnings
-import typesense
 
 
 db = DB()
 
 warnings.filterwarnings("ignore", category=UserWarning, module="pydantic")
 
+# shop details rarely change; clients may reuse them briefly, then revalidate with If-None-Match
+SHOP_CACHE_CONTROL = "private, max-age=60, must-revalidate"
+SHOP_COLUMNS = tuple(field for field in SHOP.model_fields if field != "location")
+# what `?fields=` may ask for: the columns plus the coordinates projected out of location
+SHOP_FIELDS = SHOP_COLUMNS + ("latitude", "longitude")
+
 
 class SDB:
     def __init__(self):
         pass
 
     @staticmethod
-    async def create_shop(request: Request, data: ShopCreate, db_pool: Session, ts_client: typesense.Client):
+    async def create_shop(request: Request, data: ShopCreate, db_pool: Session):
         try:
             # if not data.owner_id != request.state.emp:
             #     return send_json_response(
@@ -59,25 +64,10 @@ class SDB:
                     status=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 )
 
+            # the outbox event committed with the shop takes care of Typesense and the cache
             db_pool.commit()
             db_pool.refresh(inserted_shop)
-
-            try:
-                shop_document = {
-                    "shop_id": str(inserted_shop.shop_id),
-                    "owner_id": str(inserted_shop.owner_id),
-                    "shopName": inserted_shop.shopName,
-                    "fullName": inserted_shop.fullName,
-                    "address": inserted_shop.address,
-                    "contact": inserted_shop.contact,     
-                    "description": inserted_shop.description,  
-                    "is_open": inserted_shop.is_open,      
-                    "location": [data.latitude, data.longitude],
-                    "created_at": inserted_shop.created_at,
-                }
-                ts_client.collections["shops"].documents.create(shop_document)
-            except Exception as e:
-                print(f"Error indexing shop {inserted_shop.shop_id}: {e}")
+            outbox.wake()
 
             return send_json_response(message="Shop created successfully", status=status.HTTP_201_CREATED, body={"shop_id": str(inserted_shop.shop_id)},)
         except Exception as e:
@@ -87,7 +77,7 @@ class SDB:
 
     @staticmethod
     async def update_shop(
-        request: Request, data: ShopUpdate, db_pool: Session, ts_client: typesense.Client, redis_client: redis.Redis
+        request: Request, data: ShopUpdate, db_pool: Session
     ):
         try:
             shop_obj = await DB.get_attr_all(
@@ -102,20 +92,14 @@ class SDB:
                 )
 
             update_data = data.model_dump(exclude_unset=True)
-            ts_update_doc = {}
 
             if "latitude" in update_data and "longitude" in update_data:
                 update_data["location"] = create_point_geometry(
                     data.latitude, data.longitude
                 )
-                ts_update_doc["location"] = [data.latitude, data.longitude]
 
             for field in ["shop_id", "latitude", "longitude"]:
                 update_data.pop(field, None)
-                
-            for key, value in update_data.items():
-                if key in ["shopName", "fullName", "address", "description"]:
-                    ts_update_doc[key] = value
 
             if not update_data:
                 return send_json_response(message="No new data provided.")
@@ -129,13 +113,7 @@ class SDB:
 
             if success:
                 db_pool.commit()
-                redis_client.delete(f"shop:{data.shop_id}")
-                redis_client.delete(f"shops_by_owner:{shop_obj.owner_id}")
-                if ts_update_doc:
-                    try:
-                        ts_client.collections["shops"].documents[str(data.shop_id)].update(ts_update_doc)
-                    except Exception as e:
-                        print(f"Error updating shop in Typesense {data.shop_id}: {e}")
+                outbox.wake()
                 return send_json_response(message="Shop updated successfully.")
             else:
                 return send_json_response(
@@ -151,67 +129,78 @@ class SDB:
             )
 
     @staticmethod
-    async def view_shop(request, owner_id, db_pool,redis_client: redis.Redis):
-        cache_key = f"shops_by_owner:{owner_id}"
+    async def view_shop(request, owner_id, db_pool, cache: TwoTierCache, fields: str = None):
         try:
-            cached_shops = redis_client.get(cache_key)
-            if cached_shops:
-                return send_json_response(
-                    message="Shops retrieved from cache",
-                    status=status.HTTP_200_OK,
-                    body=json.loads(cached_shops)
-                )
             if not owner_id:
                 return send_json_response(message="owner_id is required.", status=status.HTTP_400_BAD_REQUEST, body=[])
-            shops = await db.get_attr_all(dbClassNam=ShopTableEnum.SHOP,db_pool=db_pool,filters={"owner_id": owner_id},all=True)
-            if not shops:
+            # canonical form, so the cache key and its tag match what writes invalidate
+            try:
+                owner_id = str(uuid.UUID(str(owner_id)))
+            except ValueError:
+                return send_json_response(message="Invalid owner_id. Must be UUID.", status=status.HTTP_400_BAD_REQUEST, body=[])
+            try:
+                fields = parse_fields(fields, SHOP_FIELDS)
+            except ValueError as e:
+                return send_json_response(message=str(e), status=status.HTTP_400_BAD_REQUEST, body=[])
+            cache_key = f"shops_by_owner:{owner_id}:{fields_key(fields)}"
+
+            async def load_projected_shops():
+                # shop_id is always selected, the list is tagged with it
+                columns = ("shop_id",) + tuple(field for field in fields if field in SHOP_COLUMNS and field != "shop_id")
+                latlon = "latitude" in fields or "longitude" in fields
+                rows = await db.get_shops_with_latlon(db_pool=db_pool, filters={"owner_id": owner_id}, all=True, columns=columns, latlon=latlon)
+                if not rows:
+                    return None
+                return Tagged([row_to_dict(row, fields) for row in rows], tags=[f"shop:{row['shop_id']}" for row in rows])
+
+            async def load_owner_shops():
+                if fields is not None:
+                    return await load_projected_shops()
+                rows = await db.get_shops_with_latlon(db_pool=db_pool, filters={"owner_id": owner_id}, all=True)
+                if not rows:
+                    return None
+                shops = [shop for shop, _, _ in rows]
+                result = []
+                for shop, latitude, longitude in rows:
+                    shop_dict = row_to_dict(shop, exclude={"location"})
+                    if latitude is not None:
+                        shop_dict.update(latitude=latitude, longitude=longitude)
+                    result.append(shop_dict)
+                # changes to any of these shops drop the list too
+                return Tagged(result, tags=[f"shop:{shop.shop_id}" for shop in shops])
+
+            entry, _ = await cache.get_or_load(cache_key, load_owner_shops, tags=[f"owner:{owner_id}"])
+            if entry is None:
                 return send_json_response(message="No shop found", status=status.HTTP_404_NOT_FOUND, body=[])
-            result = []
-            for shop in shops:
-                # shop_dict = shop.model_dump(exclude={"location", "shop_id", "owner_id"})
-                shop_dict = jsonable_encoder(shop)
-                if shop.location:
-                    shop_dict.update(geometry_to_latlon(shop.location))
-                shop_dict.pop("location", None)
-                result.append(shop_dict)
-
-            result_str = recursive_to_str(result)
-            redis_client.set(cache_key, json.dumps(result_str), ex=3600) # Cache for 1 hour
-            
-            return send_json_response(message="Shops retrieved from DATABASE", status=status.HTTP_200_OK, body=result)
+            return send_cached_json_response(request, message="Shops retrieved", entry=entry, cache_control=SHOP_CACHE_CONTROL)
         except Exception as e:
             traceback.print_exc()
             return send_json_response(message="Error retrieving shops", status=status.HTTP_500_INTERNAL_SERVER_ERROR, body=[])
 
     @staticmethod
-    async def get_shop(request: Request, shop_id: str, db_pool: Session,redis_client: redis.Redis):
-        cache_key = f"shop:{shop_id}"
+    async def get_shop(request: Request, shop_id: str, db_pool: Session, cache: TwoTierCache):
         try:
-            cached_shop = redis_client.get(cache_key)
-            if cached_shop:
-                return send_json_response(
-                    message="Shop retrieved from cache",
-                    status=status.HTTP_200_OK,
-                    body=json.loads(cached_shop)
-                )
-
-            # shop_id may be UUID (not int)
-            shop = await db.get_attr_all(dbClassNam=ShopTableEnum.SHOP, db_pool=db_pool, filters={"shop_id": shop_id}, all=False)
-            if not shop:
+            # canonical form, so the cache key and its tag match what writes invalidate
+            try:
+                shop_id = str(uuid.UUID(str(shop_id)))
+            except ValueError:
                 return send_json_response(message="Shop not found",status=status.HTTP_404_NOT_FOUND,body={})
-
-            shop_dict = jsonable_encoder(shop)
-            latlon = geometry_to_latlon(shop.location)
-            shop_dict.update(latlon)
-            shop_dict.pop("location", None)
-            shop_dict.pop("shop_id", None)
-            shop_dict.pop("owner_id", None)
-
-            shop_dict = recursive_to_str(shop_dict)
-            redis_client.set(cache_key, json.dumps(shop_dict), ex=3600)
-
-
-            return send_json_response(message="Shop retrieved",status=status.HTTP_200_OK,body=shop_dict)
+            cache_key = f"shop:{shop_id}"
+
+            async def load_shop():
+                # shop_id may be UUID (not int)
+                row = await db.get_shops_with_latlon(db_pool=db_pool, filters={"shop_id": shop_id}, all=False)
+                if not row:
+                    return None
+                shop, latitude, longitude = row
+                shop_dict = row_to_dict(shop, exclude={"location", "shop_id", "owner_id"})
+                shop_dict.update(latitude=latitude, longitude=longitude)
+                return shop_dict
+
+            entry, _ = await cache.get_or_load(cache_key, load_shop, tags=[f"shop:{shop_id}"], cache_missing=True)
+            if entry is None:
+                return send_json_response(message="Shop not found",status=status.HTTP_404_NOT_FOUND,body={})
+            return send_cached_json_response(request, message="Shop retrieved", entry=entry, cache_control=SHOP_CACHE_CONTROL)
         except Exception as e:
             traceback.print_exc()
             return send_json_response(
@@ -222,7 +211,7 @@ class SDB:
 
 
     @staticmethod
-    async def delete_shop(request: Request, shop_id: str, db_pool: Session, ts_client: typesense.Client, redis_client: redis.Redis):
+    async def delete_shop(request: Request, shop_id: str, db_pool: Session):
         try:
             shop = await DB.get_attr_all(dbClassNam=ShopTableEnum.SHOP, db_pool=db_pool, filters={"shop_id": shop_id}, all=False)
             if not shop:
@@ -232,12 +221,7 @@ class SDB:
 
             if success:
                 db_pool.commit()
-                redis_client.delete(f"shop:{shop_id}")
-                redis_client.delete(f"shops_by_owner:{shop.owner_id}")
-                try:
-                    ts_client.collections['shops'].documents[str(shop_id)].delete()
-                except Exception as e:
-                    print(f"Error deleting shop from Typesense {shop_id}: {e}")
+                outbox.wake()
                 return send_json_response(message="Shop deleted successfully.")
             else:
                  return send_json_response(message="Failed to delete shop", status=status.HTTP_500_INTERNAL_SERVER_ERROR)
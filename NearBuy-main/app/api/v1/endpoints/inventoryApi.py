@@ -1,7 +1,8 @@
-from fastapi import APIRouter, Depends, Request
+from fastapi import APIRouter, Depends, Query, Request, WebSocket
+from RDB.cache import TwoTierCache, get_cache
 from app.api.v1.endpoints.functions.inventory import INDB
 from app.db.models.user import UserRole
-from app.db.schemas.inventory import InventoryBase, InventoryUpdate
+from app.db.schemas.inventory import InventoryBase, InventoryUpdate, ReservationCreate, StockChange
 from app.db.session import DataBasePool, authentication_required
 
 
@@ -11,25 +12,71 @@ idb = INDB()
 
 @inventory_router.post("/add")
 @authentication_required([UserRole.VENDOR, UserRole.ADMIN])
-async def add_inventory_endpoint(request: Request, data: InventoryBase, db_pool=Depends(DataBasePool.get_pool)):
-    return await idb.add_inventory(request, data, db_pool)
+async def add_inventory_endpoint(request: Request, data: InventoryBase, db_pool=Depends(DataBasePool.get_pool), cache: TwoTierCache = Depends(get_cache)):
+    return await idb.add_inventory(request, data, db_pool, cache)
 
 @inventory_router.patch("/update")
 @authentication_required([UserRole.VENDOR, UserRole.ADMIN])
-async def update_inventory_endpoint(request: Request, data: InventoryUpdate, db_pool=Depends(DataBasePool.get_pool)):
-    return await idb.update_inventory(request, data, db_pool)
+async def update_inventory_endpoint(request: Request, data: InventoryUpdate, db_pool=Depends(DataBasePool.get_pool), cache: TwoTierCache = Depends(get_cache)):
+    return await idb.update_inventory(request, data, db_pool, cache)
+
+@inventory_router.post("/bulk", description="Create/update many inventory rows of one shop from a JSON array or a CSV upload (Content-Type: text/csv), with a result per row")
+@authentication_required([UserRole.VENDOR, UserRole.ADMIN])
+async def bulk_update_inventory_endpoint(request: Request, shop_id: str = Query(...), db_pool=Depends(DataBasePool.get_pool), cache: TwoTierCache = Depends(get_cache)):
+    return await idb.bulk_update_inventory(request, shop_id, db_pool, cache)
+
+@inventory_router.post("/{inventory_id}/decrement", description="Atomically take units out of stock (a sale), 409 if there aren't enough")
+@authentication_required([UserRole.VENDOR, UserRole.ADMIN])
+async def decrement_inventory_endpoint(request: Request, inventory_id: str, data: StockChange, db_pool=Depends(DataBasePool.get_pool), cache: TwoTierCache = Depends(get_cache)):
+    return await idb.decrement_inventory(request, inventory_id, data, db_pool, cache)
+
+@inventory_router.post("/{inventory_id}/reserve", description="Hold units for a while; they're out of stock until released, committed or expired")
+@authentication_required([UserRole.USER, UserRole.VENDOR, UserRole.ADMIN])
+async def reserve_inventory_endpoint(request: Request, inventory_id: str, data: ReservationCreate, db_pool=Depends(DataBasePool.get_pool), cache: TwoTierCache = Depends(get_cache)):
+    return await idb.reserve_inventory(request, inventory_id, data, db_pool, cache)
+
+@inventory_router.post("/reservations/{reservation_id}/release")
+@authentication_required([UserRole.USER, UserRole.VENDOR, UserRole.ADMIN])
+async def release_reservation_endpoint(request: Request, reservation_id: str, db_pool=Depends(DataBasePool.get_pool), cache: TwoTierCache = Depends(get_cache)):
+    return await idb.finish_reservation(request, reservation_id, False, db_pool, cache)
+
+@inventory_router.post("/reservations/{reservation_id}/commit")
+@authentication_required([UserRole.VENDOR, UserRole.ADMIN])
+async def commit_reservation_endpoint(request: Request, reservation_id: str, db_pool=Depends(DataBasePool.get_pool), cache: TwoTierCache = Depends(get_cache)):
+    return await idb.finish_reservation(request, reservation_id, True, db_pool, cache)
 
 @inventory_router.get("/{inventory_id}")
 @authentication_required([UserRole.USER, UserRole.VENDOR, UserRole.ADMIN])
-async def get_inventory_by_id_endpoint(request: Request, inventory_id: str, db_pool=Depends(DataBasePool.get_pool)):
-    return await idb.get_inventory_by_id(request, inventory_id, db_pool)
+async def get_inventory_by_id_endpoint(request: Request, inventory_id: str, db_pool=Depends(DataBasePool.get_pool), cache: TwoTierCache = Depends(get_cache)):
+    return await idb.get_inventory_by_id(request, inventory_id, db_pool, cache)
 
 @inventory_router.get("/shop/{shop_id}")
 @authentication_required([UserRole.USER, UserRole.VENDOR, UserRole.ADMIN])
-async def get_inventory_for_shop_endpoint(request: Request, shop_id: str, db_pool=Depends(DataBasePool.get_pool)):
-    return await idb.get_inventory_for_shop(request, shop_id, db_pool)
+async def get_inventory_for_shop_endpoint(request: Request, shop_id: str, db_pool=Depends(DataBasePool.get_pool), cache: TwoTierCache = Depends(get_cache)):
+    return await idb.get_inventory_for_shop(request, shop_id, db_pool, cache)
+
+@inventory_router.get("/shop/{shop_id}/velocity", description="Units sold/restocked per item, sales per day, sell-through and days of stock left over a time window, from the stock movement history")
+@authentication_required([UserRole.VENDOR, UserRole.ADMIN])
+async def get_shop_velocity_endpoint(
+    request: Request, shop_id: str,
+    start: int = Query(None, ge=0, description="Window start (epoch seconds), defaults to INVENTORY_VELOCITY_WINDOW before end"),
+    end: int = Query(None, gt=0, description="Window end (epoch seconds, exclusive), defaults to now"),
+    bucket: int = Query(None, gt=0, description="Also return units sold per bucket of this many seconds"),
+    item_id: str = Query(None, description="Only this item"),
+    db_pool=Depends(DataBasePool.get_pool),
+):
+    return await idb.get_shop_velocity(request, shop_id, start, end, bucket, item_id, db_pool)
+
+@inventory_router.get("/shop/{shop_id}/stream", description="Server-Sent Events of the shop's inventory changes; resume with Last-Event-ID or ?after=, a `reset` event means reload /inventory/shop/{shop_id}")
+@authentication_required([UserRole.USER, UserRole.VENDOR, UserRole.ADMIN])
+async def stream_inventory_for_shop_endpoint(request: Request, shop_id: str, after: str = Query(None, description="Sequence (event id) of the last change received"), db_pool=Depends(DataBasePool.get_pool)):
+    return await idb.stream_shop_inventory(request, shop_id, after)
+
+@inventory_router.websocket("/shop/{shop_id}/ws")
+async def inventory_for_shop_websocket(websocket: WebSocket, shop_id: str, after: str = Query(None), db_pool=Depends(DataBasePool.get_pool)):
+    await idb.stream_shop_inventory_websocket(websocket, shop_id, after, db_pool)
 
 @inventory_router.delete("/{inventory_id}")
 @authentication_required([UserRole.VENDOR, UserRole.ADMIN])
-async def delete_inventory_endpoint(request: Request, inventory_id: str, db_pool=Depends(DataBasePool.get_pool)):
-    return await idb.delete_inventory(request, inventory_id, db_pool)
+async def delete_inventory_endpoint(request: Request, inventory_id: str, db_pool=Depends(DataBasePool.get_pool), cache: TwoTierCache = Depends(get_cache)):
+    return await idb.delete_inventory(request, inventory_id, db_pool, cache)
@@ -26,10 +26,12 @@ def search_nearby_endpoint(
     lat: float = Query(..., description="Your current latitude.", ge=-90, le=90),
     lon: float = Query(..., description="Your current longitude.", ge=-180, le=180),
     radius_km: int = Query(5, description="The search radius in kilometers.", ge=1, le=50),
+    fields: str = Query(None, description="Comma-separated shop fields to return, e.g. shop_id,shopName,location for map pins."),
+    in_stock: bool = Query(False, description="Only shops that have the item in stock."),
     ts_client: typesense.Client = Depends(get_typesense_client)
 ):
     try:
-        results = searchdb.search_nearby_items(q=q, lat=lat, lon=lon, radius_km=radius_km, ts_client=ts_client)
+        results = searchdb.search_nearby_items(q=q, lat=lat, lon=lon, radius_km=radius_km, ts_client=ts_client, fields=fields, in_stock=in_stock)
         return results
     except HTTPException as e:
         raise e
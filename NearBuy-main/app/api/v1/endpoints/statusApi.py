@@ -1,4 +1,11 @@
-from fastapi import APIRouter, Request
+from fastapi import APIRouter, Depends, Query, Request
+from RDB.cache import TwoTierCache, get_cache
+from app.core.compression import compression_metrics
+from app.core.inventory_stream import inventory_stream
+from app.core.outbox import outbox, outbox_backlog
+from app.core.reconcile import reconciler, reconcile_status
+from app.db.models.user import UserRole
+from app.db.session import DataBasePool, authentication_required
 from app.helpers.helpers import send_json_response
 import time
 
@@ -12,4 +19,37 @@ async def health_check():
 async def app_info():
     return send_json_response(message="App Info",status=200,body={"app": "NearBuy API","version": "1.0.0","docs": "/docs"})
 
+@status_router.get("/cache", description="Cache hit ratios, payload sizes, Redis latency and hot keys of the worker serving the request")
+@authentication_required([UserRole.ADMIN])
+async def cache_stats(request: Request, top: int = Query(20, gt=0, le=200), cache: TwoTierCache = Depends(get_cache), db_pool=Depends(DataBasePool.get_pool)):
+    body = cache.metrics.snapshot(top_keys=top)
+    body["local_entries"] = len(cache.local)
+    body["local_negative_entries"] = len(cache.negative)
+    return send_json_response(message="Cache stats", status=200, body=body)
+
+@status_router.get("/compression", description="Bytes before/after compression and compression time per route, for the worker serving the request")
+@authentication_required([UserRole.ADMIN])
+async def compression_stats(request: Request, db_pool=Depends(DataBasePool.get_pool)):
+    return send_json_response(message="Compression stats", status=200, body=compression_metrics.snapshot())
+
+@status_router.get("/outbox", description="Search-index/cache outbox backlog (index lag) and this worker's drain stats")
+@authentication_required([UserRole.ADMIN])
+async def outbox_stats(request: Request, db_pool=Depends(DataBasePool.get_pool)):
+    body = outbox_backlog(db_pool)
+    body["worker"] = outbox.metrics.snapshot()
+    return send_json_response(message="Outbox stats", status=200, body=body)
+
+@status_router.get("/reconcile", description="Documents found drifted between Postgres and Typesense per collection, and this worker's last reconciliation reports")
+@authentication_required([UserRole.ADMIN])
+async def reconcile_stats(request: Request, db_pool=Depends(DataBasePool.get_pool)):
+    body = reconcile_status(db_pool)
+    body["worker"] = reconciler.reports
+    return send_json_response(message="Reconcile stats", status=200, body=body)
+
+@status_router.get("/stream", description="Live inventory connections of the worker serving the request, deltas published, replayed and clients that lagged")
+@authentication_required([UserRole.ADMIN])
+async def stream_stats(request: Request, db_pool=Depends(DataBasePool.get_pool)):
+    # db_pool is what authentication_required validates the admin session against
+    return send_json_response(message="Stream stats", status=200, body=inventory_stream.snapshot())
+
 #other status/statistics endpoints in future!
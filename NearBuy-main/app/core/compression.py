@@ -0,0 +1,140 @@
+import gzip
+import time
+from collections import defaultdict
+
+from starlette.datastructures import Headers, MutableHeaders
+
+from app.helpers.variables import COMPRESSION_MIN_BYTES
+
+try:
+    import brotli
+except ImportError:  # brotli is optional, gzip is always available
+    brotli = None
+
+# Levels for responses compressed per request (cheap) and for cached payloads that are compressed
+# once and then served many times (denser).
+DYNAMIC_LEVELS = {"br": 4, "gzip": 6}
+PRECOMPRESSED_LEVELS = {"br": 9, "gzip": 9}
+COMPRESSIBLE_TYPES = ("application/json", "text/", "application/javascript")
+
+
+def negotiate_encoding(accept_encoding: str):
+    """Best encoding the client accepts (brotli over gzip), None for identity."""
+    accepted = {}
+    for part in accept_encoding.lower().split(","):
+        name, _, params = part.strip().partition(";")
+        q = 1.0
+        if params.strip().startswith("q="):
+            try:
+                q = float(params.strip()[2:])
+            except ValueError:
+                q = 0.0
+        accepted[name.strip()] = q
+    if brotli is not None and accepted.get("br", 0) > 0:
+        return "br"
+    if accepted.get("gzip", 0) > 0:
+        return "gzip"
+    return None
+
+
+def compress(data: bytes, encoding: str, level: int) -> bytes:
+    if encoding == "br":
+        return brotli.compress(data, quality=level)
+    return gzip.compress(data, compresslevel=level, mtime=0)
+
+
+def route_key(scope) -> str:
+    # the route template ("/api/v1/shops/{shop_id}"), so ids don't explode the metrics
+    route = scope.get("route")
+    return f"{scope['method']} {getattr(route, 'path', scope['path'])}"
+
+
+class CompressionMetrics:
+    """Per-process, per-route bytes before/after compression and time spent compressing."""
+
+    def __init__(self):
+        self.routes = defaultdict(lambda: defaultdict(float))
+
+    def record(self, route: str, outcome: str, bytes_in: int, bytes_out: int, seconds: float = 0.0):
+        stats = self.routes[route]
+        stats[outcome] += 1
+        stats["bytes_in"] += bytes_in
+        stats["bytes_out"] += bytes_out
+        stats["compress_ms"] += seconds * 1000
+
+    def snapshot(self) -> dict:
+        result = {}
+        for route, stats in sorted(self.routes.items()):
+            bytes_in, bytes_out = stats["bytes_in"], stats["bytes_out"]
+            result[route] = {
+                **{k: int(v) for k, v in stats.items() if k != "compress_ms"},
+                "compress_ms": round(stats["compress_ms"], 3),
+                "ratio": round(bytes_out / bytes_in, 4) if bytes_in else None,
+                "saved_bytes": int(bytes_in - bytes_out),
+            }
+        return result
+
+
+compression_metrics = CompressionMetrics()
+
+
+class CompressionMiddleware:
+    """
+    gzip/brotli for responses of at least `minimum_size` bytes, negotiated from Accept-Encoding.
+    Responses that already carry a Content-Encoding (precompressed cache hits, see
+    send_cached_json_response, which records its own metrics) and streamed responses are
+    passed through untouched.
+    """
+
+    def __init__(self, app, minimum_size: int = COMPRESSION_MIN_BYTES, metrics: CompressionMetrics = compression_metrics):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.metrics = metrics
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        encoding = negotiate_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        start_message = None
+        passthrough = False
+
+        async def send_compressed(message):
+            nonlocal start_message, passthrough
+            if passthrough:
+                await send(message)
+                return
+            if message["type"] == "http.response.start":
+                # hold the headers until the body shows whether compressing is worth it
+                start_message = message
+                return
+            if message["type"] != "http.response.body" or start_message is None:
+                await send(message)
+                return
+
+            passthrough = True
+            body = message.get("body", b"")
+            headers = MutableHeaders(raw=start_message["headers"])
+            route = route_key(scope)
+            if "content-encoding" in headers or message.get("more_body") or not headers.get("content-type", "").startswith(COMPRESSIBLE_TYPES):
+                pass
+            elif encoding is None or len(body) < self.minimum_size:
+                headers.add_vary_header("Accept-Encoding")
+                self.metrics.record(route, "uncompressed", len(body), len(body))
+            else:
+                started = time.perf_counter()
+                compressed = compress(body, encoding, DYNAMIC_LEVELS[encoding])
+                self.metrics.record(route, "compressed", len(body), len(compressed), time.perf_counter() - started)
+                headers["Content-Encoding"] = encoding
+                headers["Content-Length"] = str(len(compressed))
+                headers.add_vary_header("Accept-Encoding")
+                etag = headers.get("etag")
+                if etag and not etag.startswith("W/"):
+                    # the encoded bytes differ from the ones the strong validator describes
+                    headers["ETag"] = f"W/{etag}"
+                message = {**message, "body": compressed}
+            await send(start_message)
+            await send(message)
+
+        await self.app(scope, receive, send_compressed)
@@ -0,0 +1,170 @@
+"""
+Inventory movement history (INVENTORY_EVENT) and restock analytics over it.
+
+Every write that changes a quantity appends one event (delta, quantity after, price, source) in
+the same transaction. Velocity is computed from a shop's events in a time window: the rows are read
+as a handful of columns, turned into NumPy arrays and aggregated per item with bincount, so a window
+of months costs one index range scan on (shop_id, created_at) in the partitions it covers plus a few
+vectorized passes, not a GROUP BY per question.
+
+Units "sold" are what left through sales and holds, net of holds that came back: the negated sum of
+SALE, RESERVE, RELEASE and EXPIRE deltas. Other decreases (manual updates, deletes) are "adjusted".
+"""
+import asyncio
+import calendar
+import time
+import traceback
+import uuid
+from datetime import datetime, timezone
+import numpy as np
+from sqlalchemy import insert, text
+from sqlmodel import Session, select
+
+from app.db.models.inventory import INVENTORY, INVENTORY_EVENT, InventoryEventSource
+from app.helpers.variables import INVENTORY_EVENT_PARTITIONS_AHEAD
+
+DAY = 86400
+# how often each worker makes sure the coming months have their partitions
+PARTITION_MAINTENANCE_INTERVAL = DAY
+
+OUT_SOURCES = np.array([InventoryEventSource.SALE, InventoryEventSource.RESERVE, InventoryEventSource.RELEASE, InventoryEventSource.EXPIRE])
+
+# RETURNING these from a stock UPDATE is all stock_event needs
+STOCK_EVENT_COLUMNS = (INVENTORY.quantity, INVENTORY.shop_id, INVENTORY.item_id, INVENTORY.price_at_entry)
+
+
+def inventory_event(source: InventoryEventSource, shop_id, item_id, delta: int, quantity: int, price=None, now: int = None) -> dict:
+    return {"created_at": now or int(time.time()), "shop_id": uuid.UUID(str(shop_id)), "item_id": uuid.UUID(str(item_id)),
+            "delta": delta, "quantity": quantity, "price": price, "source": int(source)}
+
+
+def stock_event(source: InventoryEventSource, row, delta: int) -> dict:
+    """From an INVENTORY row (or a STOCK_EVENT_COLUMNS row), after the change."""
+    return inventory_event(source, row.shop_id, row.item_id, delta, row.quantity, row.price_at_entry)
+
+
+def record_events(session: Session, events: list):
+    """Adds the events to the session's transaction; the caller's commit (or rollback) covers them."""
+    events = [event for event in events if event["delta"]]
+    if events:
+        session.exec(insert(INVENTORY_EVENT), params=events)
+
+
+# --- partitions ---
+
+def month_start(year: int, month: int) -> int:
+    return calendar.timegm((year + (month - 1) // 12, (month - 1) % 12 + 1, 1, 0, 0, 0))
+
+
+def ensure_partitions(session: Session, now: int = None, ahead: int = INVENTORY_EVENT_PARTITIONS_AHEAD) -> list:
+    """Creates the monthly partitions from this month to `ahead` months on (Postgres only), returns their names."""
+    if session.get_bind().dialect.name != "postgresql":
+        return []
+    current = datetime.fromtimestamp(now or time.time(), tz=timezone.utc)
+    names = []
+    for offset in range(ahead + 1):
+        start = month_start(current.year, current.month + offset)
+        end = month_start(current.year, current.month + offset + 1)
+        name = f"inventory_event_{datetime.fromtimestamp(start, tz=timezone.utc):%Y_%m}"
+        session.exec(text(f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF inventory_event FOR VALUES FROM ({start}) TO ({end})"))
+        names.append(name)
+    session.commit()
+    return names
+
+
+async def run_partition_maintenance(interval: float = PARTITION_MAINTENANCE_INTERVAL):
+    """Long-running task, started from the app lifespan."""
+    from app.db.session import DataBasePool
+
+    def maintain():
+        with Session(DataBasePool._engine) as session:
+            ensure_partitions(session)
+
+    while True:
+        try:
+            await asyncio.to_thread(maintain)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            traceback.print_exc()
+        await asyncio.sleep(interval)
+
+
+# --- analytics ---
+
+def load_events(session: Session, shop_id, start: int, end: int, item_id=None) -> dict:
+    """The shop's events in [start, end) as column arrays, oldest first."""
+    statement = (
+        select(INVENTORY_EVENT.item_id, INVENTORY_EVENT.created_at, INVENTORY_EVENT.delta, INVENTORY_EVENT.quantity,
+               INVENTORY_EVENT.price, INVENTORY_EVENT.source)
+        .where(INVENTORY_EVENT.shop_id == uuid.UUID(str(shop_id)), INVENTORY_EVENT.created_at >= start, INVENTORY_EVENT.created_at < end)
+        .order_by(INVENTORY_EVENT.created_at, INVENTORY_EVENT.event_id)
+    )
+    if item_id is not None:
+        statement = statement.where(INVENTORY_EVENT.item_id == uuid.UUID(str(item_id)))
+    rows = session.exec(statement).all()
+    item_ids, created_at, delta, quantity, price, source = zip(*rows) if rows else ((),) * 6
+    return {
+        "item_id": np.array([str(i) for i in item_ids], dtype=str),
+        "created_at": np.array(created_at, dtype=np.int64),
+        "delta": np.array(delta, dtype=np.int64),
+        "quantity": np.array(quantity, dtype=np.int64),
+        "price": np.array([np.nan if p is None else p for p in price], dtype=np.float64),
+        "source": np.array(source, dtype=np.int16),
+    }
+
+
+def velocity(events: dict, start: int, end: int, bucket: int = None) -> dict:
+    """
+    Per item: units sold, restocked and adjusted, revenue, units sold per day, sell-through
+    (sold / (sold + on hand)), on hand at the last event and the days of stock that leaves; plus
+    shop totals and, with `bucket` seconds, the units sold per bucket.
+    """
+    days = (end - start) / DAY
+    items, group = np.unique(events["item_id"], return_inverse=True)
+    n = len(items)
+    delta = events["delta"]
+    out = np.isin(events["source"], OUT_SOURCES)
+
+    sold = -np.bincount(group, weights=np.where(out, delta, 0), minlength=n)
+    restocked = np.bincount(group, weights=np.where(~out & (delta > 0), delta, 0), minlength=n)
+    adjusted = np.bincount(group, weights=np.where(~out & (delta < 0), delta, 0), minlength=n)
+    revenue = -np.bincount(group, weights=np.where(out, delta * np.nan_to_num(events["price"]), 0), minlength=n)
+
+    # on hand after each item's latest event: sort by (item, time), last index of every run
+    order = np.lexsort((events["created_at"], group))
+    last = order[np.r_[np.flatnonzero(np.diff(group[order])), len(order) - 1]] if n else order
+    on_hand = events["quantity"][last]
+
+    per_day = sold / days
+    moved = sold + on_hand
+    sell_through = np.divide(sold, moved, out=np.full(n, np.nan), where=moved > 0)
+    days_left = np.divide(on_hand, per_day, out=np.full(n, np.nan), where=per_day > 0)
+
+    series = None
+    if bucket:
+        buckets = -(-(end - start) // bucket)
+        index = group * buckets + (events["created_at"] - start) // bucket
+        series = np.bincount(index, weights=np.where(out, -delta, 0), minlength=n * buckets).reshape(n, buckets)
+
+    def number(value, digits=2):
+        return None if np.isnan(value) else round(float(value), digits)
+
+    rows = []
+    for i in np.argsort(-sold, kind="stable"):
+        row = {
+            "item_id": str(items[i]), "sold": int(sold[i]), "restocked": int(restocked[i]), "adjusted": int(adjusted[i]),
+            "revenue": round(float(revenue[i]), 2), "per_day": round(float(per_day[i]), 3), "on_hand": int(on_hand[i]),
+            "sell_through": number(sell_through[i], 3), "days_of_stock_left": number(days_left[i], 1),
+        }
+        if series is not None:
+            row["series"] = series[i].astype(int).tolist()
+        rows.append(row)
+
+    total_sold = int(sold.sum())
+    return {
+        "start": start, "end": end, "days": round(days, 3), "bucket": bucket, "events": int(len(delta)),
+        "totals": {"sold": total_sold, "restocked": int(restocked.sum()), "adjusted": int(adjusted.sum()),
+                   "revenue": round(float(revenue.sum()), 2), "per_day": round(total_sold / days, 3)},
+        "items": rows,
+    }
@@ -0,0 +1,280 @@
+"""
+Live inventory changes per shop, so shop pages stop polling /inventory/shop/{shop_id}.
+
+Writes publish compact deltas (quantity, status, version of the rows they touched) through
+PUBLISH_DELTAS_SCRIPT: each delta is appended to the shop's Redis stream, whose entry id is the
+delta's sequence number, and the batch is published on INVENTORY_STREAM_CHANNEL. Every worker holds
+one subscription on that channel and fans the deltas out to its own SSE/WebSocket clients.
+
+Each connection has a bounded queue. A client that can't keep up (or a worker whose subscription
+dropped) doesn't buffer without limit: its queue is emptied and it catches up from the Redis stream,
+which keeps the last INVENTORY_STREAM_REPLAY deltas of a shop. That is also how a reconnecting
+client resumes (Last-Event-ID / ?after=). A client whose sequence has fallen out of that window gets
+a `reset` event and reloads the shop's inventory.
+
+Deltas are published after the write commits, so two concurrent writes can publish out of order;
+clients keep the highest `version` they have seen per inventory_id.
+"""
+import asyncio
+import traceback
+from collections import Counter, defaultdict
+from typing import Optional
+import orjson
+from sqlmodel import Session, select
+
+from RDB.redis_client import redis_client as default_redis_client
+from app.db.models.inventory import INVENTORY
+from app.helpers.variables import (
+    INVENTORY_STREAM_CHANNEL,
+    INVENTORY_STREAM_HEARTBEAT,
+    INVENTORY_STREAM_MAX_SUBSCRIBERS,
+    INVENTORY_STREAM_QUEUE_SIZE,
+    INVENTORY_STREAM_REPLAY,
+    INVENTORY_STREAM_RETENTION,
+)
+
+STREAM_PREFIX = "inventory_stream:"
+
+# Appends every delta to the shop's stream and publishes them, with their ids, as one message.
+# ARGV: channel, max stream length, retention seconds, shop_id, deltas (JSON) ...
+PUBLISH_DELTAS_SCRIPT = """
+local events = {}
+for i = 5, #ARGV do
+    local id = redis.call("XADD", KEYS[1], "MAXLEN", "~", ARGV[2], "*", "d", ARGV[i])
+    events[#events + 1] = '["' .. id .. '",' .. ARGV[i] .. ']'
+end
+redis.call("EXPIRE", KEYS[1], ARGV[3])
+redis.call("PUBLISH", ARGV[1], '{"shop_id":"' .. ARGV[4] .. '","events":[' .. table.concat(events, ",") .. ']}')
+return #events
+"""
+
+# what a subscriber's generator yields besides deltas
+PING, RESET = "ping", "reset"
+
+
+def parse_sequence(sequence: str) -> tuple:
+    """Redis stream ids ("1718000000000-3") compare as (milliseconds, counter)."""
+    milliseconds, _, counter = sequence.partition("-")
+    if not milliseconds.isdigit() or not counter.isdigit():
+        raise ValueError(f"Invalid sequence {sequence!r}")
+    return int(milliseconds), int(counter)
+
+
+def delta(row) -> dict:
+    return {"inventory_id": row.inventory_id, "item_id": str(row.item_id), "quantity": row.quantity,
+            "status": row.status, "version": row.version}
+
+
+def deleted_delta(record: INVENTORY) -> dict:
+    return {"inventory_id": record.inventory_id, "item_id": str(record.item_id), "deleted": True}
+
+
+def inventory_deltas(session: Session, inventory_ids) -> dict:
+    """{shop_id: [delta]} of the rows as committed, one indexed read for the whole write."""
+    rows = session.exec(
+        select(INVENTORY.shop_id, INVENTORY.inventory_id, INVENTORY.item_id, INVENTORY.quantity, INVENTORY.status, INVENTORY.version)
+        .where(INVENTORY.inventory_id.in_(list(inventory_ids)))
+    ).all()
+    changes = defaultdict(list)
+    for row in rows:
+        changes[str(row.shop_id)].append(delta(row))
+    return dict(changes)
+
+
+def encode_event(sequence: str, change: dict) -> bytes:
+    # encoded once per event, every connection of the shop sends the same bytes
+    return orjson.dumps({"type": "inventory", "seq": sequence, **change})
+
+
+class Subscriber:
+    __slots__ = ("shop_id", "queue", "lagged")
+
+    def __init__(self, shop_id: str, size: int):
+        self.shop_id = shop_id
+        self.queue = asyncio.Queue(maxsize=size)
+        self.lagged = False
+
+    def overflow(self):
+        # drop what is buffered and catch up from the Redis stream instead; None wakes the reader
+        self.lagged = True
+        while not self.queue.empty():
+            self.queue.get_nowait()
+        self.queue.put_nowait(None)
+
+
+class InventoryStream:
+    def __init__(self, redis_client, channel: str = INVENTORY_STREAM_CHANNEL, queue_size: int = INVENTORY_STREAM_QUEUE_SIZE,
+                 heartbeat: float = INVENTORY_STREAM_HEARTBEAT, max_subscribers: int = INVENTORY_STREAM_MAX_SUBSCRIBERS):
+        self.redis = redis_client
+        self.channel = channel
+        self.queue_size = queue_size
+        self.heartbeat = heartbeat
+        self.max_subscribers = max_subscribers
+        self.subscribers = defaultdict(set)
+        self.count = 0
+        self.counts = Counter()
+
+    # --- publishing ---
+
+    async def publish(self, changes: dict):
+        """
+        Publishes {shop_id: [delta]}. Never fails the write that produced them: a lost delta only
+        means subscribers see the change on their next reload.
+        """
+        for shop_id, deltas in changes.items():
+            if not deltas:
+                continue
+            try:
+                await self.redis.eval(PUBLISH_DELTAS_SCRIPT, 1, f"{STREAM_PREFIX}{shop_id}", self.channel, INVENTORY_STREAM_REPLAY,
+                                      INVENTORY_STREAM_RETENTION, shop_id, *(orjson.dumps(change) for change in deltas))
+                self.counts["published"] += len(deltas)
+            except Exception:
+                self.counts["publish_errors"] += 1
+                traceback.print_exc()
+
+    # --- fan-out ---
+
+    def accepting(self) -> bool:
+        """False when this worker already holds max_subscribers connections."""
+        if self.count < self.max_subscribers:
+            return True
+        self.counts["rejected"] += 1
+        return False
+
+    def subscribe(self, shop_id: str) -> Subscriber:
+        subscriber = Subscriber(shop_id, self.queue_size)
+        self.subscribers[shop_id].add(subscriber)
+        self.count += 1
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber):
+        subscribers = self.subscribers.get(subscriber.shop_id)
+        if subscribers is None or subscriber not in subscribers:
+            return
+        subscribers.discard(subscriber)
+        if not subscribers:
+            del self.subscribers[subscriber.shop_id]
+        self.count -= 1
+
+    def dispatch(self, data: bytes):
+        message = orjson.loads(data)
+        subscribers = self.subscribers.get(message["shop_id"])
+        if not subscribers:
+            return
+        events = [(sequence, encode_event(sequence, change)) for sequence, change in message["events"]]
+        for subscriber in list(subscribers):
+            if subscriber.lagged:
+                continue
+            for event in events:
+                try:
+                    subscriber.queue.put_nowait(event)
+                except asyncio.QueueFull:
+                    self.counts["lagged"] += 1
+                    subscriber.overflow()
+                    break
+
+    def _lag_all(self):
+        for subscribers in self.subscribers.values():
+            for subscriber in subscribers:
+                if not subscriber.lagged:
+                    subscriber.overflow()
+
+    async def listen(self):
+        """
+        Long-running task: this worker's one subscription to the deltas of every shop. Reconnects
+        on errors; whatever was published meanwhile is caught up from the streams.
+        """
+        while True:
+            pubsub = self.redis.pubsub(ignore_subscribe_messages=True)
+            try:
+                await pubsub.subscribe(self.channel)
+                self._lag_all()
+                while True:
+                    # explicit timeout so the pool's socket_timeout doesn't break an idle subscription
+                    message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+                    if message and message.get("type") == "message":
+                        self.dispatch(message["data"])
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                traceback.print_exc()
+                await asyncio.sleep(1)
+            finally:
+                await pubsub.aclose()
+
+    # --- per connection ---
+
+    async def replay(self, shop_id: str, after: str) -> Optional[list]:
+        """The events after `after` from the shop's stream, None if `after` is no longer in it."""
+        entries = await self.redis.xrange(f"{STREAM_PREFIX}{shop_id}", min=after, max="+")
+        if not entries or entries[0][0].decode() != after:
+            return None
+        return [(entry_id.decode(), encode_event(entry_id.decode(), orjson.loads(fields[b"d"]))) for entry_id, fields in entries[1:]]
+
+    async def events(self, shop_id: str, after: str = None):
+        """
+        Yields (kind, sequence, payload) for one connection: deltas in sequence order, PING when
+        nothing happened for `heartbeat` seconds, RESET when the client has to reload. Subscribed
+        until the generator is closed.
+        """
+        subscriber = self.subscribe(shop_id)
+        try:
+            async for event in self._events(subscriber, after):
+                yield event
+        finally:
+            self.unsubscribe(subscriber)
+
+    async def _events(self, subscriber: Subscriber, after: str = None):
+        last = after
+        if last is not None:
+            # resuming: start with what was missed
+            subscriber.lagged = True
+        while True:
+            if subscriber.lagged:
+                subscriber.lagged = False
+                missed = await self.replay(subscriber.shop_id, last) if last is not None else None
+                if missed is None:
+                    self.counts["resets"] += 1
+                    last = None
+                    yield RESET, None, None
+                else:
+                    self.counts["replayed"] += len(missed)
+                    for sequence, payload in missed:
+                        last = sequence
+                        yield "inventory", sequence, payload
+                continue
+            try:
+                event = await asyncio.wait_for(subscriber.queue.get(), self.heartbeat)
+            except asyncio.TimeoutError:
+                yield PING, None, None
+                continue
+            if event is None:
+                continue
+            sequence, payload = event
+            # the live queue overlaps what a replay already sent
+            if last is not None and parse_sequence(sequence) <= parse_sequence(last):
+                continue
+            last = sequence
+            yield "inventory", sequence, payload
+
+    def snapshot(self) -> dict:
+        return {"subscribers": self.count, "shops": len(self.subscribers), **self.counts}
+
+
+def sse_frame(kind: str, sequence: str = None, payload: bytes = None) -> bytes:
+    if kind == PING:
+        return b": ping\n\n"
+    if kind == RESET:
+        return b'event: reset\ndata: {"type":"reset"}\n\n'
+    return b"id: " + sequence.encode() + b"\nevent: inventory\ndata: " + payload + b"\n\n"
+
+
+def websocket_frame(kind: str, sequence: str = None, payload: bytes = None) -> str:
+    if kind == PING:
+        return '{"type":"ping"}'
+    if kind == RESET:
+        return '{"type":"reset"}'
+    return payload.decode()
+
+
+inventory_stream = InventoryStream(default_redis_client)
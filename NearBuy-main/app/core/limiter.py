@@ -1,5 +1,57 @@
+import ipaddress
+from fastapi import Request
 from slowapi import Limiter
 from slowapi.util import get_remote_address
 
-# This creates a limiter that identifies users by their IP address.
-limiter = Limiter(key_func=get_remote_address)
\ No newline at end of file
+from app.helpers import variables
+
+
+TRUSTED_PROXIES = [ipaddress.ip_network(proxy, strict=False) for proxy in variables.RATE_LIMIT_TRUSTED_PROXIES]
+
+
+def is_trusted_proxy(host: str) -> bool:
+    try:
+        address = ipaddress.ip_address(host)
+    except ValueError:
+        return False
+    return any(address in network for network in TRUSTED_PROXIES)
+
+
+def get_client_ip(request: Request) -> str:
+    """
+    The socket address, unless the request came through one of RATE_LIMIT_TRUSTED_PROXIES: only then
+    are the forwarded headers believed (same precedence as get_fastApi_req_data: Cloudflare first,
+    then the reverse proxy). Anyone else could put a new address in them on every request.
+    """
+    remote = get_remote_address(request)
+    if is_trusted_proxy(remote):
+        headers = request.headers
+        return headers.get("cf-connecting-ip") or headers.get("x-real-ip") or remote
+    return remote
+
+
+def get_rate_limit_key(request: Request) -> str:
+    """
+    The limited routes (/users/login, /search/nearby) are open to anonymous callers, so they are limited by
+    client IP. A cookie is no identity before it has been validated: a fresh value would be a fresh bucket.
+    """
+    return f"ip:{get_client_ip(request)}"
+
+
+# Limits are stored in Redis so they are shared by every uvicorn worker and survive restarts.
+# The moving-window strategy runs as a single Lua script in Redis, so checking the window and
+# recording the hit is one atomic round trip.
+# If Redis errors out or is slower than RATE_LIMIT_REDIS_TIMEOUT the limiter fails open onto a
+# per-process in-memory limiter until Redis is healthy again.
+limiter = Limiter(
+    key_func=get_rate_limit_key,
+    storage_uri=variables.RATE_LIMIT_STORAGE_URI,
+    storage_options={
+        "socket_timeout": variables.RATE_LIMIT_REDIS_TIMEOUT,
+        "socket_connect_timeout": variables.RATE_LIMIT_REDIS_TIMEOUT,
+    },
+    strategy=variables.RATE_LIMIT_STRATEGY,
+    key_prefix="ratelimit",
+    in_memory_fallback_enabled=variables.RATE_LIMIT_FAIL_OPEN,
+    swallow_errors=variables.RATE_LIMIT_FAIL_OPEN,
+)
@@ -0,0 +1,240 @@
+import asyncio
+import time
+import traceback
+import uuid
+from collections import Counter, defaultdict
+from sqlalchemy import func
+from sqlmodel import Session, delete, select
+
+from RDB.metrics import LatencyHistogram
+from app.db.models.outbox import OUTBOX_EVENT, OutboxStatus
+from app.helpers.variables import (
+    OUTBOX_BATCH_SIZE, OUTBOX_FLUSH_DELAY, OUTBOX_LEASE_SECONDS, OUTBOX_MAX_ATTEMPTS, OUTBOX_MAX_BACKOFF, OUTBOX_POLL_INTERVAL,
+    OUTBOX_RETRY_BACKOFF, OUTBOX_SHUTDOWN_TIMEOUT,
+)
+from typesense_helper.incremental_sync import SOURCES, delete_documents
+
+# commit -> indexed+invalidated, in milliseconds
+LAG_BUCKETS_MS = (10, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000, 60000)
+
+
+class OutboxMetrics:
+    def __init__(self):
+        self.lag = LatencyHistogram(LAG_BUCKETS_MS)
+        self.counts = Counter()
+        self.last_drain_at = None
+
+    def snapshot(self) -> dict:
+        drained = self.counts["processed"] + self.counts["failed"]
+        return {
+            "lag": self.lag.snapshot(), **self.counts, "last_drain_at": self.last_drain_at,
+            "events_per_flush": round(drained / self.counts["flushes"], 2) if self.counts["flushes"] else None,
+        }
+
+
+class OutboxWorker:
+    """
+    Drains OUTBOX_EVENT: for each batch, re-reads the current rows and upserts them into Typesense
+    (or deletes documents whose row is gone), then applies the cache invalidations. Everything is
+    idempotent, so a batch that fails is simply retried with backoff; an event that keeps failing
+    for OUTBOX_MAX_ATTEMPTS is marked DEAD and left for inspection.
+
+    Claimed events are leased (next_attempt_at pushed OUTBOX_LEASE_SECONDS ahead, FOR UPDATE SKIP
+    LOCKED), so every uvicorn worker can run one of these.
+
+    Writes are coalesced: after a wake-up the worker waits up to OUTBOX_FLUSH_DELAY for more, or
+    until OUTBOX_BATCH_SIZE events are waiting, so a burst of small writes becomes one `import_`.
+    The buffer is the table itself and a drain holds at most one batch, so memory stays bounded.
+    """
+
+    def __init__(self, engine=None, ts_client=None, cache=None, batch_size: int = OUTBOX_BATCH_SIZE):
+        self._engine = engine
+        self._ts_client = ts_client
+        self._cache = cache
+        self.batch_size = batch_size
+        self.metrics = OutboxMetrics()
+        self._wake = asyncio.Event()
+        self._full = asyncio.Event()
+        self._waiting = 0
+
+    @property
+    def engine(self):
+        if self._engine is None:
+            from app.db.session import DataBasePool
+            return DataBasePool._engine
+        return self._engine
+
+    @property
+    def ts_client(self):
+        if self._ts_client is None:
+            from typesense_helper.typesense_client import get_typesense_client
+            return get_typesense_client()
+        return self._ts_client
+
+    @property
+    def cache(self):
+        if self._cache is None:
+            from RDB.cache import cache
+            return cache
+        return self._cache
+
+    def wake(self, events: int = 1):
+        """Called after a commit that wrote events, so they're drained now instead of at the next poll."""
+        self._waiting += events
+        self._wake.set()
+        if self._waiting >= self.batch_size:
+            self._full.set()
+
+    async def run(self):
+        """Long-running task, started from the app lifespan."""
+        while True:
+            try:
+                drained = await self.drain_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                traceback.print_exc()
+                drained = 0
+            if drained < self.batch_size:
+                try:
+                    await asyncio.wait_for(self._wake.wait(), OUTBOX_POLL_INTERVAL)
+                    # let the rest of a burst land in the same batch
+                    await asyncio.wait_for(self._full.wait(), OUTBOX_FLUSH_DELAY)
+                except asyncio.TimeoutError:
+                    pass
+                self._wake.clear()
+                self._full.clear()
+                self._waiting = 0
+
+    async def flush(self, timeout: float = OUTBOX_SHUTDOWN_TIMEOUT) -> int:
+        """Drains what is due before shutdown, so the last writes aren't left for the next start."""
+        drained = 0
+        deadline = time.monotonic() + timeout
+        try:
+            while (remaining := deadline - time.monotonic()) > 0:
+                batch = await asyncio.wait_for(self.drain_once(), remaining)
+                drained += batch
+                if batch < self.batch_size:
+                    break
+        except asyncio.TimeoutError:
+            # whatever was claimed is retried once its lease runs out
+            pass
+        except Exception:
+            traceback.print_exc()
+        return drained
+
+    async def drain_once(self) -> int:
+        events = await asyncio.to_thread(self._claim)
+        if not events:
+            return 0
+        failed = await asyncio.to_thread(self._apply_index, events)
+        try:
+            await self.cache.invalidate(**merge_invalidations(events))
+        except Exception as e:
+            failed.update({event["id"]: f"cache: {e}" for event in events})
+        await asyncio.to_thread(self._finish, events, failed)
+        self.metrics.counts["flushes"] += 1
+        return len(events)
+
+    def _claim(self) -> list:
+        now = time.time()
+        with Session(self.engine) as session:
+            statement = (
+                select(OUTBOX_EVENT)
+                .where(OUTBOX_EVENT.status == OutboxStatus.PENDING, OUTBOX_EVENT.next_attempt_at <= now)
+                .order_by(OUTBOX_EVENT.id)
+                .limit(self.batch_size)
+                .with_for_update(skip_locked=True)
+            )
+            events = session.exec(statement).all()
+            claimed = []
+            for event in events:
+                event.next_attempt_at = now + OUTBOX_LEASE_SECONDS
+                claimed.append({
+                    "id": event.id, "collection": event.collection, "document_id": event.document_id,
+                    "invalidate": event.invalidate or {}, "created_at": event.created_at,
+                })
+            session.commit()
+            return claimed
+
+    def _apply_index(self, events: list) -> dict:
+        """Returns {event id: error} for the events whose document couldn't be written."""
+        failed = {}
+        # several writes to the same row collapse into one upsert of its current state
+        pending = defaultdict(lambda: defaultdict(list))
+        for event in events:
+            pending[event["collection"]][event["document_id"]].append(event["id"])
+
+        with Session(self.engine) as session:
+            for collection, documents_events in pending.items():
+                source = SOURCES[collection]
+                key = source["key"]
+                try:
+                    rows = session.exec(source["select"]().where(key.in_([uuid.UUID(i) for i in documents_events]))).all()
+                    documents = {}
+                    for row in rows:
+                        record, document = source["document"](row)
+                        if document is not None:
+                            documents[str(getattr(record, key.key))] = document
+                    if documents:
+                        results = self.ts_client.collections[collection].documents.import_(list(documents.values()), {"action": "upsert"})
+                        for document_id, result in zip(documents, results):
+                            if not result.get("success"):
+                                failed.update({event_id: result.get("error") for event_id in documents_events[document_id]})
+                    # deleted rows, and shops that lost their coordinates
+                    gone = [document_id for document_id in documents_events if document_id not in documents]
+                    delete_documents(self.ts_client, collection, source["delete_by"], gone)
+                except Exception as e:
+                    traceback.print_exc()
+                    failed.update({event_id: str(e) for event_ids in documents_events.values() for event_id in event_ids})
+        return failed
+
+    def _finish(self, events: list, failed: dict):
+        now = time.time()
+        done = [event for event in events if event["id"] not in failed]
+        with Session(self.engine) as session:
+            if done:
+                session.exec(delete(OUTBOX_EVENT).where(OUTBOX_EVENT.id.in_([event["id"] for event in done])))
+            for event_id, error in failed.items():
+                event = session.get(OUTBOX_EVENT, event_id)
+                if event is None:
+                    continue
+                event.attempts += 1
+                event.last_error = str(error)[:1000]
+                if event.attempts >= OUTBOX_MAX_ATTEMPTS:
+                    event.status = OutboxStatus.DEAD
+                    self.metrics.counts["dead_lettered"] += 1
+                else:
+                    event.next_attempt_at = now + min(OUTBOX_RETRY_BACKOFF * 2 ** (event.attempts - 1), OUTBOX_MAX_BACKOFF)
+                session.add(event)
+            session.commit()
+        for event in done:
+            self.metrics.lag.record((now - event["created_at"]) * 1000)
+        self.metrics.counts["processed"] += len(done)
+        self.metrics.counts["failed"] += len(failed)
+        self.metrics.last_drain_at = int(now)
+
+
+def merge_invalidations(events: list) -> dict:
+    merged = {"namespaces": set(), "keys": set(), "tags": set()}
+    for event in events:
+        for kind, values in event["invalidate"].items():
+            merged[kind].update(values)
+    return {kind: sorted(values) for kind, values in merged.items()}
+
+
+def outbox_backlog(session: Session) -> dict:
+    """Pending/dead counts and the age of the oldest pending event, i.e. the current index lag."""
+    rows = session.exec(
+        select(OUTBOX_EVENT.status, func.count(), func.min(OUTBOX_EVENT.created_at)).group_by(OUTBOX_EVENT.status)
+    ).all()
+    backlog = {"pending": 0, "dead": 0, "oldest_pending_age_s": 0.0}
+    for status, count, oldest in rows:
+        status = OutboxStatus(status)
+        backlog[status.value.lower()] = count
+        if status == OutboxStatus.PENDING and oldest is not None:
+            backlog["oldest_pending_age_s"] = round(time.time() - oldest, 3)
+    return backlog
+
+
+outbox = OutboxWorker()
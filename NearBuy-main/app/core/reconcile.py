@@ -0,0 +1,77 @@
+import asyncio
+import traceback
+from sqlmodel import Session, select
+
+from app.core.outbox import outbox
+from app.db.models.sync import SYNC_CHECKPOINT
+from app.helpers.variables import RECONCILE_INTERVAL
+from typesense_helper.incremental_sync import SOURCES
+from typesense_helper.reconcile import claim_run, reconcile
+
+# how often a worker checks whether a reconciliation is due
+RECONCILE_POLL = 60
+
+
+class ReconcileScheduler:
+    """
+    Runs the Postgres vs Typesense reconciliation every RECONCILE_INTERVAL seconds. Every uvicorn
+    worker runs one of these; claim_run lets only one of them do each collection's run. The drift
+    found is stored on the checkpoint, this worker's last reports are kept for /status/reconcile.
+    """
+
+    def __init__(self, engine=None, ts_client=None, interval: int = RECONCILE_INTERVAL):
+        self._engine = engine
+        self._ts_client = ts_client
+        self.interval = interval
+        self.reports = {}
+
+    @property
+    def engine(self):
+        if self._engine is None:
+            from app.db.session import DataBasePool
+            return DataBasePool._engine
+        return self._engine
+
+    @property
+    def ts_client(self):
+        if self._ts_client is None:
+            from typesense_helper.typesense_client import get_typesense_client
+            return get_typesense_client()
+        return self._ts_client
+
+    async def run(self):
+        """Long-running task, started from the app lifespan."""
+        if not self.interval:
+            return
+        while True:
+            try:
+                repaired = await asyncio.to_thread(self.run_once)
+                if repaired:
+                    # repairs were queued as outbox events
+                    outbox.wake(repaired)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                traceback.print_exc()
+            await asyncio.sleep(min(self.interval, RECONCILE_POLL))
+
+    def run_once(self) -> int:
+        """Reconciles the collections that are due, returns the repairs queued."""
+        repaired = 0
+        with Session(self.engine) as session:
+            for collection in SOURCES:
+                if not claim_run(session, collection, self.interval):
+                    continue
+                [report] = reconcile(session, self.ts_client, (collection,))
+                self.reports[collection] = report
+                repaired += report["repaired"]
+        return repaired
+
+
+def reconcile_status(session: Session) -> dict:
+    """Per collection: when it was last reconciled and how many documents had drifted."""
+    rows = session.exec(select(SYNC_CHECKPOINT.collection, SYNC_CHECKPOINT.reconciled_at, SYNC_CHECKPOINT.reconcile_drift)).all()
+    return {collection: {"reconciled_at": reconciled_at, "drift": drift} for collection, reconciled_at, drift in rows}
+
+
+reconciler = ReconcileScheduler()
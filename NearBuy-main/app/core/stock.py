@@ -0,0 +1,142 @@
+"""
+Atomic stock operations. Each one is a single conditional UPDATE, so concurrent sales of the same
+row can't lose units the way a read, compare, write does:
+
+    UPDATE inventory SET quantity = quantity - :n WHERE inventory_id = :id AND quantity >= :n
+
+Reserved units are taken out of `quantity` while held and put back on release or expiry;
+committing a reservation (the sale went through) just drops the hold. Every write bumps
+`version`, which full updates (INDB.update_inventory) are conditioned on, and appends an
+INVENTORY_EVENT in the same transaction.
+"""
+import asyncio
+import time
+import traceback
+import uuid
+from collections import defaultdict
+from typing import Optional
+from sqlmodel import Session, delete, update
+
+from app.core.inventory_history import STOCK_EVENT_COLUMNS, record_events, stock_event
+from app.db.models.inventory import INVENTORY, INVENTORY_RESERVATION, InventoryEventSource
+from app.helpers.variables import INVENTORY_RESERVATION_SWEEP_INTERVAL
+
+
+def stock_write_values(**values) -> dict:
+    # updated_at is set here rather than by the column's onupdate, the statements stay portable
+    return {**values, "version": INVENTORY.version + 1, "updated_at": int(time.time())}
+
+
+def _take(session: Session, inventory_id: str, quantity: int):
+    return session.exec(
+        update(INVENTORY)
+        .where(INVENTORY.inventory_id == inventory_id, INVENTORY.quantity >= quantity)
+        .values(stock_write_values(quantity=INVENTORY.quantity - quantity))
+        .returning(*STOCK_EVENT_COLUMNS)
+    ).one_or_none()
+
+
+def decrement(session: Session, inventory_id: str, quantity: int) -> Optional[int]:
+    """Takes `quantity` units; returns what is left, None if there isn't enough stock (or no such row)."""
+    row = _take(session, inventory_id, quantity)
+    if row is not None:
+        record_events(session, [stock_event(InventoryEventSource.SALE, row, -quantity)])
+    session.commit()
+    return row.quantity if row is not None else None
+
+
+def reserve(session: Session, inventory_id: str, quantity: int, ttl: int, reserved_by: str = None) -> Optional[INVENTORY_RESERVATION]:
+    """Holds `quantity` units for `ttl` seconds; None if there isn't enough stock."""
+    now = int(time.time())
+    row = _take(session, inventory_id, quantity)
+    if row is None:
+        session.rollback()
+        return None
+    record_events(session, [stock_event(InventoryEventSource.RESERVE, row, -quantity)])
+    reservation = INVENTORY_RESERVATION(
+        reservation_id=str(uuid.uuid4()), inventory_id=inventory_id, quantity=quantity,
+        reserved_by=reserved_by, created_at=now, expires_at=now + ttl,
+    )
+    # committed with the decrement, a hold never exists without its units taken
+    session.add(reservation)
+    session.commit()
+    session.refresh(reservation)
+    return reservation
+
+
+def _drop_reservations(session: Session, *conditions) -> list:
+    # deleting first is what claims a hold: of a release, a commit and the sweeper racing for the
+    # same reservation, only the one that deleted the row acts on it
+    return session.exec(
+        delete(INVENTORY_RESERVATION).where(*conditions)
+        .returning(INVENTORY_RESERVATION.reservation_id, INVENTORY_RESERVATION.inventory_id, INVENTORY_RESERVATION.quantity)
+    ).all()
+
+
+def _restock(session: Session, held: list, source: InventoryEventSource) -> dict:
+    units = defaultdict(int)
+    for _, inventory_id, quantity in held:
+        units[inventory_id] += quantity
+    events = []
+    for inventory_id, quantity in units.items():
+        row = session.exec(update(INVENTORY).where(INVENTORY.inventory_id == inventory_id)
+                           .values(stock_write_values(quantity=INVENTORY.quantity + quantity))
+                           .returning(*STOCK_EVENT_COLUMNS)).one_or_none()
+        if row is not None:
+            events.append(stock_event(source, row, quantity))
+    record_events(session, events)
+    return dict(units)
+
+
+def release(session: Session, reservation_id: str) -> Optional[dict]:
+    """Puts the held units back; None if the reservation is gone (released, committed or expired)."""
+    held = _drop_reservations(session, INVENTORY_RESERVATION.reservation_id == reservation_id)
+    if not held:
+        session.rollback()
+        return None
+    _restock(session, held, InventoryEventSource.RELEASE)
+    session.commit()
+    return {"reservation_id": reservation_id, "inventory_id": held[0][1], "quantity": held[0][2]}
+
+
+def commit_reservation(session: Session, reservation_id: str) -> Optional[dict]:
+    """The sale went through: the held units stay taken. None if the reservation is gone or expired."""
+    held = _drop_reservations(
+        session, INVENTORY_RESERVATION.reservation_id == reservation_id, INVENTORY_RESERVATION.expires_at > int(time.time()),
+    )
+    session.commit()
+    if not held:
+        return None
+    return {"reservation_id": reservation_id, "inventory_id": held[0][1], "quantity": held[0][2]}
+
+
+def release_expired(session: Session, now: int = None) -> dict:
+    """Returns expired holds to stock, {inventory_id: units put back}."""
+    held = _drop_reservations(session, INVENTORY_RESERVATION.expires_at <= (now or int(time.time())))
+    restocked = _restock(session, held, InventoryEventSource.EXPIRE)
+    session.commit()
+    return restocked
+
+
+async def run_reservation_sweeper(interval: float = INVENTORY_RESERVATION_SWEEP_INTERVAL):
+    """Long-running task, started from the app lifespan."""
+    from app.core.inventory_stream import inventory_deltas, inventory_stream
+    from app.db.session import DataBasePool
+    from RDB.cache import cache
+
+    def sweep():
+        with Session(DataBasePool._engine) as session:
+            restocked = release_expired(session)
+            return restocked, inventory_deltas(session, restocked) if restocked else {}
+
+    while True:
+        try:
+            restocked, changes = await asyncio.to_thread(sweep)
+            if restocked:
+                await cache.invalidate(tags=[f"inventory:{inventory_id}" for inventory_id in restocked])
+                await inventory_stream.publish(changes)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            traceback.print_exc()
+        await asyncio.sleep(interval)
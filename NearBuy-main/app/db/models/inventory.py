@@ -1,17 +1,33 @@
+import random
 import time
-from enum import Enum
+from enum import Enum, IntEnum
 import uuid
+from sqlalchemy import DDL, BigInteger, Computed, Index, SmallInteger, String, event, exists, literal_column, text
 from sqlmodel import Column, Integer, SQLModel, Field, func
 from typing import Optional
 
 class InventoryTableEnum(str, Enum):
     INVENTORY = "INVENTORY"
+    INVENTORY_RESERVATION = "INVENTORY_RESERVATION"
+    INVENTORY_EVENT = "INVENTORY_EVENT"
 class StockStatus(str, Enum):
     IN_STOCK = "IN_STOCK"
     LOW = "LOW"
     OUT_OF_STOCK = "OUT_OF_STOCK"
 
+# derived by the database in the same statement as every quantity/min_quantity change
+STOCK_STATUS_SQL = (
+    "CASE WHEN quantity <= 0 THEN 'OUT_OF_STOCK' "
+    "WHEN quantity <= COALESCE(min_quantity, 0) THEN 'LOW' "
+    "ELSE 'IN_STOCK' END"
+)
+IN_STOCK_SQL = "status <> 'OUT_OF_STOCK'"
+
 class INVENTORY(SQLModel, table=True):
+    # availability lookups ("is this item in stock anywhere") only touch rows that have stock
+    __table_args__ = (
+        Index("ix_inventory_in_stock", "item_id", "shop_id", postgresql_where=text(IN_STOCK_SQL), sqlite_where=text(IN_STOCK_SQL)),
+    )
     inventory_id: str = Field(default=None, primary_key=True)
     shop_id: uuid.UUID = Field(foreign_key="shop.shop_id", primary_key=True)
     item_id: uuid.UUID = Field(foreign_key="item.id", primary_key=True)
@@ -20,9 +36,96 @@ class INVENTORY(SQLModel, table=True):
     last_restocked_at: Optional[int] = Field(default_factory=lambda: int(time.time()))
     min_quantity: Optional[int] = Field(default=5)
     max_quantity: Optional[int] = Field(default=100)
-    status: Optional[StockStatus] = Field(default=StockStatus.IN_STOCK)
+    status: Optional[StockStatus] = Field(default=None, sa_column=Column(String, Computed(STOCK_STATUS_SQL, persisted=True)))
     location: Optional[str] = Field(default=None)
     batch_number: Optional[str] = Field(default=None)
     expiry_date: Optional[int] = Field(default=None)
     updated_at: Optional[int] = Field(default=None,sa_column=Column(Integer, onupdate=func.extract("epoch", func.now())),)
-    note: Optional[str] = Field(default=None)
\ No newline at end of file
+    note: Optional[str] = Field(default=None)
+    # bumped by every write; full updates only apply to the version they were based on
+    version: int = Field(default=1)
+
+class INVENTORY_RESERVATION(SQLModel, table=True):
+    """Units held for a buyer, already taken out of INVENTORY.quantity until released, committed or expired."""
+    __tablename__ = "inventory_reservation"
+    reservation_id: str = Field(default_factory=lambda: str(uuid.uuid4()), primary_key=True)
+    inventory_id: str = Field(index=True)
+    quantity: int
+    reserved_by: Optional[str] = Field(default=None)  # email of the session that made it
+    created_at: int = Field(default_factory=lambda: int(time.time()))
+    expires_at: int = Field(index=True)
+
+class InventoryEventSource(IntEnum):
+    """What moved the stock; stored as a smallint."""
+    ADD = 1
+    UPDATE = 2
+    BULK = 3
+    SALE = 4
+    RESERVE = 5
+    RELEASE = 6
+    EXPIRE = 7
+    DELETE = 8
+
+def new_event_id() -> int:
+    # time-ordered (milliseconds << 20 | 20 random bits) and made without a sequence, so inserts
+    # into any partition don't contend on one
+    return (time.time_ns() // 1_000_000) << 20 | random.getrandbits(20)
+
+class INVENTORY_EVENT(SQLModel, table=True):
+    """
+    Append-only log of stock movements, one row per change of an inventory row's quantity. Written
+    in the transaction that moves the stock, never updated. On Postgres it is range-partitioned by
+    month on created_at (see app.core.inventory_history.ensure_partitions): a time window only reads
+    its partitions, the BRIN index keeps whole-table time scans cheap at a few pages per partition,
+    and old months can be detached or dropped whole.
+    """
+    __tablename__ = "inventory_event"
+    __table_args__ = (
+        Index("ix_inventory_event_created_at", "created_at", postgresql_using="brin"),
+        Index("ix_inventory_event_shop_id_created_at", "shop_id", "created_at"),
+        {"postgresql_partition_by": "RANGE (created_at)"},
+    )
+    # the partition key has to be part of the primary key
+    event_id: Optional[int] = Field(default=None, sa_column=Column(BigInteger, primary_key=True, default=new_event_id))
+    created_at: int = Field(default_factory=lambda: int(time.time()), primary_key=True)
+    shop_id: uuid.UUID
+    item_id: uuid.UUID
+    delta: int
+    quantity: int  # on hand after the movement
+    price: Optional[float] = Field(default=None)  # the row's price_at_entry at the time
+    source: InventoryEventSource = Field(sa_column=Column(SmallInteger, nullable=False))
+
+
+def item_in_stock(item_id_column):
+    """EXISTS answered from ix_inventory_in_stock: some shop has the item and it isn't out of stock."""
+    # a literal, not a bound parameter, so the planner can match the partial index predicate
+    return exists().where(INVENTORY.item_id == item_id_column, INVENTORY.status != literal_column("'OUT_OF_STOCK'"))
+
+
+# An item's availability is part of its search document, so a status flip (and only that, not
+# every quantity change) queues an outbox event for the item, in the writing transaction. It also
+# bumps the item's updated_at, which the incremental sync and the rebuild catch-up select on.
+STATUS_CHANGE_FUNCTION = DDL("""
+CREATE OR REPLACE FUNCTION inventory_status_changed() RETURNS trigger AS $$
+BEGIN
+    UPDATE item SET updated_at = extract(epoch from now()) WHERE id = COALESCE(NEW.item_id, OLD.item_id);
+    INSERT INTO outbox_event (collection, document_id, invalidate, status, attempts, created_at, next_attempt_at)
+    VALUES ('items', COALESCE(NEW.item_id, OLD.item_id)::text, '{}', 'PENDING', 0,
+            extract(epoch from clock_timestamp()), extract(epoch from clock_timestamp()));
+    RETURN NULL;
+END $$ LANGUAGE plpgsql
+""")
+STATUS_CHANGE_TRIGGERS = DDL("""
+CREATE TRIGGER inventory_status_changed AFTER UPDATE ON inventory
+    FOR EACH ROW WHEN (OLD.status IS DISTINCT FROM NEW.status) EXECUTE FUNCTION inventory_status_changed();
+CREATE TRIGGER inventory_stock_added_or_removed AFTER INSERT OR DELETE ON inventory
+    FOR EACH ROW EXECUTE FUNCTION inventory_status_changed()
+""")
+
+event.listen(INVENTORY.__table__, "after_create", STATUS_CHANGE_FUNCTION.execute_if(dialect="postgresql"))
+event.listen(INVENTORY.__table__, "after_create", STATUS_CHANGE_TRIGGERS.execute_if(dialect="postgresql"))
+
+# catches events outside the monthly partitions created ahead, so an insert never fails on it
+EVENT_DEFAULT_PARTITION = DDL("CREATE TABLE IF NOT EXISTS inventory_event_default PARTITION OF inventory_event DEFAULT")
+event.listen(INVENTORY_EVENT.__table__, "after_create", EVENT_DEFAULT_PARTITION.execute_if(dialect="postgresql"))
+
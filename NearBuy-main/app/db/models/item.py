@@ -1,6 +1,7 @@
 from enum import Enum
+import time
 import uuid
-from sqlmodel import UUID, Column, SQLModel, Field
+from sqlmodel import UUID, Column, Integer, SQLModel, Field, func
 from typing import Optional
 
 class ItemTableEnum(str, Enum):
@@ -16,4 +17,6 @@ class ITEM(SQLModel, table=True):
     price: float
     description: Optional[str] = Field(default=None)
     note: Optional[str] = Field(default=None)
+    # set on insert too, the incremental Typesense sync reads changes by it
+    updated_at: Optional[int] = Field(default_factory=lambda: int(time.time()),sa_column=Column(Integer, index=True, onupdate=func.extract("epoch", func.now())),)
    
\ No newline at end of file
@@ -0,0 +1,72 @@
+from enum import Enum
+import time
+from sqlalchemy import JSON, Column, Index, event, inspect
+from sqlmodel import SQLModel, Field
+from typing import Optional
+from app.db.models.item import ITEM
+from app.db.models.shop import SHOP
+
+class OutboxTableEnum(str, Enum):
+    OUTBOX_EVENT = "OUTBOX_EVENT"
+
+class OutboxStatus(str, Enum):
+    PENDING = "PENDING"
+    DEAD = "DEAD"
+
+class OUTBOX_EVENT(SQLModel, table=True):
+    """
+    Search-index and cache update owed for a committed shop/item write. Written in the writing
+    transaction by the mapper events below and drained by app.core.outbox.
+    """
+    __tablename__ = "outbox_event"
+    __table_args__ = (Index("ix_outbox_event_status_next_attempt_at", "status", "next_attempt_at"),)
+    id: Optional[int] = Field(default=None, primary_key=True)
+    collection: str  # Typesense collection, the document is re-read from the table when drained
+    document_id: str
+    invalidate: dict = Field(default_factory=dict, sa_column=Column(JSON))  # cache namespaces/keys/tags
+    status: OutboxStatus = Field(default=OutboxStatus.PENDING)
+    attempts: int = Field(default=0)
+    # float seconds, index lag is reported in ms
+    created_at: float = Field(default_factory=time.time)
+    next_attempt_at: float = Field(default_factory=time.time)
+    last_error: Optional[str] = Field(default=None)
+
+
+def _current_and_previous(target, attr: str) -> list:
+    # the value before this flush too, so a rename/move also drops what was cached under the old one
+    values = [getattr(target, attr), *inspect(target).attrs[attr].history.deleted]
+    return list(dict.fromkeys(value for value in values if value is not None))
+
+
+def shop_event(target) -> dict:
+    return {
+        "collection": "shops",
+        "document_id": str(target.shop_id),
+        "invalidate": {
+            "keys": [f"shop:{target.shop_id}"],
+            "tags": [f"shop:{target.shop_id}"] + [f"owner:{owner_id}" for owner_id in _current_and_previous(target, "owner_id")],
+        },
+    }
+
+
+def item_event(target) -> dict:
+    # item:{shop}:{name} / item:*:{name} are the lookup keys, including cached "not found"s
+    keys = [key for name in _current_and_previous(target, "itemName") for key in (f"item:{target.shop_id}:{name}", f"item:*:{name}")]
+    return {
+        "collection": "items",
+        "document_id": str(target.id),
+        "invalidate": {"namespaces": ["all_items"], "keys": keys, "tags": [f"item:{target.id}"]},
+    }
+
+
+def _enqueue(build_event):
+    def after_write(mapper, connection, target):
+        now = time.time()
+        connection.execute(OUTBOX_EVENT.__table__.insert().values(
+            **build_event(target), status=OutboxStatus.PENDING, attempts=0, created_at=now, next_attempt_at=now
+        ))
+    return after_write
+
+for model, build_event in ((SHOP, shop_event), (ITEM, item_event)):
+    for write in ("after_insert", "after_update", "after_delete"):
+        event.listen(model, write, _enqueue(build_event))
@@ -28,5 +28,6 @@ class SHOP(SQLModel, table=True):
         sa_column=Column(Geography(geometry_type="POINT", srid=4326))
     )
     created_at: Optional[int] = Field(default_factory=lambda: int(time.time()))
-    updated_at: Optional[int] = Field(default=None,sa_column=Column(Integer, onupdate=func.extract("epoch", func.now())),)
+    # set on insert too, the incremental Typesense sync reads changes by it
+    updated_at: Optional[int] = Field(default_factory=lambda: int(time.time()),sa_column=Column(Integer, index=True, onupdate=func.extract("epoch", func.now())),)
     note: Optional[str] = Field(default=None)
@@ -0,0 +1,48 @@
+from enum import Enum
+import time
+from sqlalchemy import Index, event
+from sqlmodel import SQLModel, Field
+from typing import Optional
+from app.db.models.item import ITEM
+from app.db.models.shop import SHOP
+
+class SyncTableEnum(str, Enum):
+    SYNC_CHECKPOINT = "SYNC_CHECKPOINT"
+    SYNC_TOMBSTONE = "SYNC_TOMBSTONE"
+
+class SYNC_CHECKPOINT(SQLModel, table=True):
+    """Progress of the incremental Typesense sync, one row per collection."""
+    __tablename__ = "sync_checkpoint"
+    collection: str = Field(primary_key=True)
+    watermark: int = Field(default=0)  # highest updated_at pushed
+    deleted_watermark: int = Field(default=0)  # highest tombstone deleted_at applied
+    last_run_at: Optional[int] = Field(default=None)
+    last_run_changes: int = Field(default=0)
+    # full reindex in progress: last acknowledged key ("" before the first batch), None otherwise
+    reindex_cursor: Optional[str] = Field(default=None)
+    reindex_started_at: Optional[int] = Field(default=None)
+    reindex_target: Optional[str] = Field(default=None)  # versioned collection being built
+    # last reconciliation against the index: start time and documents found diverging
+    reconciled_at: Optional[int] = Field(default=None)
+    reconcile_drift: Optional[int] = Field(default=None)
+
+class SYNC_TOMBSTONE(SQLModel, table=True):
+    """A deleted shop/item the incremental sync still has to remove from Typesense."""
+    __tablename__ = "sync_tombstone"
+    __table_args__ = (Index("ix_sync_tombstone_collection_deleted_at", "collection", "deleted_at"),)
+    id: Optional[int] = Field(default=None, primary_key=True)
+    collection: str
+    document_id: str
+    deleted_at: int = Field(default_factory=lambda: int(time.time()))
+
+
+def _record_tombstone(collection: str, id_attr: str):
+    def after_delete(mapper, connection, target):
+        # same connection, so the tombstone commits (or rolls back) with the delete
+        connection.execute(SYNC_TOMBSTONE.__table__.insert().values(
+            collection=collection, document_id=str(getattr(target, id_attr)), deleted_at=int(time.time())
+        ))
+    return after_delete
+
+event.listen(SHOP, "after_delete", _record_tombstone("shops", "shop_id"))
+event.listen(ITEM, "after_delete", _record_tombstone("items", "id"))
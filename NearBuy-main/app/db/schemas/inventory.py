@@ -2,8 +2,7 @@ from datetime import datetime
 from typing import Annotated, Optional
 from pydantic import BaseModel, conint
 
-from app.db.models.inventory import StockStatus
-
+# no `status`: it is derived from quantity/min_quantity by the database (INVENTORY.status)
 class InventoryBase(BaseModel):
     shop_id: str
     item_id: str
@@ -11,7 +10,6 @@ class InventoryBase(BaseModel):
     price_at_entry: Optional[float] = None
     min_quantity: Optional[int] = 5
     max_quantity: Optional[int] = 100
-    status: Optional[StockStatus] = StockStatus.IN_STOCK
     location: Optional[str] = None
     batch_number: Optional[str] = None
     expiry_date: Optional[int] = None 
@@ -35,10 +33,29 @@ class InventoryUpdate(BaseModel):
     price_at_entry: Optional[float] = None
     min_quantity: Optional[int] = None
     max_quantity: Optional[int] = None
-    status: Optional[StockStatus] = None
     location: Optional[str] = None
     batch_number: Optional[str] = None
     expiry_date: Optional[int] = None
     note: Optional[str] = None
     last_restocked_at: Optional[int] = None
-    
\ No newline at end of file
+    version: Optional[int] = None  # version the change is based on, 409 if the row has moved on since
+
+class InventoryBulkRow(BaseModel):
+    """One row of POST /inventory/bulk; unset fields keep their current value."""
+    item_id: str
+    quantity: Optional[int] = None  # required when the item has no inventory in the shop yet
+    price_at_entry: Optional[float] = None
+    min_quantity: Optional[int] = None
+    max_quantity: Optional[int] = None
+    location: Optional[str] = None
+    batch_number: Optional[str] = None
+    expiry_date: Optional[int] = None
+    note: Optional[str] = None
+    last_restocked_at: Optional[int] = None
+
+class StockChange(BaseModel):
+    quantity: conint(gt=0)
+
+class ReservationCreate(BaseModel):
+    quantity: conint(gt=0)
+    ttl_seconds: Optional[conint(gt=0)] = None  # INVENTORY_RESERVATION_TTL when unset
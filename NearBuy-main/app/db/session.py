@@ -2,18 +2,24 @@ from functools import wraps
 import time
 import traceback
 from typing import List, Optional, Tuple
-from fastapi import Request,status
-from fastapi.encoders import jsonable_encoder
-from sqlmodel import SQLModel, Session, create_engine, delete, func, select
-from app.db.models.inventory import INVENTORY, InventoryTableEnum
+from fastapi import Request, WebSocket, status
+from sqlalchemy.orm import defer
+from sqlmodel import SQLModel, Session, create_engine, delete, func, select, update
+from app.db.models.inventory import INVENTORY, INVENTORY_RESERVATION, InventoryTableEnum
 from app.db.models.item import ITEM, ItemTableEnum
 from app.db.models.shop import SHOP, ShopTableEnum
+from app.db.models.sync import SYNC_CHECKPOINT, SYNC_TOMBSTONE  # registers the delete tombstones
+from app.db.models.outbox import OUTBOX_EVENT  # registers the outbox writes
 from app.db.models.user import USER, USER_META, USER_SESSION, UserRole, UserTableEnum
 from app.helpers import variables
+from app.helpers.geo import latlon_columns
 from app.helpers.helpers import send_json_response
 from app.helpers.variables import DATABASE_URL
 
 
+VERSION_CONFLICT = "Version conflict."
+
+
 class UninitializedDatabasePoolError(Exception):
     def __init__(
         self,
@@ -186,6 +192,7 @@ class DB:
                 UserTableEnum.USER_SESSION: USER_SESSION,
                 ShopTableEnum.SHOP: SHOP,
                 InventoryTableEnum.INVENTORY: INVENTORY,
+                InventoryTableEnum.INVENTORY_RESERVATION: INVENTORY_RESERVATION,
             }
 
             table = models.get(dbClassNam)
@@ -215,6 +222,33 @@ class DB:
             if isinstance(db_pool, Session):
                 db_pool.rollback()
             return None
+
+    @classmethod
+    async def get_shops_with_latlon(cls, db_pool: Session, filters: dict = None, all=True, columns: Optional[List[str]] = None, latlon: bool = True):
+        """
+        SHOP rows with latitude/longitude computed by PostGIS (ST_Y/ST_X). The location column itself
+        is not loaded. Returns rows of (shop, latitude, longitude); a single row or None when all=False.
+
+        With `columns` only those SHOP columns (plus latitude/longitude unless `latlon` is False) are
+        selected and the rows are mappings instead.
+        """
+        try:
+            if columns:
+                statement = select(*[getattr(SHOP, column) for column in columns], *(latlon_columns(SHOP.location) if latlon else ()))
+            else:
+                statement = select(SHOP, *latlon_columns(SHOP.location)).options(defer(SHOP.location))
+            for key, value in (filters or {}).items():
+                if hasattr(SHOP, key):
+                    statement = statement.where(getattr(SHOP, key) == value)
+            result = db_pool.exec(statement)
+            if columns:
+                result = result.mappings()
+            return result.all() if all else result.first()
+        except Exception as e:
+            traceback.print_exc()
+            if isinstance(db_pool, Session):
+                db_pool.rollback()
+            return None
         
     @classmethod
     async def update_attr_all(cls, dbClassNam: str, data: dict, db_pool: Session, identifier: dict):
@@ -271,6 +305,38 @@ class DB:
             message = "Error updating."
             return message, False
 
+    @classmethod
+    async def update_versioned(cls, dbClassNam: str, data: dict, db_pool: Session, identifier: dict, version: int):
+        """
+        update_attr_all as one conditional UPDATE: applied only if the row is still at `version`,
+        which it bumps. A write that got in first makes it return (VERSION_CONFLICT, False).
+        """
+        try:
+            table_class = {InventoryTableEnum.INVENTORY: INVENTORY}.get(dbClassNam)
+            if not table_class:
+                message = "Invalid table class name provided."
+                return message, False
+
+            statement = update(table_class).where(table_class.version == version)
+            for key, value in identifier.items():
+                if hasattr(table_class, key):
+                    statement = statement.where(getattr(table_class, key) == value)
+            values = {key: value for key, value in data.items() if hasattr(table_class, key)}
+
+            result = db_pool.exec(statement.values(**values, version=table_class.version + 1))
+            if result.rowcount == 0:
+                db_pool.rollback()
+                return VERSION_CONFLICT, False
+            db_pool.commit()
+            message = "Updated successfully."
+            return message, True
+
+        except Exception:
+            db_pool.rollback()
+            traceback.print_exc()
+            message = "Error updating."
+            return message, False
+
     @classmethod
     async def delete_attr(cls, dbClassNam: str, db_pool: Session, identifier: dict):
         try:
@@ -312,10 +378,11 @@ class DB:
             return message, False
 
     @classmethod  
-    async def get_attr_all_paginated(cls,dbClassNam,db_pool,offset: int = 0,limit: int = 20,filters: Optional[List] = None,order_by: Optional[List] = None) -> Tuple[List[dict], int]:
+    async def get_attr_all_paginated(cls,dbClassNam,db_pool,offset: int = 0,limit: int = 20,filters: Optional[List] = None,order_by: Optional[List] = None,columns: Optional[List[str]] = None) -> Tuple[List, int]:
         try:
             session = db_pool
-            query = select(dbClassNam)
+            # with `columns` only those are selected and rows come back as mappings
+            query = select(*[getattr(dbClassNam, column) for column in columns]) if columns else select(dbClassNam)
             count_query = select(func.count()).select_from(dbClassNam)
 
             if filters:
@@ -328,12 +395,13 @@ class DB:
 
             query = query.offset(offset).limit(limit)
             result = session.execute(query)
-            rows = result.scalars().all()
+            rows = result.mappings().all() if columns else result.scalars().all()
 
             count_result = session.execute(count_query)
             total_count = count_result.scalar_one()
 
-            return [jsonable_encoder(row) for row in rows], total_count
+            # model instances, callers pick the fields they serialize (row_to_dict / serialize_rows)
+            return rows, total_count
         except Exception as e:
             print("Exception in get_attr_all_paginated:", str(e))
             traceback.print_exc()
@@ -436,6 +504,24 @@ def authentication_required(allowed_roles: List[UserRole]):
         return wrapper
     return decorator
 
+async def websocket_session(websocket: WebSocket, db_pool: Session, allowed_roles: List[UserRole]):
+    """
+    authentication_required for WebSocket routes, which can't answer with a JSON error: the
+    cookie's session if it is valid for `allowed_roles`, None otherwise (the caller closes).
+    """
+    session_token: Optional[str] = websocket.cookies.get(variables.COOKIE_KEY, None)
+    if not session_token:
+        return None
+    user_session = await DB.getUserSession(db_pool, session_token)
+    if not user_session or int(time.time()) > user_session.expired_at:
+        return None
+    user_role = getattr(user_session, "role", None)
+    user_role_str = user_role.value.upper() if isinstance(user_role, UserRole) else str(user_role).upper()
+    if user_role_str not in [r.value.upper() if isinstance(r, UserRole) else str(r).upper() for r in allowed_roles]:
+        return None
+    websocket.state.emp = user_session
+    return user_session
+
 def ADMIN_AUTHENTICATION_ONLY(func):
     @wraps(func)
     async def wrapper(*args, **kwargs):
@@ -1,20 +1,36 @@
-from shapely.geometry import Point
-from geoalchemy2.shape import to_shape
-from geoalchemy2.shape import from_shape
+import struct
+from geoalchemy2 import Geometry
+from geoalchemy2.elements import WKBElement
+from sqlalchemy import cast, func
+
+# little-endian WKB point: byte order, geometry type 1 (Point), x (longitude), y (latitude)
+_WKB_POINT = struct.Struct("<BIdd")
+
+
+def _point_wkb(latitude: float, longitude: float) -> WKBElement:
+    # same bytes as from_shape(Point(lon, lat), srid=4326), without building a shapely object
+    return WKBElement(_WKB_POINT.pack(1, 1, float(longitude), float(latitude)), srid=4326)
+
 
 def create_point_geometry(latitude: float, longitude: float):
     if latitude is not None and longitude is not None:
-        return from_shape(Point(float(longitude), float(latitude)), srid=4326)
+        return _point_wkb(latitude, longitude)
     return None
 
-def geometry_to_latlon(geometry):
-    if geometry is not None:
-        try:
-            point = to_shape(geometry)
-            return {
-                "latitude": point.y,
-                "longitude": point.x
-            }
-        except Exception:
-            pass
-    return {"latitude": None, "longitude": None}
+
+def create_point_geometries(points):
+    """Bulk variant of `create_point_geometry` for batch inserts: [(latitude, longitude), ...] -> [WKBElement | None, ...]."""
+    return [
+        _point_wkb(latitude, longitude) if latitude is not None and longitude is not None else None
+        for latitude, longitude in points
+    ]
+
+
+def latlon_columns(location_column):
+    """
+    SQL expressions projecting latitude/longitude out of a geography column, so shop queries get
+    plain floats from Postgres instead of decoding WKB per row.
+    """
+    geometry = cast(location_column, Geometry(srid=4326))
+    return func.ST_Y(geometry).label("latitude"), func.ST_X(geometry).label("longitude")
+
@@ -1,15 +1,41 @@
+import csv
+import io
 import logging
 import secrets
+import time
 import uuid
+from decimal import Decimal
 from fastapi import Request
 from pydantic import BaseModel
 from typing import Any, Dict, Optional
 import http.cookies
+from collections.abc import Mapping
 from ua_parser import user_agent_parser
-from fastapi.responses import JSONResponse
-from typing import Any, Dict
+from fastapi.responses import JSONResponse, Response
+import orjson
+from typing import Any, Dict, Iterable
 
+from app.core.compression import PRECOMPRESSED_LEVELS, compress, compression_metrics, negotiate_encoding, route_key
 from app.helpers import variables
+from app.helpers.variables import COMPRESSION_MIN_BYTES
+
+
+def orjson_default(obj):
+    """Types orjson doesn't serialize natively (it does UUID, enums, datetimes and dataclasses)."""
+    if isinstance(obj, BaseModel):
+        return obj.model_dump()
+    if isinstance(obj, Decimal):
+        return float(obj)
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    raise TypeError(f"Type is not JSON serializable: {type(obj).__name__}")
+
+
+class ORJSONResponse(JSONResponse):
+    """JSONResponse rendered with orjson, so bodies don't need jsonable_encoder / recursive_to_str first."""
+
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content, default=orjson_default, option=orjson.OPT_NON_STR_KEYS)
 
 
 
@@ -110,7 +136,137 @@ def send_json_response(
 
     if additional_data:
         response_content.update(additional_data)
-    return JSONResponse(content=response_content, status_code=status)
+    return ORJSONResponse(content=response_content, status_code=status)
+
+
+def json_envelope(message: str, status: int, body: bytes) -> bytes:
+    return b'{"message":' + orjson.dumps(message) + b',"status":' + str(status).encode() + b',"body":' + body + b"}"
+
+
+def send_raw_json_response(message: str, status: int = 200, body: bytes = b"null", headers: Dict[str, str] = None) -> Response:
+    """
+    Same envelope as `send_json_response`, but `body` is already-serialized JSON bytes
+    (e.g. a cache hit) and is spliced in as is instead of being decoded and re-encoded.
+    """
+    return Response(content=json_envelope(message, status, body), status_code=status, media_type="application/json", headers=headers)
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """If-None-Match check (weak comparison, as RFC 9110 requires for it)."""
+    if_none_match = request.headers.get("if-none-match")
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return any(tag.strip().removeprefix("W/") == etag for tag in if_none_match.split(","))
+
+
+def send_cached_json_response(request: Request, message: str, entry, cache_control: str) -> Response:
+    """
+    Response for a cache entry (RDB.cache.CacheEntry) with its ETag and the route's Cache-Control.
+    Answers 304 without a body when the client already has this version.
+
+    Large responses are compressed here, once per entry and encoding, and kept on the entry, so
+    repeated L1 hits are served precompressed and CompressionMiddleware leaves them alone.
+    """
+    encoding = negotiate_encoding(request.headers.get("accept-encoding", ""))
+    if encoding is None or len(entry.body) < COMPRESSION_MIN_BYTES:
+        encoding = None
+    # the validator comes from the body alone, so `message` has to be the same for every response of a
+    # route (not "from cache" on a hit): the same content then always has the same ETag. Each encoding gets its own
+    etag = f'"{entry.digest.hex()}{"" if encoding is None else "-" + encoding}"'
+    headers = {"ETag": etag, "Cache-Control": cache_control, "Vary": "Accept-Encoding"}
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+    if encoding is None:
+        return send_raw_json_response(message=message, status=200, body=entry.body, headers=headers)
+
+    route = route_key(request.scope)
+    encoded = entry.encoded.get((message, encoding))
+    if encoded is None:
+        started = time.perf_counter()
+        plain = json_envelope(message, 200, entry.body)
+        encoded = entry.encoded[(message, encoding)] = (compress(plain, encoding, PRECOMPRESSED_LEVELS[encoding]), len(plain))
+        compression_metrics.record(route, "precompressed_fills", len(plain), len(encoded[0]), time.perf_counter() - started)
+    else:
+        compression_metrics.record(route, "precompressed_hits", encoded[1], len(encoded[0]))
+    content = encoded[0]
+    headers["Content-Encoding"] = encoding
+    return Response(content=content, status_code=200, media_type="application/json", headers=headers)
+
+
+def row_to_dict(row, fields: Iterable[str] = None, exclude: Iterable[str] = ()) -> dict:
+    """
+    Plain dict of a SQLModel row's column values, limited to `fields` (an allow-list, default all
+    model fields) minus `exclude`. Values are left as is (UUID, enums, ...), orjson handles them.
+    """
+    if isinstance(row, Mapping):
+        # column-restricted selects (RowMapping), only the projected columns are there
+        return {field: row[field] for field in (row.keys() if fields is None else fields) if field not in exclude}
+    row = extract_model(row)
+    if fields is None:
+        fields = type(row).model_fields
+    # loaded column values sit in __dict__; going through the instrumented attributes is ~5x slower.
+    # Expired attributes (e.g. after a commit) aren't there and are loaded through getattr.
+    values = row.__dict__
+    return {field: values[field] if field in values else getattr(row, field) for field in fields if field not in exclude}
+
+
+def parse_fields(fields: Optional[str], allowed: Iterable[str]) -> Optional[tuple]:
+    """
+    `?fields=a,b` -> the requested fields in `allowed` order, so "b,a" and "a,b" share a cache key.
+    None when the parameter is absent or empty (full rows). Raises ValueError for unknown fields.
+    """
+    if fields is None:
+        return None
+    requested = {field.strip() for field in fields.split(",") if field.strip()}
+    if not requested:
+        return None
+    unknown = requested.difference(allowed)
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(sorted(unknown))}. Allowed: {', '.join(allowed)}")
+    return tuple(field for field in allowed if field in requested)
+
+
+def fields_key(fields: Optional[tuple]) -> str:
+    # cache key part for a projection from `parse_fields`
+    return "all" if fields is None else ",".join(fields)
+
+
+def serialize_rows(rows, fields: Iterable[str] = None, exclude: Iterable[str] = ()) -> bytes:
+    """
+    Rows straight to JSON bytes in one orjson pass, for `send_raw_json_response`.
+
+    ```python
+    body = serialize_rows(records, fields=("item_id", "quantity", "status"))
+    return send_raw_json_response(message="Inventories found", status=200, body=body)
+    ```
+    """
+    if fields is not None:
+        fields = tuple(fields)
+    return orjson.dumps([row_to_dict(row, fields, exclude) for row in rows], default=orjson_default)
+
+
+def parse_bulk_rows(body: bytes, content_type: str) -> list:
+    """
+    Rows of a bulk upload: a JSON array (or {"rows": [...]}) of objects, or CSV with a header
+    line when the content type says so. Empty CSV cells are left out. Raises ValueError.
+    """
+    if content_type.split(";")[0].strip().lower() == "text/csv":
+        try:
+            reader = csv.DictReader(io.StringIO(body.decode("utf-8-sig")))
+            return [{key.strip(): value for key, value in row.items() if key and value not in (None, "")} for row in reader]
+        except (UnicodeDecodeError, csv.Error) as e:
+            raise ValueError(f"Invalid CSV: {e}")
+    try:
+        rows = orjson.loads(body)
+    except orjson.JSONDecodeError as e:
+        raise ValueError(f"Invalid JSON: {e}")
+    if isinstance(rows, dict):
+        rows = rows.get("rows")
+    if not isinstance(rows, list) or not all(isinstance(row, dict) for row in rows):
+        raise ValueError("Expected a list of row objects")
+    return rows
 
 
 def generate_unique_id(length: int = 8) -> str:
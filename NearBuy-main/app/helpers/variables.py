@@ -10,4 +10,52 @@ TYPESENSE_PORT = int(getenv("TYPESENSE_PORT"))
 TYPESENSE_PROTOCOL = getenv("TYPESENSE_PROTOCOL")
 TYPESENSE_API_KEY = getenv("TYPESENSE_API_KEY")
 REDIS_HOST = getenv("REDIS_HOST")
-REDIS_PORT = int(getenv("REDIS_PORT"))
\ No newline at end of file
+REDIS_PORT = int(getenv("REDIS_PORT"))
+REDIS_MAX_CONNECTIONS = int(getenv("REDIS_MAX_CONNECTIONS", "50"))
+REDIS_SOCKET_TIMEOUT = float(getenv("REDIS_SOCKET_TIMEOUT", "1.0"))
+CACHE_LOCAL_MAX_ENTRIES = int(getenv("CACHE_LOCAL_MAX_ENTRIES", "10000"))
+CACHE_INVALIDATION_CHANNEL = getenv("CACHE_INVALIDATION_CHANNEL", "cache:invalidate")
+CACHE_COMPRESS_MIN_BYTES = int(getenv("CACHE_COMPRESS_MIN_BYTES", "4096"))
+CACHE_NEGATIVE_TTL = int(getenv("CACHE_NEGATIVE_TTL", "30"))
+CACHE_NEGATIVE_LOCAL_MAX_ENTRIES = int(getenv("CACHE_NEGATIVE_LOCAL_MAX_ENTRIES", "2000"))
+CACHE_NEGATIVE_MAX_ENTRIES = int(getenv("CACHE_NEGATIVE_MAX_ENTRIES", "50000"))
+CACHE_HOT_KEY_SAMPLE_RATE = float(getenv("CACHE_HOT_KEY_SAMPLE_RATE", "0.01"))
+COMPRESSION_MIN_BYTES = int(getenv("COMPRESSION_MIN_BYTES", "1024"))
+INVENTORY_BULK_MAX_ROWS = int(getenv("INVENTORY_BULK_MAX_ROWS", "5000"))
+INVENTORY_RESERVATION_TTL = int(getenv("INVENTORY_RESERVATION_TTL", "900"))
+INVENTORY_RESERVATION_MAX_TTL = int(getenv("INVENTORY_RESERVATION_MAX_TTL", str(24 * 3600)))
+INVENTORY_RESERVATION_SWEEP_INTERVAL = float(getenv("INVENTORY_RESERVATION_SWEEP_INTERVAL", "30"))
+INVENTORY_EVENT_PARTITIONS_AHEAD = int(getenv("INVENTORY_EVENT_PARTITIONS_AHEAD", "2"))
+INVENTORY_VELOCITY_WINDOW = int(getenv("INVENTORY_VELOCITY_WINDOW", str(30 * 24 * 3600)))
+INVENTORY_VELOCITY_MAX_BUCKETS = int(getenv("INVENTORY_VELOCITY_MAX_BUCKETS", "1000"))
+INVENTORY_STREAM_CHANNEL = getenv("INVENTORY_STREAM_CHANNEL", "inventory:deltas")
+INVENTORY_STREAM_REPLAY = int(getenv("INVENTORY_STREAM_REPLAY", "1000"))
+INVENTORY_STREAM_RETENTION = int(getenv("INVENTORY_STREAM_RETENTION", str(24 * 3600)))
+INVENTORY_STREAM_QUEUE_SIZE = int(getenv("INVENTORY_STREAM_QUEUE_SIZE", "64"))
+INVENTORY_STREAM_HEARTBEAT = float(getenv("INVENTORY_STREAM_HEARTBEAT", "15"))
+INVENTORY_STREAM_MAX_SUBSCRIBERS = int(getenv("INVENTORY_STREAM_MAX_SUBSCRIBERS", "10000"))
+SYNC_BATCH_SIZE = int(getenv("SYNC_BATCH_SIZE", "500"))
+SYNC_WATERMARK_OVERLAP = int(getenv("SYNC_WATERMARK_OVERLAP", "60"))
+SYNC_TOMBSTONE_RETENTION = int(getenv("SYNC_TOMBSTONE_RETENTION", str(7 * 24 * 3600)))
+SYNC_IMPORT_WORKERS = int(getenv("SYNC_IMPORT_WORKERS", "4"))
+SYNC_IMPORT_RETRIES = int(getenv("SYNC_IMPORT_RETRIES", "3"))
+SYNC_RETRY_BACKOFF = float(getenv("SYNC_RETRY_BACKOFF", "0.5"))
+REINDEX_COUNT_TOLERANCE = float(getenv("REINDEX_COUNT_TOLERANCE", "0.01"))
+REINDEX_KEEP_VERSIONS = int(getenv("REINDEX_KEEP_VERSIONS", "1"))
+RECONCILE_INTERVAL = int(getenv("RECONCILE_INTERVAL", str(6 * 3600)))
+RECONCILE_PARTITION_SIZE = int(getenv("RECONCILE_PARTITION_SIZE", "100"))
+RECONCILE_SAMPLE_SIZE = int(getenv("RECONCILE_SAMPLE_SIZE", "20"))
+OUTBOX_BATCH_SIZE = int(getenv("OUTBOX_BATCH_SIZE", "100"))
+OUTBOX_POLL_INTERVAL = float(getenv("OUTBOX_POLL_INTERVAL", "1.0"))
+OUTBOX_LEASE_SECONDS = float(getenv("OUTBOX_LEASE_SECONDS", "30"))
+OUTBOX_MAX_ATTEMPTS = int(getenv("OUTBOX_MAX_ATTEMPTS", "10"))
+OUTBOX_RETRY_BACKOFF = float(getenv("OUTBOX_RETRY_BACKOFF", "1.0"))
+OUTBOX_MAX_BACKOFF = float(getenv("OUTBOX_MAX_BACKOFF", "300"))
+OUTBOX_FLUSH_DELAY = float(getenv("OUTBOX_FLUSH_DELAY", "0.05"))
+OUTBOX_SHUTDOWN_TIMEOUT = float(getenv("OUTBOX_SHUTDOWN_TIMEOUT", "5"))
+
+RATE_LIMIT_STORAGE_URI = getenv("RATE_LIMIT_STORAGE_URI", f"redis://{REDIS_HOST}:{REDIS_PORT}/1")
+RATE_LIMIT_STRATEGY = getenv("RATE_LIMIT_STRATEGY", "moving-window")
+RATE_LIMIT_REDIS_TIMEOUT = float(getenv("RATE_LIMIT_REDIS_TIMEOUT", "0.05"))
+RATE_LIMIT_FAIL_OPEN = getenv("RATE_LIMIT_FAIL_OPEN", "true").lower() == "true"
+RATE_LIMIT_TRUSTED_PROXIES = [proxy.strip() for proxy in getenv("RATE_LIMIT_TRUSTED_PROXIES", "").split(",") if proxy.strip()]
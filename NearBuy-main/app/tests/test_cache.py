@@ -0,0 +1,337 @@
+import asyncio
+import time
+import pytest
+from unittest.mock import patch
+
+from RDB import codec
+from RDB.metrics import LatencyHistogram
+from RDB.cache import (
+    FILL_SCRIPT, INVALIDATE_TAGS_SCRIPT, SET_NEGATIVE_SCRIPT, STAMP_INVALIDATIONS_SCRIPT, CacheEntry,
+)
+from RDB.cache import LocalCache, Tagged, TwoTierCache, family_ttl
+
+
+class StubPipeline:
+    def __init__(self, stub):
+        self.stub = stub
+        self.calls = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: self.calls.append((name, args, kwargs))
+
+    async def execute(self):
+        return [await getattr(self.stub, name)(*args, **kwargs) for name, args, kwargs in self.calls]
+
+
+class StubRedis:
+    """Just enough of redis.asyncio.Redis for the cache fill and invalidation paths."""
+
+    def __init__(self):
+        self.data = {}
+        self.clock_ms = 1_700_000_000_000
+
+    def pipeline(self, transaction=False):
+        return StubPipeline(self)
+
+    async def sadd(self, key, *members):
+        self.data.setdefault(key, set()).update(members)
+
+    async def expire(self, key, seconds):
+        pass
+
+    async def publish(self, channel, message):
+        pass
+
+    async def get(self, key):
+        return self.data.get(key)
+
+    async def mget(self, keys):
+        return [self.data.get(key) for key in keys]
+
+    async def delete(self, *keys):
+        for key in keys:
+            self.data.pop(key, None)
+
+    async def set(self, key, value, ex=None, px=None, nx=False):
+        if nx and key in self.data:
+            return None
+        self.data[key] = value
+        return True
+
+    async def time(self):
+        self.clock_ms += 1
+        return self.clock_ms // 1000, self.clock_ms % 1000 * 1000
+
+    def stamped_since(self, stamps, started_ms):
+        return any(self.data.get(stamp, 0) >= int(started_ms) for stamp in stamps)
+
+    async def eval(self, script, numkeys, *args):
+        keys, argv = args[:numkeys], args[numkeys:]
+        if script == STAMP_INVALIDATIONS_SCRIPT:
+            self.clock_ms += 1
+            for key in keys:
+                self.data[key] = self.clock_ms
+            return self.clock_ms
+        if script == FILL_SCRIPT:
+            raw, _, _, tags, started_ms = argv
+            if self.stamped_since(keys[tags + 1:], started_ms):
+                return 0
+            self.data[keys[0]] = raw
+            for tag in keys[1:tags + 1]:
+                self.data.setdefault(tag, set()).add(keys[0])
+            return 1
+        if script == INVALIDATE_TAGS_SCRIPT:
+            keys = [key for tag in args[:numkeys] for key in self.data.pop(tag, ())]
+            for key in keys:
+                self.data.pop(key, None)
+            return keys
+        if script == SET_NEGATIVE_SCRIPT:
+            if numkeys > 2 and self.stamped_since(keys[2:], argv[3]):
+                return 0
+            self.data[keys[0]] = b"1"
+            return 1
+        key, token, *marker = args
+        if self.data.get(key) == token:
+            if marker:
+                self.data[key] = marker[0]
+            else:
+                del self.data[key]
+
+
+# --- In-process (L1) cache Tests ---
+
+def test_local_cache_evicts_least_recently_used():
+    local = LocalCache(max_entries=2)
+    local.set("shop:1:v0", {"id": 1}, ttl=60)
+    local.set("shop:2:v0", {"id": 2}, ttl=60)
+    local.get("shop:1:v0")  # touch, so shop:2 is now the oldest
+    local.set("shop:3:v0", {"id": 3}, ttl=60)
+
+    assert len(local) == 2
+    assert local.get("shop:2:v0") is None
+    assert local.get("shop:1:v0") == {"id": 1}
+
+
+def test_local_cache_expires_entries():
+    local = LocalCache(max_entries=10)
+    local.set("item:Widget", {"price": 1}, ttl=5)
+    with patch("RDB.cache.time.monotonic", return_value=time.monotonic() + 10):
+        assert local.get("item:Widget") is None
+
+
+def test_local_cache_delete_prefix_drops_old_generation():
+    local = LocalCache(max_entries=10)
+    local.set("all_items:v1:page_1:size_20", [], ttl=60)
+    local.set("all_items:v1:page_2:size_20", [], ttl=60)
+    local.set("item:Widget", {}, ttl=60)
+    local.delete_prefix("all_items:v")
+
+    assert len(local) == 1
+
+
+def test_family_ttl_falls_back_to_default():
+    assert family_ttl("shop:abc:v0") == (3600, 60)
+    assert family_ttl("unknown:key") == (3600, 30)
+
+
+# --- Stampede protection Tests ---
+
+@pytest.mark.asyncio
+async def test_concurrent_misses_run_the_loader_once():
+    cache = TwoTierCache(StubRedis(), max_local_entries=100)
+    calls = 0
+
+    async def load_shop():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return {"shopName": "Test Shop"}
+
+    results = await asyncio.gather(*[cache.get_or_load("shop:1:v0", load_shop) for _ in range(50)])
+
+    assert calls == 1
+    assert all(entry.value == {"shopName": "Test Shop"} for entry, _ in results)
+    entry, from_cache = await cache.get_or_load("shop:1:v0", load_shop)
+    assert from_cache and entry.body == b'{"shopName":"Test Shop"}'
+
+
+def test_entries_are_refreshed_early_only_near_expiry():
+    fresh = CacheEntry.from_value({"a": 1}, delta=0.05, expires_at=time.time() + 3600)
+    expiring = CacheEntry.from_value({"a": 1}, delta=0.05, expires_at=time.time() - 1)
+
+    assert not fresh.should_refresh_early()
+    assert expiring.should_refresh_early()
+
+
+# --- Tag invalidation Tests ---
+
+@pytest.mark.asyncio
+async def test_tag_invalidation_drops_only_dependent_entries():
+    stub = StubRedis()
+    cache = TwoTierCache(stub, max_local_entries=100)
+
+    async def load_owner_shops():
+        return Tagged([{"shopName": "A"}, {"shopName": "B"}], tags=["shop:a", "shop:b"])
+
+    await cache.get_or_load("shops_by_owner:o1", load_owner_shops, tags=["owner:o1"])
+    await cache.set("shop:a", {"shopName": "A"}, tags=["shop:a"])
+    await cache.set("shop:b", {"shopName": "B"}, tags=["shop:b"])
+
+    await cache.invalidate(tags=["shop:a"])
+
+    assert "shop:a" not in stub.data and "shops_by_owner:o1" not in stub.data
+    assert await cache.get("shop:a") is None
+    assert await cache.get("shop:b") == {"shopName": "B"}
+
+
+@pytest.mark.asyncio
+async def test_a_load_overtaken_by_an_invalidation_is_not_stored():
+    stub = StubRedis()
+    cache = TwoTierCache(stub, max_local_entries=100)
+    read, invalidated = asyncio.Event(), asyncio.Event()
+    versions = iter(["before the write", "after the write"])
+
+    async def load_owner_shops():
+        value = next(versions)
+        read.set()
+        await invalidated.wait()
+        return Tagged([{"shopName": value}], tags=["shop:a"])
+
+    load = asyncio.ensure_future(cache.get_or_load("shops_by_owner:o1", load_owner_shops))
+    await read.wait()
+    # the write commits and invalidates while the load is still running
+    await cache.invalidate(tags=["shop:a"])
+    invalidated.set()
+
+    entry, _ = await load
+    assert entry.value == [{"shopName": "before the write"}]
+    assert "shops_by_owner:o1" not in stub.data and cache.local.get("shops_by_owner:o1") is None
+    assert cache.metrics.events["shops_by_owner"]["stale_fills_dropped"] == 1
+
+    entry, from_cache = await cache.get_or_load("shops_by_owner:o1", load_owner_shops)
+    assert entry.value == [{"shopName": "after the write"}] and not from_cache
+    assert "shops_by_owner:o1" in stub.data
+
+
+@pytest.mark.asyncio
+async def test_workers_waiting_on_an_empty_load_do_not_wait_out_the_lock():
+    stub = StubRedis()
+    first, second = TwoTierCache(stub, max_local_entries=100), TwoTierCache(stub, max_local_entries=100)
+    calls = 0
+
+    async def load_no_shops():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.1)
+        return None
+
+    started = time.monotonic()
+    results = await asyncio.gather(
+        first.get_or_load("shops_by_owner:o1", load_no_shops),
+        second.get_or_load("shops_by_owner:o1", load_no_shops),
+    )
+    assert [entry for entry, _ in results] == [None, None]
+    assert calls == 1 and time.monotonic() - started < 1
+
+
+# --- Negative caching Tests ---
+
+@pytest.mark.asyncio
+async def test_not_found_is_cached_until_the_key_is_invalidated():
+    cache = TwoTierCache(StubRedis(), max_local_entries=100)
+    calls = 0
+
+    async def load_missing_shop():
+        nonlocal calls
+        calls += 1
+        return None
+
+    for _ in range(3):
+        entry, _ = await cache.get_or_load("shop:deleted", load_missing_shop, cache_missing=True)
+        assert entry is None
+
+    assert calls == 1
+    events = cache.metrics.events["shop"]
+    assert events["negative_misses"] == 1 and events["negative_hits"] == 2
+    assert events["l1_hits"] == events["l2_hits"] == 0
+
+    # the shop gets created
+    await cache.invalidate(keys=["shop:deleted"])
+    await cache.get_or_load("shop:deleted", load_missing_shop, cache_missing=True)
+    assert calls == 2
+
+
+def test_negative_entries_do_not_evict_real_entries():
+    cache = TwoTierCache(StubRedis(), max_local_entries=10, max_negative_entries=10)
+    cache.local.set("shop:real", CacheEntry.from_value({}, 0.0, 0.0), ttl=60)
+    for i in range(1000):
+        cache.negative.set(f"shop:random-{i}", True, ttl=60)
+
+    assert cache.local.get("shop:real") is not None
+    assert len(cache.negative) == 10
+
+
+# --- Metrics Tests ---
+
+@pytest.mark.asyncio
+async def test_metrics_are_recorded_per_key_family():
+    cache = TwoTierCache(StubRedis(), max_local_entries=100)
+    cache.metrics.hot_keys.sample_rate = 1.0
+
+    async def load_shop():
+        return {"shopName": "Test Shop"}
+
+    await cache.get_or_load("shop:1", load_shop)
+    await cache.get_or_load("shop:1", load_shop)
+    cache.local.clear()
+    await cache.get_or_load("shop:1", load_shop)
+    await cache.invalidate(keys=["shop:1"])
+
+    snapshot = cache.metrics.snapshot()
+    shop = snapshot["families"]["shop"]
+    assert (shop["misses"], shop["l1_hits"], shop["l2_hits"]) == (1, 1, 1)
+    assert shop["fills"] == 1 and shop["invalidations"] == 1
+    assert shop["hit_ratio"] == round(2 / 3, 4)
+    assert shop["payload"]["count"] == 1
+    assert shop["redis_latency"]["get"]["count"] == 2
+    assert snapshot["hot_keys"][0] == {"key": "shop:1", "estimated_lookups": 3}
+
+
+def test_latency_histogram_percentiles():
+    histogram = LatencyHistogram()
+    for ms in [0.1] * 90 + [30] * 9 + [1000]:
+        histogram.record(ms)
+
+    assert histogram.percentile(50) == 0.25
+    assert histogram.percentile(95) == 50
+    assert histogram.percentile(100) is None
+
+
+# --- Codec Tests ---
+
+def test_cache_entry_round_trips_through_the_binary_codec():
+    page = {"data": [{"itemName": f"Widget {i}", "price": 9.99, "description": "x" * 100} for i in range(100)]}
+    entry = CacheEntry.from_value(page, delta=0.02, expires_at=1700000000.0)
+
+    restored = CacheEntry.loads(entry.dumps())
+
+    assert restored.value == page
+    assert restored.body == entry.body
+    assert (restored.delta, restored.expires_at) == (0.02, 1700000000.0)
+
+
+def test_small_payloads_are_not_compressed():
+    packed = codec.pack(b'{"a":1}', 0.0, 0.0)
+    assert not packed[0] & codec.ZSTD
+
+
+def test_entries_of_another_format_read_as_misses():
+    packed = bytearray(codec.pack(b'{"a":1}', 0.0, 0.0))
+    packed[0] = (codec.FORMAT + 1) << 4
+    assert CacheEntry.loads(bytes(packed)) is None
@@ -0,0 +1,182 @@
+import json
+import uuid
+
+from app.db.models.inventory import INVENTORY, StockStatus
+from app.db.models.item import ITEM
+from app.helpers.helpers import parse_bulk_rows, row_to_dict, send_json_response, serialize_rows
+
+SHOP_ID = uuid.UUID("07446c46-7775-4c99-a29e-79843fb69f93")
+
+
+# --- Response serialization Tests ---
+
+def test_json_response_handles_uuid_enum_and_models():
+    item = ITEM(shop_id=SHOP_ID, itemName="Widget", price=9.5)
+    response = send_json_response(message="ok", status=200, body={"item": item, "status": StockStatus.LOW})
+
+    payload = json.loads(response.body)
+    assert payload["message"] == "ok" and payload["status"] == 200
+    assert payload["body"]["item"]["shop_id"] == str(SHOP_ID)
+    assert payload["body"]["status"] == "LOW"
+
+
+def test_row_to_dict_applies_the_field_allow_list():
+    item = ITEM(shop_id=SHOP_ID, itemName="Widget", price=9.5)
+
+    assert row_to_dict(item, fields=("itemName", "price")) == {"itemName": "Widget", "price": 9.5}
+    assert "id" not in row_to_dict(item, exclude={"id"})
+
+
+def test_serialize_rows_matches_the_old_encoding():
+    rows = [INVENTORY(inventory_id=str(i), shop_id=SHOP_ID, item_id=uuid.uuid4(), quantity=i) for i in range(3)]
+
+    expected = [{k: str(v) if isinstance(v, uuid.UUID) else v for k, v in row.model_dump().items()} for row in rows]
+    assert json.loads(serialize_rows(rows)) == expected
+
+
+def test_parse_fields_normalizes_order_and_rejects_unknown_fields():
+    import pytest
+    from app.helpers.helpers import fields_key, parse_fields
+
+    allowed = ("shop_id", "itemName", "price")
+    assert parse_fields("price, itemName", allowed) == ("itemName", "price")
+    assert fields_key(parse_fields("price,itemName", allowed)) == fields_key(parse_fields("itemName,price", allowed))
+    assert parse_fields(None, allowed) is None and parse_fields(" , ", allowed) is None
+    with pytest.raises(ValueError):
+        parse_fields("itemName,secret", allowed)
+
+
+def test_row_to_dict_reads_projected_rows():
+    from sqlmodel import Session, create_engine
+    import asyncio
+    from app.db.session import DB
+
+    from app.db.models.outbox import OUTBOX_EVENT
+
+    engine = create_engine("sqlite://")
+    for model in (ITEM, INVENTORY, OUTBOX_EVENT):
+        model.__table__.create(engine)
+    with Session(engine) as session:
+        session.add(ITEM(shop_id=SHOP_ID, itemName="Widget", price=9.5, description="long text"))
+        session.commit()
+        rows, total = asyncio.run(DB.get_attr_all_paginated(ITEM, session, columns=("id", "itemName")))
+
+    assert total == 1 and set(rows[0].keys()) == {"id", "itemName"}
+    assert row_to_dict(rows[0], ("itemName",)) == {"itemName": "Widget"}
+
+
+# --- Geo helper Tests ---
+
+def test_bulk_points_match_shapely_encoding():
+    from geoalchemy2.shape import from_shape, to_shape
+    from shapely.geometry import Point
+    from app.helpers.geo import create_point_geometries
+
+    points = create_point_geometries([(22.5726, 88.3639), (None, 88.0)])
+
+    assert bytes(points[0].data) == bytes(from_shape(Point(88.3639, 22.5726), srid=4326).data)
+    assert (to_shape(points[0]).y, to_shape(points[0]).x) == (22.5726, 88.3639)
+    assert points[1] is None
+
+
+# --- Conditional GET Tests ---
+
+def make_request(headers=None):
+    from starlette.requests import Request
+    raw_headers = [(k.lower().encode(), v.encode()) for k, v in (headers or {}).items()]
+    return Request({"type": "http", "method": "GET", "path": "/", "headers": raw_headers})
+
+
+def test_matching_etag_is_answered_with_304():
+    from RDB.cache import CacheEntry
+    from app.helpers.helpers import send_cached_json_response
+
+    entry = CacheEntry.from_value({"shopName": "Test Shop"}, delta=0.0, expires_at=0.0)
+
+    fresh = send_cached_json_response(make_request(), "Shop retrieved", entry, cache_control="private, max-age=60")
+    etag = fresh.headers["etag"]
+    assert fresh.status_code == 200 and fresh.headers["cache-control"] == "private, max-age=60"
+
+    revalidated = send_cached_json_response(make_request({"If-None-Match": f'W/"other", {etag}'}), "Shop retrieved", entry, "private")
+    assert revalidated.status_code == 304 and revalidated.body == b""
+
+    # the same content has the same validator however it was produced
+    reloaded = CacheEntry.from_value({"shopName": "Test Shop"}, delta=0.0, expires_at=0.0)
+    assert send_cached_json_response(make_request(), "Shop retrieved", reloaded, "private").headers["etag"] == etag
+    changed = CacheEntry.from_value({"shopName": "Renamed Shop"}, delta=0.0, expires_at=0.0)
+    assert send_cached_json_response(make_request({"If-None-Match": etag}), "Shop retrieved", changed, "private").status_code == 200
+
+
+def test_digest_survives_the_redis_round_trip():
+    from RDB.cache import CacheEntry
+
+    entry = CacheEntry.from_value({"a": 1}, delta=0.0, expires_at=0.0)
+    assert CacheEntry.loads(entry.dumps()).digest == entry.digest
+
+
+# --- Compression Tests ---
+
+def test_large_entries_are_served_precompressed_from_the_memo():
+    import gzip
+    from RDB.cache import CacheEntry
+    from app.helpers.helpers import send_cached_json_response
+
+    entry = CacheEntry.from_value([{"itemName": f"Item {i}", "price": 10.0} for i in range(200)], delta=0.0, expires_at=0.0)
+    request = make_request({"Accept-Encoding": "gzip, deflate"})
+
+    first = send_cached_json_response(request, "Items", entry, "private")
+    assert first.headers["content-encoding"] == "gzip" and first.headers["vary"] == "Accept-Encoding"
+    assert json.loads(gzip.decompress(first.body))["body"][0]["itemName"] == "Item 0"
+
+    second = send_cached_json_response(request, "Items", entry, "private")
+    assert second.body is first.body
+    assert send_cached_json_response(make_request({"If-None-Match": first.headers["etag"], "Accept-Encoding": "gzip"}), "Items", entry, "private").status_code == 304
+
+    plain = send_cached_json_response(make_request(), "Items", entry, "private")
+    assert "content-encoding" not in plain.headers and first.headers["etag"] == plain.headers["etag"][:-1] + '-gzip"'
+
+
+def test_middleware_compresses_only_above_the_threshold():
+    import gzip
+    from fastapi import FastAPI
+    from fastapi.testclient import TestClient
+    from app.core.compression import CompressionMetrics, CompressionMiddleware
+
+    app = FastAPI()
+    metrics = CompressionMetrics()
+    app.add_middleware(CompressionMiddleware, minimum_size=1024, metrics=metrics)
+
+    @app.get("/small")
+    def small():
+        return send_json_response(message="ok", status=200, body={})
+
+    @app.get("/large")
+    def large():
+        return send_json_response(message="ok", status=200, body=["x" * 10] * 500)
+
+    client = TestClient(app)
+    headers = {"Accept-Encoding": "gzip"}
+    assert "content-encoding" not in client.get("/small", headers=headers).headers
+    response = client.get("/large", headers=headers)
+    assert response.headers["content-encoding"] == "gzip"
+    assert int(response.headers["content-length"]) < 1024
+    assert response.json()["body"][0] == "x" * 10
+    assert metrics.snapshot()["GET /large"]["compressed"] == 1
+
+
+# --- Bulk upload parsing Tests ---
+
+def test_bulk_rows_parse_from_json_or_csv():
+    as_json = parse_bulk_rows(b'{"rows": [{"item_id": "a", "quantity": 3}]}', "application/json")
+    as_csv = parse_bulk_rows(b"\xef\xbb\xbfitem_id,quantity,note\r\na,3,\r\n", "text/csv; charset=utf-8")
+
+    assert as_json == [{"item_id": "a", "quantity": 3}]
+    # BOM stripped, empty cells left out
+    assert as_csv == [{"item_id": "a", "quantity": "3"}]
+    for body in (b"not json", b'{"rows": 1}', b"[1, 2]"):
+        try:
+            parse_bulk_rows(body, "application/json")
+        except ValueError:
+            continue
+        raise AssertionError(f"{body!r} was accepted")
+
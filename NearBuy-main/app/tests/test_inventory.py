@@ -1,6 +1,7 @@
 import pytest
 import pytest_asyncio
 import uuid
+from types import SimpleNamespace
 from httpx import AsyncClient, ASGITransport
 from unittest.mock import patch, AsyncMock, MagicMock
 
@@ -8,7 +9,9 @@ from main import app
 from app.db.models.user import USER, USER_SESSION, UserRole
 from app.db.models.shop import SHOP
 from app.db.models.item import ITEM
+from app.db.models.inventory import INVENTORY
 from app.db.session import DataBasePool
+from app.api.v1.endpoints.functions.inventory import bulk_events, plan_bulk_changes, validate_bulk_rows
 
 # --- Test Constants ---
 TEST_OWNER_ID = uuid.UUID("3e5b2b3b-5064-4ff5-9fcf-2bf8382972fe")
@@ -41,6 +44,8 @@ async def test_add_inventory(client: AsyncClient):
     with patch("app.db.session.DB.getUserSession", new_callable=AsyncMock, return_value=mock_user_session), \
          patch("app.api.v1.endpoints.functions.inventory.db.get_attr_all") as mock_get_attr, \
          patch("app.api.v1.endpoints.functions.inventory.db.insert", new_callable=AsyncMock) as mock_insert, \
+         patch("app.api.v1.endpoints.functions.inventory.record_events") as mock_record, \
+         patch("sqlmodel.Session.refresh"), \
          patch("uuid.uuid4", return_value=TEST_INVENTORY_ID):
 
         mock_get_attr.side_effect = [
@@ -60,17 +65,23 @@ async def test_add_inventory(client: AsyncClient):
 
     assert response.status_code == 201
     assert response.json()["message"] == "Inventory added"
+    [event] = mock_record.call_args.args[1]
+    assert (event["delta"], event["quantity"]) == (100, 100)
 
 
 @pytest.mark.asyncio
 async def test_update_inventory(client: AsyncClient):
     with patch("app.db.session.DB.getUserSession", new_callable=AsyncMock, return_value=mock_user_session), \
          patch("app.api.v1.endpoints.functions.inventory.db.get_attr_all") as mock_get_attr, \
-         patch("app.api.v1.endpoints.functions.inventory.db.update_attr_all", new_callable=AsyncMock) as mock_update:
+         patch("app.api.v1.endpoints.functions.inventory.db.update_versioned", new_callable=AsyncMock) as mock_update, \
+         patch("app.api.v1.endpoints.functions.inventory.record_events") as mock_record:
 
         mock_inventory_record = MagicMock(
             shop_id=TEST_SHOP_ID, 
+            item_id=TEST_ITEM_ID,
             quantity=100,  
+            price_at_entry=None,
+            version=1,
             spec=["model_dump"], 
             **{"model_dump.return_value": {}}
         )
@@ -90,6 +101,9 @@ async def test_update_inventory(client: AsyncClient):
 
     assert response.status_code == 200
     assert response.json()["message"] == "Inventory updated"
+    assert mock_update.call_args.kwargs["version"] == 1
+    [event] = mock_record.call_args.args[1]
+    assert (event["delta"], event["quantity"]) == (-5, 95)
 
 
 @pytest.mark.asyncio
@@ -131,13 +145,112 @@ async def test_delete_inventory(client: AsyncClient):
     """Test successfully deleting an inventory record."""
     with patch("app.db.session.DB.getUserSession", new_callable=AsyncMock, return_value=mock_user_session), \
          patch("app.api.v1.endpoints.functions.inventory.db.get_attr_all") as mock_get_attr, \
-         patch("app.api.v1.endpoints.functions.inventory.db.delete_attr", new_callable=AsyncMock) as mock_delete:
+         patch("app.api.v1.endpoints.functions.inventory.db.delete_attr", new_callable=AsyncMock) as mock_delete, \
+         patch("app.api.v1.endpoints.functions.inventory.record_events") as mock_record:
         
-        mock_get_attr.return_value = MagicMock(spec=["model_dump"], **{"model_dump.return_value": {}})
+        mock_get_attr.return_value = MagicMock(
+            shop_id=TEST_SHOP_ID, item_id=TEST_ITEM_ID, quantity=12, price_at_entry=2.5,
+            spec=["model_dump"], **{"model_dump.return_value": {}}
+        )
         mock_delete.return_value = ("Deleted successfully.", True)
 
         headers = {"Cookie": "shopNear_=test_session_token"}
         response = await client.delete(f"/inventory/{TEST_INVENTORY_ID}", headers=headers)
 
     assert response.status_code == 200
-    assert response.json()["message"] == "Inventory deleted"
\ No newline at end of file
+    assert response.json()["message"] == "Inventory deleted"
+    [event] = mock_record.call_args.args[1]
+    assert (event["delta"], event["quantity"]) == (-12, 0)
+
+
+# --- Bulk Inventory Tests ---
+
+OTHER_ITEM_ID = "9f8e7d6c-5b4a-4c3d-8e2f-1a0b9c8d7e6f"
+
+
+def test_bulk_rows_are_checked_per_row_and_only_changes_are_planned():
+    existing = {uuid.UUID(TEST_ITEM_ID): INVENTORY(inventory_id=TEST_INVENTORY_ID, shop_id=uuid.UUID(TEST_SHOP_ID),
+                                                   item_id=uuid.UUID(TEST_ITEM_ID), quantity=10, min_quantity=5, max_quantity=100)}
+    known_items = {uuid.UUID(TEST_ITEM_ID), uuid.UUID(OTHER_ITEM_ID)}
+    raw_rows = [
+        {"item_id": TEST_ITEM_ID, "quantity": 10},                # same as stored
+        {"item_id": TEST_ITEM_ID, "quantity": 12},                # duplicate of row 0
+        {"item_id": OTHER_ITEM_ID, "quantity": "7", "price_at_entry": 2.5},
+        {"item_id": OTHER_ITEM_ID.replace("9f", "00"), "quantity": 1},  # unknown item
+        {"item_id": TEST_ITEM_ID, "quantity": "many"},            # type error
+    ]
+
+    rows, errors = validate_bulk_rows(raw_rows)
+    results, inserts, updates = plan_bulk_changes(uuid.UUID(TEST_SHOP_ID), rows, errors, existing, known_items, now=1_000)
+
+    assert [result["result"] for result in results] == ["unchanged", "error", "created", "error", "error"]
+    assert results[4]["error"].startswith("quantity:")
+    assert [(row["item_id"], row["quantity"], row["price_at_entry"], row["min_quantity"]) for row in inserts] == [(uuid.UUID(OTHER_ITEM_ID), 7, 2.5, 5)]
+    assert updates == []
+
+
+def test_bulk_updates_keep_only_the_changed_fields():
+    existing = {uuid.UUID(TEST_ITEM_ID): INVENTORY(inventory_id=TEST_INVENTORY_ID, shop_id=uuid.UUID(TEST_SHOP_ID),
+                                                   item_id=uuid.UUID(TEST_ITEM_ID), quantity=10, min_quantity=5, max_quantity=100)}
+    rows, errors = validate_bulk_rows([{"item_id": TEST_ITEM_ID, "quantity": 4, "min_quantity": 5, "max_quantity": 3}])
+    results, _, _ = plan_bulk_changes(uuid.UUID(TEST_SHOP_ID), rows, errors, existing, {uuid.UUID(TEST_ITEM_ID)}, now=1_000)
+    assert "min_quantity" in results[0]["error"]
+
+    rows, errors = validate_bulk_rows([{"item_id": TEST_ITEM_ID, "quantity": 4, "min_quantity": 5}])
+    results, inserts, updates = plan_bulk_changes(uuid.UUID(TEST_SHOP_ID), rows, errors, existing, {uuid.UUID(TEST_ITEM_ID)}, now=1_000)
+    assert results[0]["result"] == "updated" and inserts == []
+    assert updates == [(uuid.UUID(TEST_ITEM_ID), {"quantity": 4})]
+
+
+@pytest.mark.asyncio
+async def test_bulk_inventory_from_csv(client: AsyncClient):
+    existing = {uuid.UUID(TEST_ITEM_ID): INVENTORY(inventory_id=TEST_INVENTORY_ID, shop_id=uuid.UUID(TEST_SHOP_ID),
+                                                   item_id=uuid.UUID(TEST_ITEM_ID), quantity=10, min_quantity=5, max_quantity=100)}
+    known_items = {uuid.UUID(TEST_ITEM_ID), uuid.UUID(OTHER_ITEM_ID)}
+    with patch("app.db.session.DB.getUserSession", new_callable=AsyncMock, return_value=mock_user_session), \
+         patch("app.api.v1.endpoints.functions.inventory.db.get_attr_all") as mock_get_attr, \
+         patch("app.api.v1.endpoints.functions.inventory.load_bulk_context", return_value=(known_items, existing)), \
+         patch("app.api.v1.endpoints.functions.inventory.apply_bulk_changes") as mock_apply:
+
+        mock_get_attr.side_effect = [mock_shop, mock_db_user]
+
+        body = f"item_id,quantity,price_at_entry\n{TEST_ITEM_ID},40,\n{OTHER_ITEM_ID},7,2.5\nnot-a-uuid,1,\n"
+        headers = {"Cookie": "shopNear_=test_session_token", "Content-Type": "text/csv"}
+        response = await client.post(f"/api/v1/inventory/bulk?shop_id={TEST_SHOP_ID}", content=body, headers=headers)
+
+    assert response.status_code == 200
+    payload = response.json()["body"]
+    assert (payload["created"], payload["updated"], payload["error"]) == (1, 1, 1)
+    assert [result["result"] for result in payload["rows"]] == ["updated", "created", "error"]
+
+    [(_, shop_id, inserts, updates, pre_image, _), _] = mock_apply.call_args
+    assert shop_id == uuid.UUID(TEST_SHOP_ID) and pre_image is existing
+    assert [(row["item_id"], row["quantity"], row["price_at_entry"]) for row in inserts] == [(uuid.UUID(OTHER_ITEM_ID), 7, 2.5)]
+    assert updates == [(uuid.UUID(TEST_ITEM_ID), {"quantity": 40})]
+
+
+def test_bulk_events_use_what_the_update_wrote():
+    existing = {uuid.UUID(TEST_ITEM_ID): INVENTORY(inventory_id=TEST_INVENTORY_ID, shop_id=uuid.UUID(TEST_SHOP_ID),
+                                                   item_id=uuid.UUID(TEST_ITEM_ID), quantity=10, price_at_entry=2.0)}
+    inserts = [{"item_id": uuid.UUID(OTHER_ITEM_ID), "quantity": 7, "price_at_entry": 2.5}]
+    # as returned by UPDATE ... RETURNING
+    updated = [SimpleNamespace(item_id=uuid.UUID(TEST_ITEM_ID), quantity=40, price_at_entry=2.0)]
+
+    events = bulk_events(uuid.UUID(TEST_SHOP_ID), inserts, updated, existing, now=1_000)
+    assert [(event["item_id"], event["delta"], event["quantity"], event["created_at"]) for event in events] == [
+        (uuid.UUID(OTHER_ITEM_ID), 7, 7, 1_000), (uuid.UUID(TEST_ITEM_ID), 30, 40, 1_000),
+    ]
+
+
+def test_bulk_updates_are_one_statement_returning_what_they_wrote():
+    from sqlalchemy.dialects import postgresql
+    from app.api.v1.endpoints.functions.inventory import apply_bulk_changes
+
+    session = MagicMock()
+    session.exec.return_value.all.return_value = []
+    apply_bulk_changes(session, uuid.UUID(TEST_SHOP_ID), [], [(uuid.UUID(TEST_ITEM_ID), {"quantity": 4})], {}, now=1_000)
+
+    sql = str(session.exec.call_args_list[0].args[0].compile(dialect=postgresql.dialect()))
+    assert "FROM (VALUES" in sql and "version=(inventory.version +" in sql
+    assert sql.endswith("RETURNING inventory.item_id, inventory.quantity, inventory.price_at_entry")
+    session.commit.assert_called_once()
@@ -0,0 +1,60 @@
+import numpy as np
+
+from app.core.inventory_history import DAY, month_start, velocity
+from app.db.models.inventory import InventoryEventSource
+
+START = 1_700_000_000
+ITEM_A = "0b5c3a8e-1f4d-4e6a-9c2b-7d8e9f0a1b2c"
+ITEM_B = "5b1c8a9e-0f7d-4c55-9d2e-3a6f1b2c4d5e"
+
+
+def events(*rows):
+    item_id, created_at, delta, quantity, price, source = zip(*rows)
+    return {
+        "item_id": np.array(item_id, dtype=str),
+        "created_at": np.array(created_at, dtype=np.int64),
+        "delta": np.array(delta, dtype=np.int64),
+        "quantity": np.array(quantity, dtype=np.int64),
+        "price": np.array([np.nan if p is None else p for p in price], dtype=np.float64),
+        "source": np.array([int(s) for s in source], dtype=np.int16),
+    }
+
+
+# --- Velocity Tests ---
+
+def test_velocity_nets_returned_holds_out_of_sales():
+    history = events(
+        (ITEM_A, START, 50, 50, 2.0, InventoryEventSource.ADD),
+        (ITEM_A, START + DAY, -10, 40, 2.0, InventoryEventSource.SALE),
+        (ITEM_A, START + DAY + 1, -5, 35, 2.0, InventoryEventSource.RESERVE),
+        (ITEM_A, START + 2 * DAY, 5, 40, 2.0, InventoryEventSource.EXPIRE),
+        (ITEM_A, START + 3 * DAY, -10, 30, 2.0, InventoryEventSource.SALE),
+        (ITEM_A, START + 3 * DAY + 5, -2, 28, 2.0, InventoryEventSource.UPDATE),
+        (ITEM_B, START + DAY, 7, 7, None, InventoryEventSource.BULK),
+    )
+    report = velocity(history, START, START + 4 * DAY, bucket=DAY)
+
+    first, second = report["items"]
+    assert first["item_id"] == ITEM_A
+    assert (first["sold"], first["restocked"], first["adjusted"], first["on_hand"]) == (20, 50, -2, 28)
+    assert first["revenue"] == 40.0 and first["per_day"] == 5.0
+    assert first["sell_through"] == round(20 / 48, 3)
+    assert first["days_of_stock_left"] == 5.6
+    assert first["series"] == [0, 15, -5, 10]
+
+    # nothing sold: no rate to run out at
+    assert (second["sold"], second["on_hand"], second["sell_through"], second["days_of_stock_left"]) == (0, 7, 0.0, None)
+    assert report["totals"] == {"sold": 20, "restocked": 57, "adjusted": -2, "revenue": 40.0, "per_day": 5.0}
+    assert report["events"] == 7
+
+
+def test_velocity_of_an_empty_window():
+    history = {name: np.array([], dtype=dtype) for name, dtype in
+               (("item_id", str), ("created_at", np.int64), ("delta", np.int64), ("quantity", np.int64), ("price", np.float64), ("source", np.int16))}
+    report = velocity(history, START, START + DAY, bucket=3600)
+    assert report["items"] == [] and report["totals"]["sold"] == 0
+
+
+def test_months_roll_over_into_the_next_year():
+    assert month_start(2026, 13) == month_start(2027, 1)
+    assert month_start(2027, 1) - month_start(2026, 12) == 31 * DAY
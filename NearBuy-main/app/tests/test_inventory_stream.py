@@ -0,0 +1,126 @@
+import asyncio
+from contextlib import aclosing
+import orjson
+import pytest
+
+from app.core.inventory_stream import PING, RESET, STREAM_PREFIX, InventoryStream, parse_sequence, sse_frame
+
+SHOP_ID = "07446c46-7775-4c99-a29e-79843fb69f93"
+OTHER_SHOP_ID = "5b1c8a9e-0f7d-4c55-9d2e-3a6f1b2c4d5e"
+
+
+class StubRedis:
+    """PUBLISH_DELTAS_SCRIPT and XRANGE over in-memory streams; published messages go straight to `subscriber`."""
+
+    def __init__(self):
+        self.streams = {}
+        self.clock = 0
+        self.subscriber = None
+
+    async def eval(self, script, numkeys, key, channel, maxlen, retention, shop_id, *deltas):
+        entries = self.streams.setdefault(key, [])
+        events = []
+        for change in deltas:
+            self.clock += 1
+            entry_id = f"1700000000000-{self.clock}"
+            entries.append((entry_id.encode(), {b"d": change}))
+            events.append([entry_id, orjson.loads(change)])
+        del entries[:-maxlen]
+        self.subscriber(orjson.dumps({"shop_id": shop_id, "events": events}))
+        return len(events)
+
+    async def xrange(self, key, min="-", max="+"):
+        return [(entry_id, fields) for entry_id, fields in self.streams.get(key, [])
+                if parse_sequence(entry_id.decode()) >= parse_sequence(min)]
+
+
+def make_stream(**kwargs):
+    redis = StubRedis()
+    stream = InventoryStream(redis, **kwargs)
+    redis.subscriber = stream.dispatch
+    return stream, redis
+
+
+def change(quantity, version):
+    return {"inventory_id": "inv-1", "item_id": "item-1", "quantity": quantity, "status": "IN_STOCK", "version": version}
+
+
+async def take(events, count):
+    received = []
+    while len(received) < count:
+        received.append(await asyncio.wait_for(events.__anext__(), 1))
+    return received
+
+
+def quantities(received):
+    return [orjson.loads(payload)["quantity"] for kind, _, payload in received if kind == "inventory"]
+
+
+# --- Fan-out Tests ---
+
+@pytest.mark.asyncio
+async def test_deltas_reach_the_shops_subscribers_in_order():
+    stream, _ = make_stream()
+    async with aclosing(stream.events(SHOP_ID)) as events:
+        first = asyncio.ensure_future(events.__anext__())
+        await asyncio.sleep(0)
+        assert stream.snapshot()["subscribers"] == 1
+
+        await stream.publish({OTHER_SHOP_ID: [change(1, 9)], SHOP_ID: [change(9, 2), change(8, 3)]})
+        received = [await first, *await take(events, 1)]
+        assert quantities(received) == [9, 8]
+        assert next(iter(stream.subscribers[SHOP_ID])).queue.empty()
+        assert sse_frame(*received[0]).startswith(b"id: " + received[0][1].encode() + b"\nevent: inventory\ndata: {")
+    assert stream.snapshot()["subscribers"] == 0
+
+
+@pytest.mark.asyncio
+async def test_a_slow_subscriber_catches_up_from_the_stream_without_gaps():
+    stream, _ = make_stream(queue_size=2)
+    async with aclosing(stream.events(SHOP_ID)) as events:
+        waiting = asyncio.ensure_future(events.__anext__())
+        await asyncio.sleep(0)
+        await stream.publish({SHOP_ID: [change(10, 2)]})
+        received = [await waiting]
+
+        # five deltas while the client isn't reading: more than its queue holds
+        for version in range(3, 8):
+            await stream.publish({SHOP_ID: [change(10 - version, version)]})
+        assert stream.counts["lagged"] == 1
+
+        received += await take(events, 5)
+    assert quantities(received) == [10, 7, 6, 5, 4, 3]
+    assert stream.counts["replayed"] == 5
+
+
+# --- Resume Tests ---
+
+@pytest.mark.asyncio
+async def test_a_client_resumes_after_its_last_sequence_or_is_told_to_reload():
+    stream, redis = make_stream()
+    stream_key = f"{STREAM_PREFIX}{SHOP_ID}"
+    await stream.publish({SHOP_ID: [change(quantity, version) for version, quantity in enumerate((5, 4, 3), start=2)]})
+    seen = redis.streams[stream_key][0][0].decode()
+
+    async with aclosing(stream.events(SHOP_ID, after=seen)) as events:
+        assert quantities(await take(events, 2)) == [4, 3]
+
+    # the sequence was trimmed away: nothing to resume from
+    del redis.streams[stream_key][:2]
+    async with aclosing(stream.events(SHOP_ID, after=seen)) as events:
+        assert (await take(events, 1))[0][0] == RESET
+    assert stream.counts["resets"] == 1
+
+
+@pytest.mark.asyncio
+async def test_idle_connections_get_heartbeats():
+    stream, _ = make_stream(heartbeat=0.01)
+    async with aclosing(stream.events(SHOP_ID)) as events:
+        assert [kind for kind, _, _ in await take(events, 2)] == [PING, PING]
+    assert sse_frame(PING) == b": ping\n\n"
+
+
+def test_sequences_must_be_stream_ids():
+    assert parse_sequence("1700000000000-12") == (1700000000000, 12)
+    with pytest.raises(ValueError):
+        parse_sequence("12; DROP")
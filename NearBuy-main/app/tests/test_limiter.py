@@ -0,0 +1,47 @@
+import ipaddress
+from fastapi import FastAPI, Request as FastAPIRequest
+from fastapi.testclient import TestClient
+from slowapi import Limiter, _rate_limit_exceeded_handler
+from slowapi.errors import RateLimitExceeded
+from starlette.requests import Request
+
+from app.core import limiter as limiter_module
+from app.core.limiter import get_rate_limit_key
+
+
+def make_request(headers=None, client_host="10.0.0.1"):
+    raw_headers = [(k.lower().encode(), v.encode()) for k, v in (headers or {}).items()]
+    scope = {"type": "http", "method": "GET", "path": "/", "headers": raw_headers, "client": (client_host, 1234)}
+    return Request(scope)
+
+# --- Rate limit key Tests ---
+
+def test_anonymous_callers_are_keyed_by_socket_address():
+    request = make_request(headers={"x-real-ip": "203.0.113.7", "cookie": "shopNear_=secret_token"})
+    assert get_rate_limit_key(request) == "ip:10.0.0.1"
+
+
+def test_forwarded_headers_are_only_believed_from_trusted_proxies(monkeypatch):
+    monkeypatch.setattr(limiter_module, "TRUSTED_PROXIES", [ipaddress.ip_network("10.0.0.0/8")])
+    assert get_rate_limit_key(make_request(headers={"x-real-ip": "203.0.113.7"})) == "ip:203.0.113.7"
+    assert get_rate_limit_key(make_request(headers={"cf-connecting-ip": "198.51.100.2", "x-real-ip": "203.0.113.7"})) == "ip:198.51.100.2"
+    assert get_rate_limit_key(make_request(headers={"x-real-ip": "203.0.113.7"}, client_host="192.0.2.9")) == "ip:192.0.2.9"
+
+
+def test_rotating_cookies_or_forwarded_headers_does_not_reset_the_limit():
+    app = FastAPI()
+    app.state.limiter = Limiter(key_func=get_rate_limit_key, storage_uri="memory://")
+    app.add_exception_handler(RateLimitExceeded, _rate_limit_exceeded_handler)
+
+    @app.post("/login")
+    @app.state.limiter.limit("2/minute")
+    async def login(request: FastAPIRequest):
+        return {}
+
+    client = TestClient(app)
+    statuses = [
+        client.post("/login", headers={"Cookie": f"shopNear_=guess{attempt}", "X-Real-IP": f"203.0.113.{attempt}",
+                                       "CF-Connecting-IP": f"198.51.100.{attempt}"}).status_code
+        for attempt in range(4)
+    ]
+    assert statuses == [200, 200, 429, 429]
@@ -0,0 +1,167 @@
+import asyncio
+import uuid
+import pytest
+from unittest.mock import patch
+from sqlalchemy.pool import StaticPool
+from sqlmodel import Session, create_engine, select
+
+from app.core import outbox as outbox_module
+from app.core.outbox import OutboxWorker, outbox_backlog
+from app.db.models.inventory import INVENTORY
+from app.db.models.item import ITEM
+from app.db.models.outbox import OUTBOX_EVENT, OutboxStatus
+from app.db.models.sync import SYNC_TOMBSTONE
+
+SHOP_ID = uuid.UUID("07446c46-7775-4c99-a29e-79843fb69f93")
+
+
+class StubDocuments:
+    def __init__(self):
+        self.upserts, self.deletes, self.imports = [], [], 0
+        self.fail = False
+
+    def import_(self, documents, params):
+        if self.fail:
+            raise ConnectionError("typesense unavailable")
+        self.imports += 1
+        self.upserts.extend(documents)
+        return [{"success": True} for _ in documents]
+
+    def delete(self, params):
+        self.deletes.append(params["filter_by"])
+        return {"num_deleted": 1}
+
+
+class StubCollection:
+    def __init__(self):
+        self.documents = StubDocuments()
+
+
+class StubTypesense:
+    def __init__(self):
+        self.collections = {"items": StubCollection()}
+
+
+class StubCache:
+    def __init__(self):
+        self.calls = []
+
+    async def invalidate(self, namespaces=(), keys=(), tags=()):
+        self.calls.append({"namespaces": namespaces, "keys": keys, "tags": tags})
+
+
+@pytest.fixture
+def engine():
+    engine = create_engine("sqlite://", poolclass=StaticPool, connect_args={"check_same_thread": False})
+    for model in (ITEM, INVENTORY, OUTBOX_EVENT, SYNC_TOMBSTONE):
+        model.__table__.create(engine)
+    return engine
+
+
+def pending_events(engine):
+    with Session(engine) as session:
+        return session.exec(select(OUTBOX_EVENT)).all()
+
+
+# --- Outbox Tests ---
+
+def test_item_writes_enqueue_events_in_the_same_transaction(engine):
+    with Session(engine) as session:
+        item = ITEM(shop_id=SHOP_ID, itemName="Widget", price=9.5)
+        session.add(item)
+        session.rollback()
+    assert pending_events(engine) == []
+
+    with Session(engine) as session:
+        session.add(ITEM(shop_id=SHOP_ID, itemName="Widget", price=9.5))
+        session.commit()
+    [event] = pending_events(engine)
+    assert event.collection == "items" and event.status == OutboxStatus.PENDING
+    assert f"item:{SHOP_ID}:Widget" in event.invalidate["keys"] and event.invalidate["namespaces"] == ["all_items"]
+
+
+def test_drain_upserts_current_rows_deletes_missing_ones_and_invalidates(engine):
+    with Session(engine) as session:
+        kept = ITEM(shop_id=SHOP_ID, itemName="Kept", price=1.0)
+        gone = ITEM(shop_id=SHOP_ID, itemName="Gone", price=1.0)
+        session.add_all([kept, gone])
+        session.commit()
+        kept.price = 2.0
+        session.delete(gone)
+        session.commit()
+        kept_id, gone_id = str(kept.id), str(gone.id)
+
+    ts, cache = StubTypesense(), StubCache()
+    worker = OutboxWorker(engine=engine, ts_client=ts, cache=cache)
+    assert asyncio.run(worker.drain_once()) == 4
+
+    documents = ts.collections["items"].documents
+    # two events for the kept row collapse into one upsert of its current state
+    assert [(doc["id"], doc["price"]) for doc in documents.upserts] == [(kept_id, 2.0)]
+    assert documents.deletes == [f"id:[{gone_id}]"]
+    assert {f"item:{kept_id}", f"item:{gone_id}"} <= set(cache.calls[0]["tags"])
+    assert pending_events(engine) == [] and worker.metrics.counts["processed"] == 4
+
+
+def test_failures_back_off_and_end_up_dead_lettered(engine):
+    with Session(engine) as session:
+        session.add(ITEM(shop_id=SHOP_ID, itemName="Widget", price=9.5))
+        session.commit()
+
+    ts = StubTypesense()
+    ts.collections["items"].documents.fail = True
+    worker = OutboxWorker(engine=engine, ts_client=ts, cache=StubCache())
+
+    with patch.object(outbox_module, "OUTBOX_MAX_ATTEMPTS", 2), patch.object(outbox_module, "OUTBOX_RETRY_BACKOFF", 0):
+        asyncio.run(worker.drain_once())
+        [event] = pending_events(engine)
+        assert event.attempts == 1 and event.status == OutboxStatus.PENDING and "unavailable" in event.last_error
+
+        with Session(engine) as session:
+            session.get(OUTBOX_EVENT, event.id).next_attempt_at = 0
+            session.commit()
+        asyncio.run(worker.drain_once())
+
+    [event] = pending_events(engine)
+    assert event.status == OutboxStatus.DEAD and worker.metrics.counts["dead_lettered"] == 1
+    with Session(engine) as session:
+        backlog = outbox_backlog(session)
+    assert backlog["dead"] == 1 and backlog["pending"] == 0
+
+
+def add_item(engine, name):
+    with Session(engine) as session:
+        session.add(ITEM(shop_id=SHOP_ID, itemName=name, price=1.0))
+        session.commit()
+
+
+def test_a_burst_of_writes_is_flushed_in_one_import(engine):
+    ts = StubTypesense()
+    worker = OutboxWorker(engine=engine, ts_client=ts, cache=StubCache())
+
+    async def burst():
+        task = asyncio.create_task(worker.run())
+        await asyncio.sleep(0.01)
+        for name in ("one", "two", "three"):
+            add_item(engine, name)
+            worker.wake()
+            await asyncio.sleep(0.01)
+        await asyncio.sleep(0.3)
+        task.cancel()
+
+    with patch.object(outbox_module, "OUTBOX_FLUSH_DELAY", 0.2):
+        asyncio.run(burst())
+
+    documents = ts.collections["items"].documents
+    assert documents.imports == 1 and len(documents.upserts) == 3
+    assert worker.metrics.snapshot()["events_per_flush"] == 3
+
+
+def test_flush_drains_everything_pending_on_shutdown(engine):
+    for name in ("one", "two", "three"):
+        add_item(engine, name)
+    ts = StubTypesense()
+    worker = OutboxWorker(engine=engine, ts_client=ts, cache=StubCache(), batch_size=2)
+
+    assert asyncio.run(worker.flush(timeout=5)) == 3
+    assert pending_events(engine) == [] and ts.collections["items"].documents.imports == 2
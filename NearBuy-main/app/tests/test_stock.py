@@ -0,0 +1,133 @@
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+from sqlmodel import Session, create_engine, select
+
+from app.core.inventory_history import load_events, velocity
+from app.core.stock import commit_reservation, decrement, release, release_expired, reserve
+from app.db.models.inventory import INVENTORY, INVENTORY_EVENT, INVENTORY_RESERVATION, InventoryEventSource
+from app.db.session import DB, VERSION_CONFLICT
+
+SHOP_ID = uuid.UUID("07446c46-7775-4c99-a29e-79843fb69f93")
+INVENTORY_ID = "inv-abc-123-xyz-789"
+
+
+@pytest.fixture
+def engine(tmp_path):
+    # a file, so every thread gets its own connection like app workers do
+    engine = create_engine(f"sqlite:///{tmp_path / 'stock.db'}", connect_args={"check_same_thread": False, "timeout": 30})
+    for model in (INVENTORY, INVENTORY_RESERVATION, INVENTORY_EVENT):
+        model.__table__.create(engine)
+    with Session(engine) as session:
+        session.add(INVENTORY(inventory_id=INVENTORY_ID, shop_id=SHOP_ID, item_id=uuid.uuid4(), quantity=100))
+        session.commit()
+    return engine
+
+
+def stock(engine):
+    with Session(engine) as session:
+        return session.exec(select(INVENTORY.quantity, INVENTORY.version)).one()
+
+
+def stock_status(engine):
+    with Session(engine) as session:
+        return session.exec(select(INVENTORY.status)).one()
+
+
+# --- Stock Tests ---
+
+def test_concurrent_decrements_lose_no_units(engine):
+    def sell(_):
+        with Session(engine) as session:
+            return sum(decrement(session, INVENTORY_ID, 1) is not None for _ in range(10))
+
+    with ThreadPoolExecutor(max_workers=16) as pool:
+        sold = sum(pool.map(sell, range(16)))
+
+    # 160 attempts on 100 units: exactly 100 succeed, none oversold
+    assert sold == 100
+    assert stock(engine) == (0, 101)
+
+
+def test_concurrent_reservations_and_releases_balance_out(engine):
+    def hold_and_release(_):
+        with Session(engine) as session:
+            reservation = reserve(session, INVENTORY_ID, 3, ttl=60)
+            if reservation is None:
+                return 0
+            return 0 if release(session, reservation.reservation_id) is None else 1
+
+    with ThreadPoolExecutor(max_workers=16) as pool:
+        released = sum(pool.map(hold_and_release, range(64)))
+
+    assert released > 0 and stock(engine)[0] == 100
+    with Session(engine) as session:
+        assert session.exec(select(INVENTORY_RESERVATION)).all() == []
+
+
+def test_reservations_commit_or_expire_back_into_stock(engine):
+    with Session(engine) as session:
+        sold = reserve(session, INVENTORY_ID, 30, ttl=60).reservation_id
+        lapsed = reserve(session, INVENTORY_ID, 20, ttl=60).reservation_id
+        assert reserve(session, INVENTORY_ID, 51, ttl=60) is None
+        assert stock(engine)[0] == 50
+
+        assert commit_reservation(session, sold)["quantity"] == 30
+        # a committed hold can't be released afterwards
+        assert release(session, sold) is None
+
+        assert release_expired(session, now=int(time.time()) + 61) == {INVENTORY_ID: 20}
+        assert commit_reservation(session, lapsed) is None
+    assert stock(engine)[0] == 70
+
+
+@pytest.mark.asyncio
+async def test_full_updates_are_rejected_once_the_row_moved_on(engine):
+    with Session(engine) as session:
+        decrement(session, INVENTORY_ID, 5)
+        stale, fresh = 1, 2
+
+        message, ok = await DB.update_versioned("INVENTORY", {"quantity": 90}, session, {"inventory_id": INVENTORY_ID}, version=stale)
+        assert (message, ok) == (VERSION_CONFLICT, False)
+        message, ok = await DB.update_versioned("INVENTORY", {"quantity": 90}, session, {"inventory_id": INVENTORY_ID}, version=fresh)
+        assert ok
+    assert stock(engine) == (90, 3)
+
+
+def test_status_is_derived_from_quantity_by_the_database(engine):
+    # min_quantity defaults to 5
+    assert stock_status(engine) == "IN_STOCK"
+    with Session(engine) as session:
+        decrement(session, INVENTORY_ID, 95)
+        assert stock_status(engine) == "LOW"
+        reservation = reserve(session, INVENTORY_ID, 5, ttl=60)
+        assert stock_status(engine) == "OUT_OF_STOCK"
+        release(session, reservation.reservation_id)
+    assert stock_status(engine) == "LOW"
+
+
+def test_stock_movements_are_recorded_with_their_change(engine):
+    with Session(engine) as session:
+        decrement(session, INVENTORY_ID, 4)
+        sold = reserve(session, INVENTORY_ID, 10, ttl=60).reservation_id
+        released = reserve(session, INVENTORY_ID, 6, ttl=60).reservation_id
+        reserve(session, INVENTORY_ID, 5, ttl=60)
+        commit_reservation(session, sold)
+        release(session, released)
+        release_expired(session, now=int(time.time()) + 61)
+        # a failed decrement changes nothing and records nothing
+        assert decrement(session, INVENTORY_ID, 1000) is None
+
+        events = session.exec(select(INVENTORY_EVENT.source, INVENTORY_EVENT.delta, INVENTORY_EVENT.quantity)).all()
+        assert sorted((event.source, event.delta) for event in events) == sorted([
+            (InventoryEventSource.SALE, -4), (InventoryEventSource.RESERVE, -10), (InventoryEventSource.RESERVE, -6),
+            (InventoryEventSource.RESERVE, -5), (InventoryEventSource.RELEASE, 6), (InventoryEventSource.EXPIRE, 5),
+        ])
+        assert min(event.quantity for event in events) == 75
+        assert stock(engine)[0] == 86
+
+        now = int(time.time())
+        report = velocity(load_events(session, SHOP_ID, now - 3600, now + 3600), now - 3600, now + 3600)
+    # the held units that came back are not sold
+    assert report["totals"]["sold"] == 14
@@ -0,0 +1,355 @@
+import json
+import uuid
+from collections import Counter
+import pytest
+import typesense
+from unittest.mock import patch
+from sqlalchemy.pool import StaticPool
+from sqlmodel import Session, create_engine, delete, select
+
+from app.db.models.inventory import INVENTORY
+from app.db.models.item import ITEM
+from app.db.models.outbox import OUTBOX_EVENT
+from app.db.models.sync import SYNC_CHECKPOINT, SYNC_TOMBSTONE
+from typesense_helper import incremental_sync
+from typesense_helper.incremental_sync import item_document, sync_collection
+from typesense_helper.reconcile import claim_run, reconcile_collection
+from typesense_helper.reindex import rebuild_collection, reindex_collection
+
+SHOP_ID = uuid.UUID("07446c46-7775-4c99-a29e-79843fb69f93")
+
+
+class StubDocuments:
+    def __init__(self, collection):
+        self.collection = collection
+
+    def import_(self, documents, params):
+        if isinstance(documents, bytes):
+            # JSONL in, JSONL out, like the real client
+            parsed = [json.loads(line) for line in documents.splitlines()]
+            self.collection.imports.append([doc["id"] for doc in parsed])
+            results = [self.collection.result_for(doc["id"]) for doc in parsed]
+            self.collection.stored.update({doc["id"]: doc for doc, result in zip(parsed, results) if result["success"]})
+            return "\n".join(json.dumps(result) for result in results)
+        self.collection.imports.append([doc["id"] for doc in documents])
+        self.collection.stored.update({doc["id"]: doc for doc in documents})
+        return [{"success": True} for _ in documents]
+
+    def delete(self, params):
+        self.collection.deletes.append(params["filter_by"])
+        return {"num_deleted": params["filter_by"].count(",") + 1}
+
+    def export(self, params):
+        field, _, values = params["filter_by"].partition(":=")
+        wanted, fields = values.strip("[]").split(","), params["include_fields"].split(",")
+        return "\n".join(
+            json.dumps({name: doc[name] for name in fields if name in doc})
+            for doc in self.collection.stored.values() if doc[field] in wanted
+        )
+
+    def search(self, params):
+        counts = Counter(doc[params["facet_by"]] for doc in self.collection.stored.values())
+        return {"facet_counts": [{"field_name": params["facet_by"], "counts": [{"value": v, "count": c} for v, c in counts.items()]}]}
+
+
+class StubCollection:
+    def __init__(self, name="items", registry=None):
+        self.name, self.registry = name, registry
+        self.imports, self.deletes = [], []
+        self.stored = {}  # document id -> document
+        self.failing = {}  # document id -> failures left
+        self.documents = StubDocuments(self)
+
+    def retrieve(self):
+        return {"name": self.name, "num_documents": len(self.stored), "fields": []}
+
+    def delete(self):
+        del self.registry[self.name]
+
+    def result_for(self, doc_id):
+        if self.failing.get(doc_id):
+            self.failing[doc_id] -= 1
+            return {"success": False, "error": "overloaded"}
+        return {"success": True}
+
+
+class StubCollections(dict):
+    def __missing__(self, name):
+        raise typesense.exceptions.ObjectNotFound(name)
+
+    def retrieve(self):
+        return [collection.retrieve() for collection in self.values()]
+
+    def create(self, schema):
+        self[schema["name"]] = StubCollection(schema["name"], self)
+
+
+class StubAlias:
+    def __init__(self, aliases, name):
+        self.aliases, self.name = aliases, name
+
+    def retrieve(self):
+        if self.name not in self.aliases.targets:
+            raise typesense.exceptions.ObjectNotFound(self.name)
+        return {"name": self.name, "collection_name": self.aliases.targets[self.name]}
+
+
+class StubAliases:
+    def __init__(self, collections):
+        self.collections = collections
+        self.targets = {}
+
+    def __getitem__(self, name):
+        return StubAlias(self, name)
+
+    def upsert(self, name, params):
+        # like Typesense, an alias can't take the name of a collection
+        if name in self.collections:
+            raise typesense.exceptions.ObjectAlreadyExists(name)
+        self.targets[name] = params["collection_name"]
+
+
+class StubTypesense:
+    def __init__(self):
+        self.collections = StubCollections()
+        self.collections["items"] = StubCollection("items", self.collections)
+        self.aliases = StubAliases(self.collections)
+
+
+def versioned_typesense():
+    # items -> items_v1, with a stale document the rebuild shouldn't carry over
+    ts = StubTypesense()
+    del ts.collections["items"]
+    ts.collections.create({"name": "items_v1"})
+    ts.collections["items_v1"].stored["stale"] = {"id": "stale", "shop_id": str(SHOP_ID)}
+    ts.aliases.upsert("items", {"collection_name": "items_v1"})
+    return ts
+
+
+@pytest.fixture
+def session():
+    # one shared connection, the reindexer commits checkpoints on a second session
+    engine = create_engine("sqlite://", poolclass=StaticPool, connect_args={"check_same_thread": False})
+    for model in (ITEM, INVENTORY, SYNC_CHECKPOINT, SYNC_TOMBSTONE, OUTBOX_EVENT):
+        model.__table__.create(engine)
+    with Session(engine) as session:
+        yield session
+
+
+def add_items(session, names, updated_at):
+    items = [ITEM(shop_id=SHOP_ID, itemName=name, price=1.0, updated_at=updated_at) for name in names]
+    session.add_all(items)
+    session.commit()
+    return [item.id for item in items]
+
+
+# --- Incremental Sync Tests ---
+
+def test_only_rows_changed_since_the_checkpoint_are_pushed(session):
+    ts = StubTypesense()
+    old = add_items(session, ["old"], updated_at=1_000)
+    recent = add_items(session, ["recent"], updated_at=5_000)
+
+    with patch.object(incremental_sync, "SYNC_WATERMARK_OVERLAP", 60):
+        first = sync_collection(session, ts, "items", batch_size=1)
+        assert first["upserted"] == 2 and len(ts.collections["items"].imports) == 2
+        assert session.get(SYNC_CHECKPOINT, "items").watermark == 5_000
+
+        changed = add_items(session, ["new"], updated_at=9_000)
+        second = sync_collection(session, ts, "items")
+
+    # rows within the overlap window are pushed again, older ones aren't read
+    assert second["upserted"] == 2 and ts.collections["items"].imports[-1] == [str(recent[0]), str(changed[0])]
+    assert str(old[0]) not in ts.collections["items"].imports[-1]
+    assert session.get(SYNC_CHECKPOINT, "items").watermark == 9_000
+
+
+def test_deleted_rows_are_removed_through_tombstones(session):
+    ts = StubTypesense()
+    item_id = add_items(session, ["gone"], updated_at=1_000)[0]
+    sync_collection(session, ts, "items")
+
+    session.delete(session.get(ITEM, item_id))
+    session.commit()
+    tombstone = session.exec(select(SYNC_TOMBSTONE)).one()
+    assert (tombstone.collection, tombstone.document_id) == ("items", str(item_id))
+
+    result = sync_collection(session, ts, "items")
+    assert result["deleted"] == 1 and ts.collections["items"].deletes == [f"id:[{item_id}]"]
+    assert session.get(SYNC_CHECKPOINT, "items").deleted_watermark == tombstone.deleted_at
+
+
+def test_failed_imports_keep_the_checkpoint(session):
+    ts = StubTypesense()
+    add_items(session, ["broken"], updated_at=1_000)
+    ts.collections["items"].documents.import_ = lambda documents, params: [{"success": False, "error": "bad"}]
+
+    with pytest.raises(RuntimeError):
+        sync_collection(session, ts, "items")
+    assert session.get(SYNC_CHECKPOINT, "items") is None
+
+
+def test_item_documents_say_whether_any_shop_has_it_in_stock(session):
+    ts = StubTypesense()
+    stocked, sold_out, unlisted = add_items(session, ["stocked", "sold out", "unlisted"], updated_at=1_000)
+    session.add_all([
+        INVENTORY(inventory_id="inv-stocked", shop_id=SHOP_ID, item_id=stocked, quantity=3),
+        INVENTORY(inventory_id="inv-sold-out", shop_id=SHOP_ID, item_id=sold_out, quantity=0),
+    ])
+    session.commit()
+
+    sync_collection(session, ts, "items")
+    stored = ts.collections["items"].stored
+    assert [stored[str(item_id)]["in_stock"] for item_id in (stocked, sold_out, unlisted)] == [True, False, False]
+
+
+# --- Reindex Tests ---
+
+def test_reindex_streams_batches_and_retries_failed_documents(session):
+    ts = StubTypesense()
+    ids = add_items(session, [f"item-{i}" for i in range(7)], updated_at=1_000)
+    ts.collections["items"].failing[str(ids[0])] = 1
+
+    with patch("typesense_helper.reindex.SYNC_RETRY_BACKOFF", 0):
+        stats = reindex_collection(session, ts, "items", batch_size=3, workers=2)
+
+    assert (stats["documents"], stats["batches"], stats["retries"]) == (7, 3, 1)
+    # the retry re-sent only the document that failed
+    assert [str(ids[0])] in ts.collections["items"].imports
+    checkpoint = session.get(SYNC_CHECKPOINT, "items")
+    assert checkpoint.reindex_cursor is None and checkpoint.watermark > 0
+
+
+def test_reindex_resumes_after_the_last_acknowledged_batch(session):
+    ts = StubTypesense()
+    ids = sorted(add_items(session, [f"item-{i}" for i in range(6)], updated_at=1_000))
+    ts.collections["items"].failing[str(ids[4])] = 10
+
+    with patch("typesense_helper.reindex.SYNC_RETRY_BACKOFF", 0), pytest.raises(RuntimeError):
+        reindex_collection(session, ts, "items", batch_size=2, workers=1)
+    session.expire_all()
+    assert session.get(SYNC_CHECKPOINT, "items").reindex_cursor == str(ids[3])
+
+    ts.collections["items"].failing.clear()
+    ts.collections["items"].imports.clear()
+    stats = reindex_collection(session, ts, "items", batch_size=2, workers=1, resume=True)
+
+    assert stats["resumed_after"] == str(ids[3])
+    assert ts.collections["items"].imports == [[str(ids[4]), str(ids[5])]]
+
+
+# --- Rebuild Tests ---
+
+def test_rebuild_fills_a_new_version_and_swaps_the_alias(session):
+    ts = versioned_typesense()
+    ids = add_items(session, [f"item-{i}" for i in range(3)], updated_at=1_000)
+
+    stats = rebuild_collection(session, ts, "items", batch_size=2, workers=1)
+
+    assert (stats["target"], stats["previous"]) == ("items_v2", "items_v1")
+    assert ts.aliases.targets["items"] == "items_v2"
+    assert set(ts.collections["items_v2"].stored) == {str(item_id) for item_id in ids}
+    # the previous version is kept for rolling back
+    assert "items_v1" in ts.collections and stats["dropped"] == []
+    assert session.get(SYNC_CHECKPOINT, "items").reindex_target is None
+
+
+def test_rebuild_refuses_to_swap_an_incomplete_version(session):
+    ts = versioned_typesense()
+    add_items(session, [f"item-{i}" for i in range(3)], updated_at=1_000)
+
+    # every collection reports a document fewer than it was sent
+    with patch.object(StubCollection, "retrieve", lambda self: {"name": self.name, "num_documents": len(self.stored) - 1}):
+        with pytest.raises(RuntimeError):
+            rebuild_collection(session, ts, "items")
+
+    assert ts.aliases.targets["items"] == "items_v1"
+    session.expire_all()
+    # left in place for --resume
+    assert session.get(SYNC_CHECKPOINT, "items").reindex_target == "items_v2"
+
+
+def test_rebuild_drops_versions_beyond_the_ones_kept(session):
+    ts = versioned_typesense()
+    add_items(session, ["item"], updated_at=1_000)
+
+    rebuild_collection(session, ts, "items")
+    stats = rebuild_collection(session, ts, "items")
+
+    assert ts.aliases.targets["items"] == "items_v3"
+    assert stats["dropped"] == ["items_v1"]
+    assert sorted(name for name in ts.collections) == ["items_v2", "items_v3"]
+
+
+def test_rebuild_replaces_a_collection_from_before_aliases(session):
+    ts = StubTypesense()
+    add_items(session, ["item"], updated_at=1_000)
+
+    stats = rebuild_collection(session, ts, "items")
+
+    assert stats["legacy_cutover"] and stats["previous"] is None
+    assert "items" not in ts.collections
+    assert ts.aliases.targets["items"] == "items_v1"
+
+
+def test_swapping_an_alias_deletes_nothing(session):
+    ts = versioned_typesense()
+    add_items(session, ["item"], updated_at=1_000)
+
+    with patch.object(StubCollection, "delete", side_effect=AssertionError("collection deleted during the swap")):
+        stats = rebuild_collection(session, ts, "items")
+
+    assert not stats["legacy_cutover"]
+    assert ts.aliases.targets["items"] == "items_v2"
+
+
+# --- Reconcile Tests ---
+
+OTHER_SHOP_ID = uuid.UUID("5b0c7c1e-2f5d-4f0e-9a51-0d3c5a3c9e11")
+
+
+def drifted_index(session):
+    """Index holding one item in sync, one with an old price, none for a third, a ghost and an orphaned shop."""
+    ts = StubTypesense()
+    ids = add_items(session, ["synced", "repriced", "unindexed"], updated_at=1_000)
+    # the outbox already drained these
+    session.exec(delete(OUTBOX_EVENT))
+    session.commit()
+    items = [session.get(ITEM, item_id) for item_id in ids]
+    stored = ts.collections["items"].stored
+    stored[str(ids[0])] = item_document(items[0])
+    stored[str(ids[1])] = {**item_document(items[1]), "content_hash": "old"}
+    stored["ghost"] = {"id": "ghost", "shop_id": str(SHOP_ID), "content_hash": "x"}
+    stored["orphan"] = {"id": "orphan", "shop_id": str(OTHER_SHOP_ID), "content_hash": "x"}
+    return ts, [str(item_id) for item_id in ids]
+
+
+def test_dry_run_reports_drift_without_repairing(session):
+    ts, ids = drifted_index(session)
+
+    report = reconcile_collection(session, ts, "items", dry_run=True)
+
+    assert (report["missing"], report["stale"], report["extra"], report["orphaned_shops"]) == (1, 1, 1, 1)
+    assert report["drift"] == 4 and report["shops_diverged"] == 1
+    assert report["samples"] == {"missing": [ids[2]], "stale": [ids[1]], "extra": ["ghost"], "orphaned_shops": [str(OTHER_SHOP_ID)]}
+    assert session.exec(select(OUTBOX_EVENT)).all() == [] and ts.collections["items"].deletes == []
+
+
+def test_repairs_go_through_the_outbox_and_skip_documents_in_flight(session):
+    ts, ids = drifted_index(session)
+    session.add(OUTBOX_EVENT(collection="items", document_id=ids[1]))
+    session.commit()
+
+    report = reconcile_collection(session, ts, "items")
+
+    # the repriced item already has an update on its way
+    assert report["stale"] == 0 and report["repaired"] == 3
+    queued = {event.document_id for event in session.exec(select(OUTBOX_EVENT)).all()}
+    assert queued == {ids[1], ids[2], "ghost"}
+    assert ts.collections["items"].deletes == [f"shop_id:[{OTHER_SHOP_ID}]"]
+
+
+def test_only_one_worker_claims_a_scheduled_run(session):
+    assert claim_run(session, "items", interval=3600)
+    assert not claim_run(session, "items", interval=3600)
+    assert claim_run(session, "items", interval=0)
@@ -1,3 +1,4 @@
+import asyncio
 from fastapi import FastAPI
 from contextlib import asynccontextmanager
 from sqlmodel import SQLModel
@@ -13,6 +14,14 @@ from app.api.v1.endpoints.searchApi import search_router
 from app.api.v1.endpoints.statusApi import status_router
 from typesense_helper.typesense_client import create_collections 
 from fastapi.middleware.cors import CORSMiddleware
+from app.core.compression import CompressionMiddleware
+from RDB.redis_client import close_redis_client
+from RDB.cache import cache
+from app.core.outbox import outbox
+from app.core.reconcile import reconciler
+from app.core.stock import run_reservation_sweeper
+from app.core.inventory_history import run_partition_maintenance
+from app.core.inventory_stream import inventory_stream
 
 
 port = 8059
@@ -21,7 +30,21 @@ port = 8059
 async def lifespan(app: FastAPI):
     await DataBasePool.setup()
     create_collections()
+    cache_listener = asyncio.create_task(cache.listen())
+    stream_listener = asyncio.create_task(inventory_stream.listen())
+    outbox_worker = asyncio.create_task(outbox.run())
+    reconcile_job = asyncio.create_task(reconciler.run())
+    reservation_sweeper = asyncio.create_task(run_reservation_sweeper())
+    partition_maintenance = asyncio.create_task(run_partition_maintenance())
     yield
+    partition_maintenance.cancel()
+    reservation_sweeper.cancel()
+    reconcile_job.cancel()
+    outbox_worker.cancel()
+    await outbox.flush()
+    stream_listener.cancel()
+    cache_listener.cancel()
+    await close_redis_client()
     await DataBasePool.teardown()
 
 
@@ -38,6 +61,8 @@ app.add_middleware(
     allow_headers=["*"], 
 )
 
+app.add_middleware(CompressionMiddleware)
+
 app.state.limiter = limiter
 app.add_exception_handler(RateLimitExceeded, _rate_limit_exceeded_handler)
 
@@ -0,0 +1,86 @@
+"""
+Compares the old cache format (json.dumps string, decoded and re-encoded on every hit) with
+RDB/codec.py (orjson bytes, zstd above CACHE_COMPRESS_MIN_BYTES, spliced into the response).
+
+Reports stored size per entry and the cost of turning a Redis hit into response bytes for
+realistic shop and item payloads. No Redis or database needed.
+
+    python scripts/cache_codec_benchmark.py
+"""
+import json
+import os
+import sys
+import time
+import uuid
+from timeit import timeit
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from fastapi.responses import JSONResponse
+from RDB import codec
+from app.helpers.helpers import send_raw_json_response
+
+
+def make_shop(i: int) -> dict:
+    return {
+        "fullName": f"Owner Number {i}",
+        "shopName": f"General Store {i}",
+        "address": f"{i} Main Street, Sector V, Kolkata 700091",
+        "contact": "+91 98300 00000",
+        "description": "Groceries, household items, snacks, beverages and daily essentials. Open all week.",
+        "is_open": True,
+        "created_at": 1722950000 + i,
+        "updated_at": None,
+        "note": None,
+        "latitude": 22.5726 + i * 1e-4,
+        "longitude": 88.3639 + i * 1e-4,
+    }
+
+
+def make_item(i: int) -> dict:
+    return {
+        "shop_id": str(uuid.uuid4()),
+        "itemName": f"Item {i} - Maggi Masala Noodles 70g",
+        "price": 14.0 + i % 10,
+        "description": "Instant noodles with masala tastemaker, ready in two minutes.",
+        "note": None,
+    }
+
+
+def make_items_page(n: int) -> dict:
+    return {
+        "data": [make_item(i) for i in range(n)],
+        "pagination": {"page": 1, "page_size": n, "total": 5000, "pages": 5000 // n},
+    }
+
+
+PAYLOADS = {
+    "shop": make_shop(1),
+    "shops_by_owner (5 shops)": [make_shop(i) for i in range(5)],
+    "all_items page (20)": make_items_page(20),
+    "all_items page (100)": make_items_page(100),
+}
+
+
+def old_hit(raw: str):
+    body = json.loads(raw)
+    return JSONResponse(content={"message": "cached", "status": 200, "body": body}).body
+
+
+def new_hit(raw: bytes):
+    body, _, _, _ = codec.unpack(raw)
+    return send_raw_json_response(message="cached", status=200, body=body).body
+
+
+if __name__ == "__main__":
+    runs = 2000
+    print(f"zstd available: {codec.zstandard is not None}, threshold: {codec.CACHE_COMPRESS_MIN_BYTES} bytes\n")
+    print(f"{'payload':<26}{'old bytes':>10}{'new bytes':>10}{'old hit us':>12}{'new hit us':>12}")
+    for name, value in PAYLOADS.items():
+        old_raw = json.dumps(value)
+        new_raw = codec.pack(codec.dumps(value), 0.01, time.time() + 3600)
+        assert json.loads(new_hit(new_raw))["body"] == value
+
+        old_us = timeit(lambda: old_hit(old_raw), number=runs) / runs * 1e6
+        new_us = timeit(lambda: new_hit(new_raw), number=runs) / runs * 1e6
+        print(f"{name:<26}{len(old_raw.encode()):>10}{len(new_raw):>10}{old_us:>12.1f}{new_us:>12.1f}")
@@ -0,0 +1,60 @@
+"""
+Load test for the cache stampede protection in RDB/cache.py.
+
+Simulates several API workers (separate TwoTierCache instances, so separate L1s and
+in-flight maps, sharing one Redis) that all request the same hot key right after it was
+invalidated, and counts how many times the "database" loader actually runs per expiry.
+
+    python scripts/cache_stampede_load_test.py --workers 4 --concurrency 200 --rounds 10
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from RDB.cache import TwoTierCache
+from RDB.redis_client import redis_client
+
+
+async def run(workers: int, concurrency: int, rounds: int, db_latency: float):
+    caches = [TwoTierCache(redis_client) for _ in range(workers)]
+    db_queries = 0
+
+    async def load_shop():
+        nonlocal db_queries
+        db_queries += 1
+        await asyncio.sleep(db_latency)
+        return {"shopName": "Load Test Shop", "queried_at": time.time()}
+
+    per_round = []
+    for _ in range(rounds):
+        # every round starts right after an invalidation, like a write or an expiry would
+        await caches[0].invalidate(namespaces=["shop:loadtest"])
+        for worker_cache in caches:
+            worker_cache.local.clear()
+        key = await caches[0].versioned_key("shop:loadtest")
+
+        before = db_queries
+        started = time.perf_counter()
+        await asyncio.gather(*[
+            caches[i % workers].get_or_load(key, load_shop)
+            for i in range(concurrency * workers)
+        ])
+        per_round.append((db_queries - before, time.perf_counter() - started))
+
+    for i, (queries, elapsed) in enumerate(per_round, start=1):
+        print(f"round {i:>2}: {queries} DB queries for {concurrency * workers} requests in {elapsed * 1000:.1f} ms")
+    print(f"average DB queries per expiry: {sum(q for q, _ in per_round) / rounds:.2f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--concurrency", type=int, default=200, help="concurrent requests per worker")
+    parser.add_argument("--rounds", type=int, default=10)
+    parser.add_argument("--db-latency", type=float, default=0.05, help="simulated query time in seconds")
+    args = parser.parse_args()
+    asyncio.run(run(args.workers, args.concurrency, args.rounds, args.db_latency))
@@ -0,0 +1,73 @@
+"""
+Compares the old response path for list endpoints (jsonable_encoder -> recursive_to_str ->
+JSONResponse with stdlib json) with the orjson one (row_to_dict / serialize_rows ->
+ORJSONResponse / send_raw_json_response) on 100 item and inventory rows.
+
+No database needed, rows are built in memory.
+
+    python scripts/response_serialization_benchmark.py
+"""
+import os
+import sys
+import uuid
+from timeit import timeit
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from app.db.models.inventory import INVENTORY
+from app.db.models.item import ITEM
+from app.api.v1.endpoints.functions.items import ITEM_FIELDS
+from app.helpers.helpers import recursive_to_str, row_to_dict, send_json_response, send_raw_json_response, serialize_rows
+
+ROWS = 100
+
+
+def make_items(n: int):
+    shop_id = uuid.uuid4()
+    return [
+        ITEM(shop_id=shop_id, itemName=f"Item {i} - Maggi Masala Noodles 70g", price=14.0 + i % 10,
+             description="Instant noodles with masala tastemaker, ready in two minutes.")
+        for i in range(n)
+    ]
+
+
+def make_inventory(n: int):
+    shop_id = uuid.uuid4()
+    return [
+        INVENTORY(inventory_id=str(uuid.uuid4()), shop_id=shop_id, item_id=uuid.uuid4(), quantity=i,
+                  price_at_entry=12.5, batch_number=f"B-{i}", expiry_date=1767225600)
+        for i in range(n)
+    ]
+
+
+def old_items(rows):
+    body = [{k: v for k, v in item.items() if k != "id"} for item in jsonable_encoder(rows)]
+    return JSONResponse(content={"message": "Items", "status": 200, "body": body}).body
+
+
+def new_items(rows):
+    return send_json_response(message="Items", status=200, body=[row_to_dict(row, ITEM_FIELDS) for row in rows]).body
+
+
+def old_inventory(rows):
+    body = [recursive_to_str(row.model_dump()) for row in rows]
+    return JSONResponse(content={"message": "Inventories found", "status": 200, "body": body}).body
+
+
+def new_inventory(rows):
+    return send_raw_json_response(message="Inventories found", status=200, body=serialize_rows(rows)).body
+
+
+if __name__ == "__main__":
+    runs = 500
+    cases = {
+        f"items ({ROWS} rows)": (make_items(ROWS), old_items, new_items),
+        f"inventory ({ROWS} rows)": (make_inventory(ROWS), old_inventory, new_inventory),
+    }
+    print(f"{'payload':<22}{'old us':>10}{'new us':>10}{'speedup':>9}")
+    for name, (rows, old, new) in cases.items():
+        old_us = timeit(lambda: old(rows), number=runs) / runs * 1e6
+        new_us = timeit(lambda: new(rows), number=runs) / runs * 1e6
+        print(f"{name:<22}{old_us:>10.1f}{new_us:>10.1f}{old_us / new_us:>8.1f}x")
@@ -0,0 +1,113 @@
+"""
+Per-shop serialization cost of the old shop read path (load the location WKB, decode it with
+shapely's to_shape, jsonable_encoder + recursive_to_str) against the new one (ST_Y/ST_X
+projected by PostGIS, row_to_dict), plus single vs bulk point creation for inserts.
+
+Rows are built in memory by default. With --db the two queries are also timed against
+DATABASE_URL (needs shops in the database).
+
+    python scripts/shop_geo_benchmark.py --rows 10000
+    python scripts/shop_geo_benchmark.py --rows 10000 --db
+"""
+import argparse
+import os
+import sys
+import time
+import uuid
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from fastapi.encoders import jsonable_encoder
+from geoalchemy2.shape import from_shape, to_shape
+from shapely.geometry import Point
+from app.db.models.shop import SHOP
+from app.helpers.geo import create_point_geometries
+from app.helpers.helpers import recursive_to_str, row_to_dict
+
+
+def make_rows(n: int):
+    owner_id = uuid.uuid4()
+    rows = []
+    for i in range(n):
+        latitude, longitude = 22.5 + i * 1e-5, 88.3 + i * 1e-5
+        shop = SHOP(owner_id=owner_id, fullName=f"Owner {i}", shopName=f"Shop {i}", address=f"{i} Main Street",
+                    description="Groceries and daily essentials", created_at=1722950000 + i)
+        rows.append((shop, from_shape(Point(longitude, latitude), srid=4326), latitude, longitude))
+    return rows
+
+
+def geometry_to_latlon(geometry):
+    # the old read path's WKB decoding, kept here for comparison
+    if geometry is not None:
+        try:
+            point = to_shape(geometry)
+            return {"latitude": point.y, "longitude": point.x}
+        except Exception:
+            pass
+    return {"latitude": None, "longitude": None}
+
+
+def old_path(rows):
+    result = []
+    for shop, location, _, _ in rows:
+        # jsonable_encoder can't encode the WKBElement itself, so it is decoded separately
+        shop_dict = jsonable_encoder(shop, exclude={"location"})
+        shop_dict.update(geometry_to_latlon(location))
+        result.append(recursive_to_str(shop_dict))
+    return result
+
+
+def new_path(rows):
+    result = []
+    for shop, _, latitude, longitude in rows:
+        shop_dict = row_to_dict(shop, exclude={"location"})
+        shop_dict.update(latitude=latitude, longitude=longitude)
+        result.append(shop_dict)
+    return result
+
+
+def timed(fn, *args):
+    started = time.perf_counter()
+    fn(*args)
+    return time.perf_counter() - started
+
+
+def db_queries(limit: int):
+    from sqlalchemy.orm import defer
+    from sqlmodel import Session, create_engine, select
+    from app.helpers.geo import latlon_columns
+    from app.helpers.variables import DATABASE_URL
+
+    engine = create_engine(DATABASE_URL)
+    with Session(engine) as session:
+        started = time.perf_counter()
+        shops = session.exec(select(SHOP).limit(limit)).all()
+        [geometry_to_latlon(shop.location) for shop in shops]
+        old = time.perf_counter() - started
+        session.expunge_all()
+
+        started = time.perf_counter()
+        rows = session.exec(select(SHOP, *latlon_columns(SHOP.location)).options(defer(SHOP.location)).limit(limit)).all()
+        new = time.perf_counter() - started
+    print(f"db: {len(shops)} shops, select + to_shape {old * 1000:.1f} ms, select ST_Y/ST_X {new * 1000:.1f} ms ({len(rows)} rows)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--db", action="store_true", help="also time both queries against DATABASE_URL")
+    args = parser.parse_args()
+
+    rows = make_rows(args.rows)
+    old = timed(old_path, rows)
+    new = timed(new_path, rows)
+    print(f"serialize {args.rows} shops: old {old * 1000:.1f} ms ({old / args.rows * 1e6:.1f} us/shop), "
+          f"new {new * 1000:.1f} ms ({new / args.rows * 1e6:.1f} us/shop)")
+
+    points = [(22.5 + i * 1e-5, 88.3 + i * 1e-5) for i in range(args.rows)]
+    single = timed(lambda: [from_shape(Point(lon, lat), srid=4326) for lat, lon in points])
+    bulk = timed(create_point_geometries, points)
+    print(f"create {args.rows} points: from_shape {single * 1000:.1f} ms, create_point_geometries {bulk * 1000:.1f} ms")
+
+    if args.db:
+        db_queries(args.rows)
@@ -0,0 +1,176 @@
+"""
+Incremental sync to Typesense: pushes only the shops/items changed since the collection's
+checkpoint (by `updated_at`) and removes the ones deleted since (from `sync_tombstone`), so a run
+costs O(changes) instead of O(table). Rows the inline indexing failed on are picked up too, they
+carry the same `updated_at`.
+
+Run through `python typesense_helper/sync_db_to_typesense.py --incremental`.
+"""
+import hashlib
+import time
+import orjson
+from sqlalchemy import func, tuple_
+from sqlalchemy.orm import defer
+from sqlmodel import Session, delete, select
+from app.db.models.inventory import item_in_stock
+from app.db.models.item import ITEM
+from app.db.models.shop import SHOP
+from app.db.models.sync import SYNC_CHECKPOINT, SYNC_TOMBSTONE
+from app.helpers.geo import latlon_columns
+from app.helpers.variables import SYNC_BATCH_SIZE, SYNC_TOMBSTONE_RETENTION, SYNC_WATERMARK_OVERLAP
+
+# Typesense filter_by values are kept short, deletes go out in chunks of this many ids
+DELETE_CHUNK = 100
+
+
+def with_content_hash(document: dict) -> dict:
+    # lets reconcile.py compare a document with its row without downloading it
+    document["content_hash"] = hashlib.sha1(orjson.dumps(document, option=orjson.OPT_SORT_KEYS)).hexdigest()[:16]
+    return document
+
+
+def shop_document(shop: SHOP, latitude, longitude):
+    # shops without coordinates can't be geo-searched and are kept out of the index
+    if latitude is None or longitude is None:
+        return None
+    return with_content_hash({
+        "id": str(shop.shop_id),
+        "shop_id": str(shop.shop_id),
+        "owner_id": str(shop.owner_id),
+        "shopName": shop.shopName,
+        "fullName": shop.fullName,
+        "address": shop.address,
+        "contact": shop.contact if shop.contact else "",
+        "description": shop.description if shop.description else "",
+        "is_open": shop.is_open,
+        "location": [latitude, longitude],
+    })
+
+
+def item_document(item: ITEM, in_stock: bool = False):
+    return with_content_hash({
+        "id": str(item.id),
+        "itemName": item.itemName,
+        "description": item.description,
+        "shop_id": str(item.shop_id),
+        "price": item.price,
+        "note": item.note,
+        "in_stock": bool(in_stock),
+    })
+
+
+# per collection: model, primary key, the changed-rows select, row -> (model, document or None),
+# the field deletes are filtered on (shop documents indexed before ids were set have random ids),
+# the number of rows that should end up indexed and the shop column reconciliation partitions on
+SOURCES = {
+    "shops": {
+        "model": SHOP,
+        "key": SHOP.shop_id,
+        "select": lambda: select(SHOP, *latlon_columns(SHOP.location)).options(defer(SHOP.location)),
+        "document": lambda row: (row[0], shop_document(*row)),
+        "delete_by": "shop_id",
+        "count": lambda: select(func.count()).select_from(SHOP).where(SHOP.location.is_not(None)),
+        "partition_by": SHOP.shop_id,
+    },
+    "items": {
+        "model": ITEM,
+        "key": ITEM.id,
+        "select": lambda: select(ITEM, item_in_stock(ITEM.id).label("in_stock")),
+        "document": lambda row: (row[0], item_document(*row)),
+        "delete_by": "id",
+        "count": lambda: select(func.count()).select_from(ITEM),
+        "partition_by": ITEM.shop_id,
+    },
+}
+
+
+def import_documents(ts_client, collection: str, documents: list):
+    if not documents:
+        return
+    results = ts_client.collections[collection].documents.import_(documents, {"action": "upsert"})
+    failed = [result for result in results if not result.get("success")]
+    if failed:
+        # the checkpoint isn't moved, the next run retries the batch
+        raise RuntimeError(f"{len(failed)}/{len(documents)} {collection} documents failed to import, first error: {failed[0].get('error')}")
+
+
+def delete_documents(ts_client, collection: str, field: str, document_ids: list) -> int:
+    deleted = 0
+    for start in range(0, len(document_ids), DELETE_CHUNK):
+        chunk = document_ids[start:start + DELETE_CHUNK]
+        result = ts_client.collections[collection].documents.delete({"filter_by": f"{field}:[{','.join(chunk)}]"})
+        deleted += result.get("num_deleted", 0)
+    return deleted
+
+
+def save_checkpoint(session: Session, collection: str, **values):
+    checkpoint = session.get(SYNC_CHECKPOINT, collection) or SYNC_CHECKPOINT(collection=collection)
+    for key, value in values.items():
+        setattr(checkpoint, key, value)
+    session.add(checkpoint)
+    session.commit()
+
+
+def sync_collection(session: Session, ts_client, collection: str, batch_size: int = SYNC_BATCH_SIZE, target: str = None) -> dict:
+    """
+    `collection` is the alias the checkpoint belongs to; `target` the physical collection to write
+    to when it isn't the alias (catching up a version that is being rebuilt).
+    """
+    source = SOURCES[collection]
+    target = target or collection
+    model, key = source["model"], source["key"]
+    checkpoint = session.get(SYNC_CHECKPOINT, collection) or SYNC_CHECKPOINT(collection=collection)
+    watermark, deleted_watermark = checkpoint.watermark, checkpoint.deleted_watermark
+    # updated_at is the writer's transaction start, so a row can commit after a later-stamped one
+    # was already synced; re-reading an overlap window catches it, upserts are idempotent
+    since = max(watermark - SYNC_WATERMARK_OVERLAP, 0)
+    upserted = removed = 0
+
+    cursor = None
+    while True:
+        statement = source["select"]().where(model.updated_at >= since)
+        if cursor is not None:
+            statement = statement.where(tuple_(model.updated_at, key) > cursor)
+        rows = session.exec(statement.order_by(model.updated_at, key).limit(batch_size)).all()
+        if not rows:
+            break
+
+        documents, hidden = [], []
+        for row in rows:
+            record, document = source["document"](row)
+            if document is None:
+                hidden.append(str(getattr(record, key.key)))
+            else:
+                documents.append(document)
+        import_documents(ts_client, target, documents)
+        removed += delete_documents(ts_client, target, source["delete_by"], hidden)
+        upserted += len(documents)
+
+        last = source["document"](rows[-1])[0]
+        cursor = (last.updated_at, getattr(last, key.key))
+        watermark = max(watermark, last.updated_at)
+        # persisted per batch, an interrupted run resumes from here
+        save_checkpoint(session, collection, watermark=watermark)
+        session.expunge_all()
+        if len(rows) < batch_size:
+            break
+
+    tombstones = session.exec(
+        select(SYNC_TOMBSTONE.document_id, SYNC_TOMBSTONE.deleted_at)
+        .where(SYNC_TOMBSTONE.collection == collection, SYNC_TOMBSTONE.deleted_at >= max(deleted_watermark - SYNC_WATERMARK_OVERLAP, 0))
+    ).all()
+    if tombstones:
+        removed += delete_documents(ts_client, target, source["delete_by"], sorted({document_id for document_id, _ in tombstones}))
+        deleted_watermark = max(deleted_watermark, max(deleted_at for _, deleted_at in tombstones))
+    session.exec(delete(SYNC_TOMBSTONE).where(
+        SYNC_TOMBSTONE.collection == collection,
+        SYNC_TOMBSTONE.deleted_at < deleted_watermark - SYNC_WATERMARK_OVERLAP - SYNC_TOMBSTONE_RETENTION,
+    ))
+
+    save_checkpoint(session, collection, watermark=watermark, deleted_watermark=deleted_watermark,
+                    last_run_at=int(time.time()), last_run_changes=upserted + len(tombstones))
+    return {"collection": collection, "upserted": upserted, "deleted": removed, "tombstones": len(tombstones), "watermark": watermark}
+
+
+def sync_incremental(session: Session, ts_client, collections=("shops", "items")) -> list:
+    return [sync_collection(session, ts_client, collection) for collection in collections]
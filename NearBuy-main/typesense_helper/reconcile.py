@@ -0,0 +1,173 @@
+"""
+Postgres vs Typesense reconciliation. Every document carries a `content_hash` of its fields, so
+the two sides are compared without downloading documents: shops are taken RECONCILE_PARTITION_SIZE
+at a time (in shop_id order), Typesense is asked for just `id,shop_id,content_hash` of their
+documents and a digest per shop is compared with the one computed from the rows. Only shops whose
+digest differs are diffed document by document.
+
+Divergent documents are repaired through the outbox, which re-reads the row and upserts or deletes
+it, so a repair never races a concurrent write. Documents of shops that are gone from the table
+altogether are deleted directly.
+
+    python typesense_helper/sync_db_to_typesense.py --reconcile --dry-run
+    python typesense_helper/sync_db_to_typesense.py --reconcile
+"""
+import hashlib
+import time
+import uuid
+from collections import defaultdict
+import orjson
+import typesense
+from sqlalchemy import or_, update
+from sqlmodel import Session, select
+from app.db.models.outbox import OUTBOX_EVENT, OutboxStatus
+from app.db.models.sync import SYNC_CHECKPOINT
+from app.helpers.variables import RECONCILE_PARTITION_SIZE, RECONCILE_SAMPLE_SIZE
+from typesense_helper.incremental_sync import SOURCES, delete_documents, save_checkpoint
+
+
+def digest(hashes: dict) -> str:
+    return hashlib.sha1("".join(f"{document_id}:{content_hash}\n" for document_id, content_hash in sorted(hashes.items())).encode()).hexdigest()
+
+
+def database_hashes(session: Session, collection: str, shop_ids: list) -> dict:
+    """{shop_id: {document id: content hash}} of the documents the rows should produce."""
+    source = SOURCES[collection]
+    hashes = defaultdict(dict)
+    for row in session.exec(source["select"]().where(source["partition_by"].in_([uuid.UUID(i) for i in shop_ids]))):
+        document = source["document"](row)[1]
+        if document is not None:
+            hashes[document["shop_id"]][document["id"]] = document["content_hash"]
+    return hashes
+
+
+def index_hashes(ts_client, collection: str, shop_ids: list) -> dict:
+    """Same, from what the index holds (documents indexed before hashes existed have None)."""
+    exported = ts_client.collections[collection].documents.export({
+        "filter_by": f"shop_id:=[{','.join(shop_ids)}]",
+        "include_fields": "id,shop_id,content_hash",
+    })
+    hashes = defaultdict(dict)
+    for line in exported.splitlines():
+        if line.strip():
+            document = orjson.loads(line)
+            hashes[document["shop_id"]][document["id"]] = document.get("content_hash")
+    return hashes
+
+
+def indexed_shop_ids(ts_client, collection: str) -> set:
+    """Every shop_id that has documents in the index, from a facet (no documents returned)."""
+    live = ts_client.collections[collection].retrieve()
+    result = ts_client.collections[collection].documents.search({
+        "q": "*", "query_by": "shop_id", "facet_by": "shop_id", "per_page": 0,
+        "max_facet_values": max(live["num_documents"], 1),
+    })
+    return {count["value"] for facet in result.get("facet_counts", []) for count in facet["counts"]}
+
+
+def in_flight(session: Session, collection: str, document_ids: list) -> set:
+    # documents with an outbox event still pending are behind, not drifted
+    if not document_ids:
+        return set()
+    return set(session.exec(select(OUTBOX_EVENT.document_id).where(
+        OUTBOX_EVENT.collection == collection, OUTBOX_EVENT.status == OutboxStatus.PENDING,
+        OUTBOX_EVENT.document_id.in_(document_ids),
+    )).all())
+
+
+def enqueue_repairs(session: Session, collection: str, document_ids: list):
+    now = time.time()
+    session.add_all([
+        OUTBOX_EVENT(collection=collection, document_id=document_id, invalidate={}, created_at=now, next_attempt_at=now)
+        for document_id in document_ids
+    ])
+    session.commit()
+
+
+def reconcile_collection(session: Session, ts_client, collection: str, dry_run: bool = False,
+                         partition_size: int = RECONCILE_PARTITION_SIZE) -> dict:
+    source = SOURCES[collection]
+    column = source["partition_by"]
+    shop_ids = [str(shop_id) for shop_id in session.exec(select(column).distinct().order_by(column)).all()]
+
+    report = {"collection": collection, "dry_run": dry_run, "partitions": 0, "shops": len(shop_ids), "shops_diverged": 0,
+              "missing": 0, "stale": 0, "extra": 0, "orphaned_shops": 0, "repaired": 0, "samples": defaultdict(list)}
+    clock = time.perf_counter()
+
+    def note(kind, document_ids):
+        report[kind] += len(document_ids)
+        report["samples"][kind].extend(document_ids[:RECONCILE_SAMPLE_SIZE - len(report["samples"][kind])])
+
+    for start in range(0, len(shop_ids), partition_size):
+        partition = shop_ids[start:start + partition_size]
+        expected, indexed = database_hashes(session, collection, partition), index_hashes(ts_client, collection, partition)
+        report["partitions"] += 1
+
+        missing, stale, extra = [], [], []
+        for shop_id in partition:
+            rows, documents = expected.get(shop_id, {}), indexed.get(shop_id, {})
+            if digest(rows) == digest(documents):
+                continue
+            report["shops_diverged"] += 1
+            missing += [document_id for document_id in rows if document_id not in documents]
+            stale += [document_id for document_id in rows if document_id in documents and documents[document_id] != rows[document_id]]
+            extra += [document_id for document_id in documents if document_id not in rows]
+
+        behind = in_flight(session, collection, missing + stale + extra)
+        missing, stale, extra = ([i for i in ids if i not in behind] for ids in (missing, stale, extra))
+        note("missing", missing)
+        note("stale", stale)
+        note("extra", extra)
+        if dry_run:
+            continue
+
+        # shop documents indexed with random ids have no row of their own to re-read
+        unowned = [document_id for document_id in extra if collection == "shops" and document_id not in partition]
+        enqueue_repairs(session, collection, [i for i in missing + stale + extra if i not in unowned])
+        report["repaired"] += len(missing) + len(stale) + len(extra) - len(unowned)
+        report["repaired"] += delete_documents(ts_client, collection, "id", unowned)
+
+    try:
+        orphans = sorted(indexed_shop_ids(ts_client, collection) - set(shop_ids))
+    except typesense.exceptions.RequestMalformed:
+        # shop_id isn't a facet in collections built before it became one
+        orphans = None
+    if orphans:
+        # re-checked, a shop created since the partitions were listed isn't an orphan
+        orphans = sorted(set(orphans) - {str(shop_id) for shop_id in session.exec(
+            select(column).where(column.in_([uuid.UUID(i) for i in orphans])).distinct()).all()})
+        note("orphaned_shops", orphans)
+        if not dry_run:
+            report["repaired"] += delete_documents(ts_client, collection, "shop_id", orphans)
+    report["orphans_checked"] = orphans is not None
+
+    report["drift"] = report["missing"] + report["stale"] + report["extra"] + report["orphaned_shops"]
+    report["samples"] = dict(report["samples"])
+    report["seconds"] = round(time.perf_counter() - clock, 3)
+    return report
+
+
+def claim_run(session: Session, collection: str, interval: int) -> bool:
+    """
+    Compare-and-set on the checkpoint's reconciled_at, so one app worker runs the scheduled
+    reconciliation and the others skip it.
+    """
+    now = int(time.time())
+    if session.get(SYNC_CHECKPOINT, collection) is None:
+        save_checkpoint(session, collection)
+    claimed = session.exec(update(SYNC_CHECKPOINT).where(
+        SYNC_CHECKPOINT.collection == collection,
+        or_(SYNC_CHECKPOINT.reconciled_at.is_(None), SYNC_CHECKPOINT.reconciled_at <= now - interval),
+    ).values(reconciled_at=now))
+    session.commit()
+    return claimed.rowcount == 1
+
+
+def reconcile(session: Session, ts_client, collections=("shops", "items"), dry_run: bool = False) -> list:
+    reports = []
+    for collection in collections:
+        report = reconcile_collection(session, ts_client, collection, dry_run=dry_run)
+        if not dry_run:
+            save_checkpoint(session, collection, reconciled_at=int(time.time()), reconcile_drift=report["drift"])
+        reports.append(report)
+    return reports
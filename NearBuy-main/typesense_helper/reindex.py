@@ -0,0 +1,170 @@
+"""
+Streaming full reindex: rows are read through a server-side cursor (`yield_per`), turned into
+fixed-size JSONL batches and imported by a pool of workers, each batch retried on its own. Memory
+stays at roughly `workers * 2` batches whatever the table size.
+
+Progress is acknowledged in key order: the checkpoint's `reindex_cursor` is the last key of the
+last batch that was imported with every batch before it, so `--resume` picks up from there.
+
+    python typesense_helper/sync_db_to_typesense.py --batch-size 1000 --workers 8
+    python typesense_helper/sync_db_to_typesense.py --resume
+"""
+import time
+import uuid
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+import orjson
+from sqlmodel import Session
+from app.db.models.sync import SYNC_CHECKPOINT
+from app.helpers.variables import (
+    REINDEX_COUNT_TOLERANCE, REINDEX_KEEP_VERSIONS, SYNC_BATCH_SIZE, SYNC_IMPORT_RETRIES, SYNC_IMPORT_WORKERS, SYNC_RETRY_BACKOFF,
+)
+from typesense_helper.incremental_sync import SOURCES, save_checkpoint, sync_collection
+from typesense_helper.typesense_client import (
+    collection_versions, create_version, cut_over_legacy_collection, drop_old_versions, legacy_collection, swap_alias,
+)
+
+# batches acknowledged between two progress lines
+PROGRESS_EVERY = 20
+
+
+def to_jsonl(documents: list) -> bytes:
+    return b"\n".join(orjson.dumps(document) for document in documents)
+
+
+def import_batch(ts_client, collection: str, documents: list, retries: int = SYNC_IMPORT_RETRIES) -> int:
+    """
+    Upserts one batch, re-sending only the documents that failed (or all of them when the request
+    itself failed) with exponential backoff. Returns the retries it took.
+    """
+    pending, error = documents, None
+    for attempt in range(retries + 1):
+        if attempt:
+            time.sleep(SYNC_RETRY_BACKOFF * 2 ** (attempt - 1))
+        try:
+            response = ts_client.collections[collection].documents.import_(to_jsonl(pending), {"action": "upsert"})
+        except Exception as e:
+            error = str(e)
+            continue
+        results = [orjson.loads(line) for line in response.splitlines() if line.strip()]
+        failed = [document for document, result in zip(pending, results) if not result.get("success")]
+        if not failed:
+            return attempt
+        error = next(result.get("error") for result in results if not result.get("success"))
+        pending = failed
+    raise RuntimeError(f"{len(pending)} {collection} documents still failing after {retries} retries: {error}")
+
+
+def _done() -> Future:
+    # stands in for the import of a batch with nothing to index, so it is still acknowledged in order
+    future = Future()
+    future.set_result(0)
+    return future
+
+
+def reindex_collection(session: Session, ts_client, collection: str, batch_size: int = SYNC_BATCH_SIZE,
+                       workers: int = SYNC_IMPORT_WORKERS, resume: bool = False, target: str = None) -> dict:
+    source = SOURCES[collection]
+    target = target or collection
+    key = source["key"]
+    # checkpoints are committed on their own session, committing the streaming one would close its cursor
+    checkpoints = Session(session.get_bind())
+    checkpoint = checkpoints.get(SYNC_CHECKPOINT, collection)
+    if resume and checkpoint is not None and checkpoint.reindex_cursor is not None:
+        after, started_at = checkpoint.reindex_cursor, checkpoint.reindex_started_at
+    else:
+        after, started_at = "", int(time.time())
+        save_checkpoint(checkpoints, collection, reindex_cursor=after, reindex_started_at=started_at)
+
+    statement = source["select"]()
+    if after:
+        statement = statement.where(key > uuid.UUID(after))
+    # yield_per streams from a server-side cursor; loaded rows are only weakly held by the session
+    rows = session.exec(statement.order_by(key).execution_options(yield_per=batch_size))
+
+    stats = {"collection": collection, "documents": 0, "skipped": 0, "batches": 0, "retries": 0, "resumed_after": after or None}
+    clock = time.perf_counter()
+
+    def acknowledge(batch):
+        last_key, count, future = batch
+        stats["retries"] += future.result()
+        stats["documents"] += count
+        stats["batches"] += 1
+        save_checkpoint(checkpoints, collection, reindex_cursor=last_key)
+        if stats["batches"] % PROGRESS_EVERY == 0:
+            elapsed = time.perf_counter() - clock
+            print(f"{collection}: {stats['documents']} documents in {stats['batches']} batches, {stats['documents'] / elapsed:.0f} docs/s")
+
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            inflight = deque()
+            for partition in rows.partitions():
+                documents = []
+                for row in partition:
+                    document = source["document"](row)[1]
+                    if document is None:
+                        stats["skipped"] += 1
+                    else:
+                        documents.append(document)
+                last_key = str(getattr(source["document"](partition[-1])[0], key.key))
+                inflight.append((last_key, len(documents), pool.submit(import_batch, ts_client, target, documents) if documents else _done()))
+                # in-order acknowledgement; the window bounds how many batches are held in memory
+                while inflight and (len(inflight) >= workers * 2 or inflight[0][2].done()):
+                    acknowledge(inflight.popleft())
+            while inflight:
+                acknowledge(inflight.popleft())
+        # done: the incremental sync takes over from when this reindex started
+        save_checkpoint(checkpoints, collection, reindex_cursor=None, reindex_started_at=None,
+                        watermark=started_at, deleted_watermark=started_at, last_run_at=int(time.time()))
+    finally:
+        rows.close()
+        checkpoints.close()
+    elapsed = time.perf_counter() - clock
+    stats["seconds"] = round(elapsed, 3)
+    stats["docs_per_second"] = round(stats["documents"] / elapsed, 1) if elapsed else None
+    return stats
+
+
+def validate_counts(session: Session, ts_client, alias: str, target: str):
+    """Refuses the swap when the new version's document count is off from what the table says."""
+    expected = session.exec(SOURCES[alias]["count"]()).one()
+    actual = ts_client.collections[target].retrieve()["num_documents"]
+    if abs(actual - expected) > REINDEX_COUNT_TOLERANCE * expected:
+        raise RuntimeError(f"{target} has {actual} documents, expected {expected}; alias {alias} left as is")
+    return expected, actual
+
+
+def rebuild_collection(session: Session, ts_client, alias: str, batch_size: int = SYNC_BATCH_SIZE,
+                       workers: int = SYNC_IMPORT_WORKERS, resume: bool = False) -> dict:
+    """
+    Zero-downtime rebuild: fills a new versioned collection while the alias keeps serving the
+    current one, replays the writes made meanwhile, checks the document count, swaps the alias and
+    drops old versions. A failed check leaves the new version in place for inspection or --resume.
+    The first rebuild after upgrading replaces the plain collection from before aliases instead of
+    swapping, see cut_over_legacy_collection.
+    """
+    checkpoint = session.get(SYNC_CHECKPOINT, alias)
+    target = checkpoint.reindex_target if resume and checkpoint is not None else None
+    if target not in collection_versions(ts_client, alias).values():
+        target, resume = create_version(ts_client, alias), False
+        save_checkpoint(session, alias, reindex_target=target)
+
+    stats = reindex_collection(session, ts_client, alias, batch_size=batch_size, workers=workers, resume=resume, target=target)
+    # writes during the fill went to the live version through the alias, replay them into the new one
+    caught_up = sync_collection(session, ts_client, alias, target=target)
+    expected, actual = validate_counts(session, ts_client, alias, target)
+    legacy = legacy_collection(ts_client, alias)
+    if legacy is None:
+        previous = swap_alias(ts_client, alias, target)
+    else:
+        print(f"{alias} is still a plain collection, replacing it with an alias to {target} (one-time cutover)")
+        cut_over_legacy_collection(ts_client, alias, target)
+        previous = None
+    # and the ones that landed on the old version between the catch-up and the swap
+    sync_collection(session, ts_client, alias)
+    dropped = drop_old_versions(ts_client, alias, keep=REINDEX_KEEP_VERSIONS)
+    save_checkpoint(session, alias, reindex_target=None)
+
+    stats.update(target=target, previous=previous, caught_up=caught_up["upserted"] + caught_up["deleted"],
+                 expected_documents=expected, indexed_documents=actual, dropped=dropped, legacy_cutover=legacy is not None)
+    return stats
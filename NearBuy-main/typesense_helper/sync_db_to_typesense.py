@@ -1,82 +1,70 @@
+import argparse
 import os
 import sys
-from sqlmodel import Session, create_engine, select
+from sqlmodel import Session, create_engine
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
-from app.db.models.shop import SHOP
-from app.db.models.item import ITEM
 from typesense_helper.typesense_client import get_typesense_client, create_collections
-from app.helpers.variables import DATABASE_URL
-from app.helpers.geo import geometry_to_latlon
+from app.helpers.variables import DATABASE_URL, SYNC_BATCH_SIZE, SYNC_IMPORT_WORKERS
+from typesense_helper.incremental_sync import sync_incremental
+from typesense_helper.reindex import rebuild_collection
+from typesense_helper.reconcile import reconcile
 
 engine = create_engine(DATABASE_URL)
 
-def sync_database_to_typesense():
+def sync_database_to_typesense(resume: bool = False, batch_size: int = SYNC_BATCH_SIZE, workers: int = SYNC_IMPORT_WORKERS):
     ts_client = get_typesense_client()
+    # doesn't drop anything anymore, the rebuild fills a new version next to the live one
     print("Ensuring Typesense collections exist...")
     create_collections()
 
     with Session(engine) as session:
-        print("Fetching all shops from the database...")
-        shops = session.exec(select(SHOP)).all()
-        print(f"Found {len(shops)} shops in database")
-        
-        shop_documents = []
-        for shop in shops:
-            print(f"Processing shop: {shop.shop_id}")
-            coords = geometry_to_latlon(shop.location)
-            print(f"Coordinates: {coords}")
-            
-            if coords and coords.get("latitude") is not None:
-                shop_doc = {
-                    "shop_id": str(shop.shop_id),
-                    "owner_id": str(shop.owner_id),
-                    "shopName": shop.shopName,
-                    "fullName": shop.fullName,
-                    "address": shop.address,
-                    "contact": shop.contact if shop.contact else "",
-                    "description": shop.description if shop.description else "",
-                    "is_open": shop.is_open,
-                    "location": [coords["latitude"], coords["longitude"]],
-                }
-                shop_documents.append(shop_doc)
-                print(f"Added shop document: {shop_doc}")
-            else:
-                print(f"Skipping shop {shop.shop_id} - no valid coordinates")
+        for alias in ("shops", "items"):
+            print(f"Rebuilding {alias}...")
+            stats = rebuild_collection(session, ts_client, alias, batch_size=batch_size, workers=workers, resume=resume)
+            print(f"{stats['target']}: {stats['documents']} documents in {stats['batches']} batches "
+                  f"({stats['retries']} retries, {stats['skipped']} skipped) in {stats['seconds']} s, "
+                  f"{stats['docs_per_second']} docs/s, {stats['caught_up']} caught up")
+            print(f"{alias} -> {stats['target']} (was {stats['previous']}), "
+                  f"{stats['indexed_documents']}/{stats['expected_documents']} documents, dropped {stats['dropped'] or 'nothing'}")
 
-        print(f"Total shop documents to index: {len(shop_documents)}")
-        
-        if shop_documents:
-            print(f"Indexing {len(shop_documents)} shops...")
-            result = ts_client.collections["shops"].documents.import_(
-                shop_documents, {"action": "upsert"}
-            )
-            print(f"Import result: {result}")
-            print("Finished indexing shops.")
-        else:
-            print("No shop documents to index!")
-            
-        print("Fetching all items from the database...")
-        items = session.exec(select(ITEM)).all()
-        item_documents = []
-        for item in items:
-            item_documents.append({
-                "id": str(item.id),
-                "itemName": item.itemName,
-                "description": item.description,
-                "shop_id": str(item.shop_id),
-                "price": item.price,
-                "note": item.note,
-            })
 
-        if item_documents:
-            print(f"Indexing {len(item_documents)} items...")
-            ts_client.collections["items"].documents.import_(
-                item_documents, {"action": "upsert"}
-            )
-            print("Finished indexing items.")
+def sync_changes_to_typesense():
+    ts_client = get_typesense_client()
+    with Session(engine) as session:
+        for result in sync_incremental(session, ts_client):
+            print(f"{result['collection']}: {result['upserted']} upserted, {result['deleted']} removed "
+                  f"({result['tombstones']} tombstones), watermark {result['watermark']}")
+
+
+def reconcile_with_typesense(dry_run: bool = False):
+    ts_client = get_typesense_client()
+    with Session(engine) as session:
+        for report in reconcile(session, ts_client, dry_run=dry_run):
+            print(f"{report['collection']}: {report['drift']} drifted documents in {report['shops_diverged']}/{report['shops']} shops "
+                  f"({report['missing']} missing, {report['stale']} stale, {report['extra']} extra, "
+                  f"{report['orphaned_shops']} orphaned shops), {report['repaired']} repaired in {report['seconds']} s")
+            for kind, document_ids in report["samples"].items():
+                print(f"  {kind}: {', '.join(document_ids)}")
+
 
 if __name__ == "__main__":
-    print("Starting full database sync to Typesense...")
-    sync_database_to_typesense()
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--incremental", action="store_true", help="push only rows changed/deleted since the last run")
+    parser.add_argument("--reconcile", action="store_true", help="compare content hashes with the index and repair divergent documents")
+    parser.add_argument("--dry-run", action="store_true", help="with --reconcile: report the drift, change nothing")
+    parser.add_argument("--resume", action="store_true", help="continue an interrupted rebuild from its last acknowledged batch")
+    parser.add_argument("--batch-size", type=int, default=SYNC_BATCH_SIZE)
+    parser.add_argument("--workers", type=int, default=SYNC_IMPORT_WORKERS, help="concurrent import requests")
+    args = parser.parse_args()
+
+    if args.reconcile:
+        print("Reconciling Typesense with the database..." + (" (dry run)" if args.dry_run else ""))
+        reconcile_with_typesense(dry_run=args.dry_run)
+    elif args.incremental:
+        print("Starting incremental sync to Typesense...")
+        sync_changes_to_typesense()
+    else:
+        print("Starting full database sync to Typesense...")
+        sync_database_to_typesense(resume=args.resume, batch_size=args.batch_size, workers=args.workers)
     print("Sync complete.")
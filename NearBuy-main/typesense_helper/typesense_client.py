@@ -1,3 +1,4 @@
+import re
 import traceback
 import typesense
 from app.helpers.variables import TYPESENSE_HOST, TYPESENSE_PORT, TYPESENSE_PROTOCOL, TYPESENSE_API_KEY
@@ -15,13 +16,14 @@ client = typesense.Client({
 shops_schema = {
     "name": "shops",
     "fields": [
-        {"name": "shop_id", "type": "string"},
+        {"name": "shop_id", "type": "string", "facet": True},
         {"name": "owner_id", "type": "string", "facet": True},
         {"name": "shopName", "type": "string"},
         {"name": "fullName", "type": "string"},
         {"name": "address", "type": "string"},
         {"name": "description", "type": "string", "optional": True},
         {"name": "location", "type": "geopoint"},
+        {"name": "content_hash", "type": "string", "index": False, "optional": True},
     ],
 }
 
@@ -35,21 +37,113 @@ items_schema = {
         {"name": "description", "type": "string", "optional": True},
         {"name": "price", "type": "float"},
         {"name": "note", "type": "string", "optional": True},
+        {"name": "in_stock", "type": "bool", "optional": True},
+        {"name": "content_hash", "type": "string", "index": False, "optional": True},
     ],
 }
 
-def create_collections():
-    # DROP and RECREATE shops collection to enforce correct geopoint type
+SCHEMAS = {schema["name"]: schema for schema in (shops_schema, items_schema)}
+
+
+# "shops" and "items" are aliases; the documents live in versioned collections (shops_v1, shops_v2, ...)
+# so a rebuild can fill a new version while search keeps reading the current one.
+def versioned_name(alias: str, version: int) -> str:
+    return f"{alias}_v{version}"
+
+
+def collection_versions(ts_client, alias: str) -> dict:
+    """{version: collection name} of the physical collections behind `alias`."""
+    pattern = re.compile(rf"{re.escape(alias)}_v(\d+)")
+    versions = {}
+    for collection in ts_client.collections.retrieve():
+        match = pattern.fullmatch(collection["name"])
+        if match:
+            versions[int(match.group(1))] = collection["name"]
+    return versions
+
+
+def alias_target(ts_client, alias: str):
     try:
-        client.collections['shops'].delete()
+        return ts_client.aliases[alias].retrieve()["collection_name"]
     except typesense.exceptions.ObjectNotFound:
-        pass
-    client.collections.create(shops_schema)
+        return None
+
+
+def create_version(ts_client, alias: str) -> str:
+    """New, empty physical collection for `alias` with the current schema."""
+    name = versioned_name(alias, max(collection_versions(ts_client, alias), default=0) + 1)
+    ts_client.collections.create({**SCHEMAS[alias], "name": name})
+    return name
+
 
+def swap_alias(ts_client, alias: str, target: str):
+    """Points `alias` at `target` in one call, returns the collection it pointed at before."""
+    previous = alias_target(ts_client, alias)
+    ts_client.aliases.upsert(alias, {"collection_name": target})
+    return previous
+
+
+def legacy_collection(ts_client, alias: str):
+    """The plain collection holding the alias name from before versioned collections, if there still is one."""
+    if alias_target(ts_client, alias) is not None:
+        return None
     try:
-        client.collections['items'].retrieve()
+        return ts_client.collections[alias].retrieve()["name"]
     except typesense.exceptions.ObjectNotFound:
-        client.collections.create(items_schema)
+        return None
+
+
+def cut_over_legacy_collection(ts_client, alias: str, target: str):
+    """
+    One-time migration off the pre-alias layout. Typesense refuses an alias named like an existing
+    collection, so the plain collection is deleted and the alias created right after it: between
+    those two calls the name resolves to nothing. This is the only time that happens, on the first
+    rebuild of each alias; every later rebuild goes through swap_alias.
+    """
+    ts_client.collections[alias].delete()
+    ts_client.aliases.upsert(alias, {"collection_name": target})
+
+
+def drop_old_versions(ts_client, alias: str, keep: int) -> list:
+    """Deletes versions older than the live one, except the `keep` newest of them (for rolling back)."""
+    current = alias_target(ts_client, alias)
+    versions = collection_versions(ts_client, alias)
+    live = next((version for version, name in versions.items() if name == current), None)
+    if live is None:
+        return []
+    # newer versions may be a rebuild in progress and are left alone
+    older = sorted((version for version in versions if version < live), reverse=True)
+    dropped = [versions[version] for version in older[keep:]]
+    for name in dropped:
+        ts_client.collections[name].delete()
+    return dropped
+
+
+def schema_matches(collection: dict, schema: dict) -> bool:
+    def signature(field):
+        return field["name"], field["type"], field.get("facet", False)
+    live = {signature(field) for field in collection.get("fields", []) if field["name"] != ".*"}
+    return {signature(field) for field in schema["fields"]} <= live
+
+
+def create_collections():
+    """
+    Makes sure every alias points at a collection, without dropping anything: a missing alias gets
+    an empty first version. A live collection whose fields differ from the schema is only
+    reported, `python typesense_helper/sync_db_to_typesense.py` builds a new version and swaps it in.
+    """
+    for alias, schema in SCHEMAS.items():
+        target = alias_target(client, alias)
+        if target is None:
+            try:
+                # collection from before aliases, the next rebuild cuts it over (cut_over_legacy_collection)
+                target = client.collections[alias].retrieve()["name"]
+            except typesense.exceptions.ObjectNotFound:
+                target = create_version(client, alias)
+                client.aliases.upsert(alias, {"collection_name": target})
+                continue
+        if not schema_matches(client.collections[target].retrieve(), schema):
+            print(f"Typesense collection {target} doesn't match {alias}_schema, run a rebuild to migrate it.")
 
 
 def get_typesense_client():